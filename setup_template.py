@@ -26,10 +26,11 @@ setup(
     package_dir={"": "src"},
     package_data={"": ['*.html', '*.sql']},
     install_requires=[
-        "Django>=4.0.0",
+        "Django>=4.2",
         "djangorestframework>=3.13",
         "python-slugify>=8.0.1",
         "pandas>=1.3.1",
+        "numpy>=1.21",
         "django-flat-json-widget>=0.1.3",
         "PyJWT>=2.7.0",
         "django-rest-knox==4.2.0",
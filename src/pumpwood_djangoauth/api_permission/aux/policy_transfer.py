@@ -0,0 +1,432 @@
+"""Export and import of API permission policies between environments."""
+from typing import List, Dict, Tuple
+from django.db import models, transaction, router
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from pumpwood_communication.exceptions import PumpWoodActionArgsException
+
+
+class PolicyTransferAux:
+    """Export and import API permission policies using natural keys.
+
+    Policies are identified by `description`, routes by `route_name`,
+    groups by `description` and users by `username`, so exported data can
+    be imported at other environments where primary keys differ.
+
+    Import computes the difference against current database state and
+    applies only the needed inserts, updates and deletes using bulk
+    operations in one transaction. Permission caches are invalidated once
+    after commit.
+    """
+
+    EXPORT_VERSION = 1
+    """Version of the export format."""
+
+    MODEL_FIELDS = [
+        'notes', 'dimensions', 'can_list', 'can_list_without_pag',
+        'can_retrieve', 'can_retrieve_file', 'can_delete', 'can_delete_many',
+        'can_delete_file', 'can_save', 'can_run_actions', 'extra_info']
+    """Policy fields exported, besides `description` used as key and
+       `route_name`."""
+
+    @classmethod
+    def export(cls) -> dict:
+        """Export all API permission policies and their associations.
+
+        Returns:
+            Return a dictionary with keys `version`, `policies` (with
+            nested `actions`), `group_policies` and `user_policies`.
+        """
+        from pumpwood_djangoauth.api_permission.models import (
+            PumpwoodPermissionPolicy, PumpwoodPermissionPolicyAction,
+            PumpwoodPermissionPolicyGroupM2M, PumpwoodPermissionPolicyUserM2M)
+
+        policy_values = PumpwoodPermissionPolicy.objects\
+            .order_by('description')\
+            .values('description', 'route__route_name', *cls.MODEL_FIELDS)
+        actions = {}
+        action_values = PumpwoodPermissionPolicyAction.objects\
+            .order_by('policy__description', 'action')\
+            .values('policy__description', 'action', 'is_allowed',
+                    'extra_info')
+        for x in action_values:
+            actions.setdefault(x.pop('policy__description'), []).append(x)
+
+        policies = []
+        for x in policy_values:
+            x['route_name'] = x.pop('route__route_name')
+            x['actions'] = actions.get(x['description'], [])
+            policies.append(x)
+
+        group_policies = [
+            {
+                'group': x['group__description'],
+                'general_policy': x['general_policy'],
+                'custom_policy': x['custom_policy__description'],
+                'extra_info': x['extra_info']}
+            for x in PumpwoodPermissionPolicyGroupM2M.objects
+            .order_by('group__description', 'general_policy',
+                      'custom_policy__description')
+            .values('group__description', 'general_policy',
+                    'custom_policy__description', 'extra_info')]
+        user_policies = [
+            {
+                'username': x['user__username'],
+                'general_policy': x['general_policy'],
+                'custom_policy': x['custom_policy__description'],
+                'extra_info': x['extra_info']}
+            for x in PumpwoodPermissionPolicyUserM2M.objects
+            .order_by('user__username', 'general_policy',
+                      'custom_policy__description')
+            .values('user__username', 'general_policy',
+                    'custom_policy__description', 'extra_info')]
+        return {
+            'version': cls.EXPORT_VERSION,
+            'policies': policies,
+            'group_policies': group_policies,
+            'user_policies': user_policies}
+
+    @classmethod
+    def import_(cls, data: dict, updated_by_id: int,
+                delete_missing: bool = False,
+                dry_run: bool = True) -> dict:
+        """Import API permission policies applying only differences.
+
+        Args:
+            data (dict):
+                Data in the format returned by `export`.
+            updated_by_id (int):
+                Id of the user responsible for the import.
+            delete_missing (bool):
+                If True, policies and associations that are not at data
+                are removed. If False, only actions of imported policies
+                and associations of imported groups/users not at data are
+                removed.
+            dry_run (bool):
+                If True, only compute and return the differences.
+
+        Returns:
+            Return a dictionary with `dry_run` and number of inserts,
+            updates and deletes for `policies`, `actions`,
+            `group_policies` and `user_policies`.
+
+        Raises:
+            PumpWoodActionArgsException:
+                If data has an invalid version or references routes,
+                groups, users or policies that do not exist.
+        """
+        from pumpwood_djangoauth.api_permission.models import (
+            PumpwoodPermissionPolicyAction, PumpwoodPermissionPolicyGroupM2M,
+            PumpwoodPermissionPolicyUserM2M)
+        from pumpwood_djangoauth.registration.aux import PermissionCacheAux
+
+        if data.get('version') != cls.EXPORT_VERSION:
+            msg = "Import data version [{version}] is not supported"
+            raise PumpWoodActionArgsException(
+                message=msg, payload={'version': data.get('version')})
+        policies = data.get('policies', [])
+        group_policies = data.get('group_policies', [])
+        user_policies = data.get('user_policies', [])
+        maps = cls._resolve_natural_keys(
+            policies=policies, group_policies=group_policies,
+            user_policies=user_policies, delete_missing=delete_missing)
+
+        now = timezone.now()
+        results = {'dry_run': dry_run}
+        with transaction.atomic():
+            policy_ids, results['policies'] = cls._import_policies(
+                policies=policies, route_map=maps['route'],
+                updated_by_id=updated_by_id, now=now,
+                delete_missing=delete_missing, dry_run=dry_run)
+
+            # Actions of the imported policies are replaced by the imported
+            # ones
+            imported_policies = {x['description'] for x in policies}
+            current_actions = {
+                (x.policy.description, x.action): x
+                for x in PumpwoodPermissionPolicyAction.objects
+                .select_related('policy')}
+            desired_actions = {
+                (policy['description'], action['action']): action
+                for policy in policies
+                for action in policy.get('actions', [])}
+            insert_items, update_objs, delete_ids = cls._diff_rows(
+                current=current_actions, desired=desired_actions,
+                fields=['is_allowed', 'extra_info'],
+                scope=None if delete_missing else imported_policies,
+                updated_by_id=updated_by_id, now=now)
+            new_objs = [
+                PumpwoodPermissionPolicyAction(
+                    policy_id=policy_ids.get(key[0]), action=key[1],
+                    updated_by_id=updated_by_id, **values)
+                for key, values in insert_items]
+            results['actions'] = cls._apply(
+                model_class=PumpwoodPermissionPolicyAction,
+                new_objs=new_objs, update_objs=update_objs,
+                delete_ids=delete_ids, fields=['is_allowed', 'extra_info'],
+                dry_run=dry_run)
+
+            results['group_policies'] = cls._import_associations(
+                model_class=PumpwoodPermissionPolicyGroupM2M,
+                owner_field='group', owner_key='group',
+                rows=group_policies, owner_map=maps['group'],
+                policy_ids=policy_ids, updated_by_id=updated_by_id,
+                now=now, delete_missing=delete_missing, dry_run=dry_run)
+            results['user_policies'] = cls._import_associations(
+                model_class=PumpwoodPermissionPolicyUserM2M,
+                owner_field='user', owner_key='username',
+                rows=user_policies, owner_map=maps['user'],
+                policy_ids=policy_ids, updated_by_id=updated_by_id,
+                now=now, delete_missing=delete_missing, dry_run=dry_run)
+
+            if not dry_run:
+                transaction.on_commit(PermissionCacheAux.invalidate_all)
+        return results
+
+    @classmethod
+    def _import_policies(cls, policies: List[dict], route_map: dict,
+                         updated_by_id: int, now, delete_missing: bool,
+                         dry_run: bool) -> Tuple[dict, dict]:
+        """Apply differences of policies.
+
+        Returns:
+            Return a tuple with a map of policy description to id and the
+            counts of inserts, updates and deletes.
+        """
+        from pumpwood_djangoauth.api_permission.models import (
+            PumpwoodPermissionPolicy)
+
+        current = {
+            x.description: x
+            for x in PumpwoodPermissionPolicy.objects.all()}
+        desired = {}
+        for policy in policies:
+            values = {field: policy.get(field) for field in cls.MODEL_FIELDS}
+            values['route_id'] = route_map[policy['route_name']]
+            values['dimensions'] = values['dimensions'] or {}
+            desired[policy['description']] = values
+
+        insert_items, update_objs, delete_ids = cls._diff_rows(
+            current=current, desired=desired,
+            fields=cls.MODEL_FIELDS + ['route_id'],
+            scope=None if delete_missing else set(),
+            updated_by_id=updated_by_id, now=now)
+        new_objs = [
+            PumpwoodPermissionPolicy(
+                description=description, updated_by_id=updated_by_id,
+                **values)
+            for description, values in insert_items]
+        counts = cls._apply(
+            model_class=PumpwoodPermissionPolicy, new_objs=new_objs,
+            update_objs=update_objs, delete_ids=delete_ids,
+            fields=cls.MODEL_FIELDS + ['route_id'], dry_run=dry_run)
+
+        policy_ids = {
+            description: obj.id for description, obj in current.items()}
+        policy_ids.update({x.description: x.id for x in new_objs})
+        return policy_ids, counts
+
+    @classmethod
+    def _import_associations(cls, model_class, owner_field: str,
+                             owner_key: str, rows: List[dict],
+                             owner_map: dict, policy_ids: dict,
+                             updated_by_id: int, now, delete_missing: bool,
+                             dry_run: bool) -> dict:
+        """Apply differences of group or user policy associations.
+
+        Associations are identified by owner natural key, general policy
+        and custom policy description. Duplicated associations are
+        removed.
+        """
+        owner_attr = 'description' if owner_field == 'group' else 'username'
+        current = {}
+        for obj in model_class.objects\
+                .select_related(owner_field, 'custom_policy')\
+                .order_by('id'):
+            custom_policy = (
+                None if obj.custom_policy is None
+                else obj.custom_policy.description)
+            key = (
+                getattr(getattr(obj, owner_field), owner_attr),
+                obj.general_policy, custom_policy)
+            if key in current:
+                # Keep duplicated associations under a key that is never
+                # desired, so they are removed
+                current[('__duplicated__', obj.id, None)] = obj
+            else:
+                current[key] = obj
+        desired = {
+            (row[owner_key], row['general_policy'],
+             row.get('custom_policy')): row
+            for row in rows}
+
+        scope = None
+        if not delete_missing:
+            scope = {row[owner_key] for row in rows} | {'__duplicated__'}
+        insert_items, update_objs, delete_ids = cls._diff_rows(
+            current=current, desired=desired, fields=['extra_info'],
+            scope=scope, updated_by_id=updated_by_id, now=now)
+        new_objs = []
+        for (owner, general_policy, custom_policy), values in insert_items:
+            new_objs.append(model_class(
+                general_policy=general_policy,
+                custom_policy_id=policy_ids.get(custom_policy),
+                updated_by_id=updated_by_id,
+                **{owner_field + '_id': owner_map[owner]}, **values))
+        return cls._apply(
+            model_class=model_class, new_objs=new_objs,
+            update_objs=update_objs, delete_ids=delete_ids,
+            fields=['extra_info'], dry_run=dry_run)
+
+    @classmethod
+    def _resolve_natural_keys(cls, policies: List[dict],
+                              group_policies: List[dict],
+                              user_policies: List[dict],
+                              delete_missing: bool) -> Dict[str, dict]:
+        """Map natural keys to primary keys, validating missing ones."""
+        from pumpwood_djangoauth.system.models import KongRoute
+        from pumpwood_djangoauth.groups.models import PumpwoodUserGroup
+        from pumpwood_djangoauth.api_permission.models import (
+            PumpwoodPermissionPolicy)
+        User = get_user_model() # NOQA
+
+        route_names = {x['route_name'] for x in policies}
+        group_names = {x['group'] for x in group_policies}
+        usernames = {x['username'] for x in user_policies}
+        maps = {
+            'route': dict(KongRoute.objects.filter(
+                route_name__in=route_names)
+                .values_list('route_name', 'id')),
+            'group': dict(PumpwoodUserGroup.objects.filter(
+                description__in=group_names)
+                .values_list('description', 'id')),
+            'user': dict(User.objects.filter(
+                username__in=usernames)
+                .values_list('username', 'id'))}
+
+        # Custom policies must be imported or already exist and be kept
+        custom_policies = {
+            x.get('custom_policy') for x in group_policies + user_policies
+            if x.get('custom_policy') is not None}
+        known_policies = {x['description'] for x in policies}
+        if not delete_missing:
+            known_policies |= set(
+                PumpwoodPermissionPolicy.objects.filter(
+                    description__in=custom_policies)
+                .values_list('description', flat=True))
+
+        missing = {
+            'routes': sorted(route_names - set(maps['route'])),
+            'groups': sorted(group_names - set(maps['group'])),
+            'users': sorted(usernames - set(maps['user'])),
+            'policies': sorted(custom_policies - known_policies)}
+        if any(missing.values()):
+            msg = (
+                "Import data references objects that do not exist: "
+                "{missing}")
+            raise PumpWoodActionArgsException(
+                message=msg, payload={'missing': missing})
+        return maps
+
+    @staticmethod
+    def _diff_rows(current: dict, desired: dict, fields: List[str],
+                   scope: set, updated_by_id: int,
+                   now) -> Tuple[list, list, list]:
+        """Compute rows to insert, objects to update and ids to delete.
+
+        Args:
+            current (dict):
+                Current objects by natural key.
+            desired (dict):
+                Desired values by natural key.
+            fields (List[str]):
+                Fields compared to check for updates.
+            scope (set):
+                Current objects not at desired are deleted if the first
+                element of their key is in scope (or the key itself if it is
+                not a tuple). If None all of them are deleted.
+            updated_by_id (int):
+                Id of the user responsible for the import.
+            now (datetime):
+                Time of the update.
+
+        Returns:
+            Return a tuple with a list of `(key, values)` to insert, a list
+            of updated objects and a list of ids to delete.
+        """
+        insert_items = []
+        update_objs = []
+        for key, row in desired.items():
+            values = {field: row.get(field) for field in fields}
+            if 'extra_info' in values:
+                values['extra_info'] = values['extra_info'] or {}
+            obj = current.get(key)
+            if obj is None:
+                insert_items.append((key, values))
+                continue
+            is_changed = any(
+                getattr(obj, field) != value
+                for field, value in values.items())
+            if is_changed:
+                for field, value in values.items():
+                    setattr(obj, field, value)
+                obj.updated_by_id = updated_by_id
+                obj.updated_at = now
+                update_objs.append(obj)
+
+        delete_ids = []
+        for key, obj in current.items():
+            if key in desired:
+                continue
+            scope_key = key[0] if isinstance(key, tuple) else key
+            if scope is None or scope_key in scope:
+                delete_ids.append(obj.id)
+        return insert_items, update_objs, delete_ids
+
+    @staticmethod
+    def _apply(model_class, new_objs: list, update_objs: list,
+               delete_ids: List[int], fields: List[str],
+               dry_run: bool) -> dict:
+        """Apply inserts, updates and deletes using bulk operations.
+
+        Returns:
+            Return the number of inserts, updates and deletes.
+        """
+        if not dry_run:
+            model_class.objects.bulk_create(new_objs, batch_size=1000)
+            model_class.objects.bulk_update(
+                update_objs,
+                fields=fields + ['updated_by_id', 'updated_at'],
+                batch_size=1000)
+            PolicyTransferAux._delete(
+                model_class.objects.filter(id__in=delete_ids))
+        return {
+            'n_inserted': len(new_objs), 'n_updated': len(update_objs),
+            'n_deleted': len(delete_ids)}
+
+    @staticmethod
+    def _delete(query) -> None:
+        """Delete rows and cascaded rows without sending signals.
+
+        Policy models have cache invalidation receivers, so `delete` would
+        fetch and delete the rows one by one, queueing one invalidation for
+        each of them. Rows referencing the deleted ones with `CASCADE` are
+        deleted first with subqueries, cache is invalidated once by
+        `import_`.
+
+        Args:
+            query:
+                Query of the rows to be deleted.
+        """
+        for related in query.model._meta.related_objects:
+            if not related.one_to_many and not related.one_to_one:
+                continue
+            if related.on_delete is not models.CASCADE:
+                # Let Django handle SET_NULL, PROTECT, ...
+                query.delete()
+                return None
+            related_query = related.related_model._base_manager.filter(**{
+                related.field.name + '__in': query.values('pk')})
+            PolicyTransferAux._delete(related_query)
+        # Query is not marked for write, `query.db` may be the replica
+        query._raw_delete(router.db_for_write(query.model))
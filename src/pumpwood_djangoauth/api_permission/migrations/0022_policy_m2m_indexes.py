@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_permission', '0021_alter_pumpwoodpermissionpolicy_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pumpwoodpermissionpolicygroupm2m',
+            index=models.Index(fields=['group', 'custom_policy'], name='api_perm__policy_group_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pumpwoodpermissionpolicyuserm2m',
+            index=models.Index(fields=['user', 'custom_policy'], name='api_perm__policy_user_idx'),
+        ),
+    ]
@@ -4,9 +4,14 @@ Django models to set custom permission for Pumpwood end-points.
 .. warning::
     End-points not functional yet.
 """
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from pumpwood_communication.serializers import PumpWoodJSONEncoder
+from pumpwood_djangoviews.action import action
+from pumpwood_djangoauth.api_permission.aux import PolicyTransferAux
+from pumpwood_djangoauth.registration.aux import PermissionCacheAux
 
 # User groups
 from pumpwood_djangoauth.groups.models import PumpwoodUserGroup
@@ -168,6 +173,46 @@ class PumpwoodPermissionPolicy(models.Model):
         """__str__."""
         return f"{self.id} | {self.description}"
 
+    @classmethod
+    @action(info="Export API permission policies using natural keys",
+            permission_role='is_superuser')
+    def export_policies(cls) -> dict:
+        """Export policies, custom actions and group/user associations.
+
+        Routes, groups and users are referenced by `route_name`,
+        `description` and `username` so data can be imported at other
+        environments with `import_policies`.
+        """
+        return PolicyTransferAux.export()
+
+    @classmethod
+    @action(info="Import API permission policies applying only differences",
+            request='request', permission_role='is_superuser')
+    def import_policies(cls, data: dict, request,
+                        delete_missing: bool = False,
+                        dry_run: bool = True) -> dict:
+        """Import policies exported by `export_policies`.
+
+        Differences against current state are applied with bulk
+        operations in one transaction and permission caches are
+        invalidated once.
+
+        Args:
+            data (dict):
+                Data returned by `export_policies`.
+            request:
+                Django request.
+            delete_missing (bool):
+                Remove policies and associations not present at data. If
+                False only custom actions of imported policies and
+                associations of imported groups/users are removed.
+            dry_run (bool):
+                Only return the differences without applying them.
+        """
+        return PolicyTransferAux.import_(
+            data=data, updated_by_id=request.user.id,
+            delete_missing=delete_missing, dry_run=dry_run)
+
     class Meta:
         """Meta class."""
         db_table = 'api_permission__policy'
@@ -320,6 +365,10 @@ class PumpwoodPermissionPolicyGroupM2M(models.Model):
     class Meta:
         """Meta class."""
         db_table = 'api_permission__policy_group_m2m'
+        indexes = [
+            models.Index(
+                fields=['group', 'custom_policy'],
+                name='api_perm__policy_group_idx')]
         verbose_name = 'End-point Permission Policy -> Group'
         verbose_name_plural = 'End-point Permission Policy -> Group'
 
@@ -393,5 +442,22 @@ class PumpwoodPermissionPolicyUserM2M(models.Model):
     class Meta:
         """Meta class."""
         db_table = 'api_permission__policy_user_m2m'
+        indexes = [
+            models.Index(
+                fields=['user', 'custom_policy'],
+                name='api_perm__policy_user_idx')]
         verbose_name = 'End-point Permission Policy -> User'
         verbose_name_plural = 'End-point Permission Policy -> User'
+
+
+@receiver(post_save, sender=PumpwoodPermissionPolicy)
+@receiver(post_delete, sender=PumpwoodPermissionPolicy)
+@receiver(post_save, sender=PumpwoodPermissionPolicyAction)
+@receiver(post_delete, sender=PumpwoodPermissionPolicyAction)
+@receiver(post_save, sender=PumpwoodPermissionPolicyGroupM2M)
+@receiver(post_delete, sender=PumpwoodPermissionPolicyGroupM2M)
+@receiver(post_save, sender=PumpwoodPermissionPolicyUserM2M)
+@receiver(post_delete, sender=PumpwoodPermissionPolicyUserM2M)
+def invalidate_policy_permission_cache(sender, instance, **kwargs):
+    """Invalidate permission caches of all users when policies change."""
+    transaction.on_commit(PermissionCacheAux.invalidate_all)
@@ -27,6 +27,7 @@ class RestNicePumpwoodEndPoint(PumpWoodRestService):
 ```
 """
 import os
+import json
 from pumpwood_communication.microservices import PumpWoodMicroService
 from pumpwood_miscellaneous.storage import PumpWoodStorage
 from pumpwood_miscellaneous.rabbitmq import PumpWoodRabbitMQ
@@ -167,6 +168,87 @@ PUMPWOOD__AUTH__TOKEN_CACHE_EXPIRE = int(os.getenv(
     'PUMPWOOD__AUTH__PERMISSION_CACHE_EXPIRE', 300))
 """Time to set expire at permission cache."""
 
+###############
+# API logging #
+PUMPWOOD__AUTH__USAGE_ROLLUP: bool = os.getenv(
+    'PUMPWOOD__AUTH__USAGE_ROLLUP', "FALSE") == 'TRUE'
+"""If API calls logged by `log_api_request` should be aggregated at
+   hourly/daily usage rollup tables."""
+PUMPWOOD__AUTH__USAGE_ROLLUP_FLUSH_INTERVAL = int(os.getenv(
+    'PUMPWOOD__AUTH__USAGE_ROLLUP_FLUSH_INTERVAL', 60))
+"""Time in seconds that usage counters are kept in memory at each worker
+   before being flushed to rollup tables."""
+PUMPWOOD__AUTH__LOG_PAYLOAD_PEEK_SIZE = int(os.getenv(
+    'PUMPWOOD__AUTH__LOG_PAYLOAD_PEEK_SIZE', 300))
+"""Maximum number of bytes of the request body captured by the logging
+   middleware, set 0 to disable payload capture."""
+
+##################
+# Row permission #
+PUMPWOOD__AUTH__ROW_PERMISSION_STRATEGY = os.getenv(
+    'PUMPWOOD__AUTH__ROW_PERMISSION_STRATEGY', 'in_list')
+"""Default strategy used by `PumpWoodRestServiceRowPermission` to filter
+   rows by row permission, `in_list`, `any_array`, `exists` or `rls`. It
+   can be overwritten at each view with `row_permission_strategy`
+   attribute."""
+
+##################
+# API permission #
+PUMPWOOD__AUTH__POLICY_ENGINE = os.getenv(
+    'PUMPWOOD__AUTH__POLICY_ENGINE', 'sql')
+"""Engine used to evaluate API permissions not found at cache, `sql` runs
+   `route_api_permissions.sql` for each check, `prepared` runs it as a
+   server-side prepared statement of each connection (not compatible
+   with transaction poolers) and `memory` uses policies compiled in
+   memory at each worker by `PolicyEngine`."""
+PUMPWOOD__AUTH__POLICY_ENGINE_CHECK_INTERVAL = float(os.getenv(
+    'PUMPWOOD__AUTH__POLICY_ENGINE_CHECK_INTERVAL', 5))
+"""Seconds between checks of policies and routes versions by the in
+   memory policy engine."""
+PUMPWOOD__AUTH__POLICY_ENGINE_MAX_AGE = float(os.getenv(
+    'PUMPWOOD__AUTH__POLICY_ENGINE_MAX_AGE', 60))
+"""Seconds after which the in memory policy engine is reloaded even if
+   versions have not changed, changes made at other pods are not
+   signaled locally."""
+
+################
+# Read replica #
+PUMPWOOD__AUTH__READ_REPLICA_DB = os.getenv(
+    'PUMPWOOD__AUTH__READ_REPLICA_DB', None)
+"""Alias of the read replica database at Django `DATABASES`, reads are
+   not routed if not set. `PumpwoodAuthRouter` must be at Django
+   `DATABASE_ROUTERS`."""
+PUMPWOOD__AUTH__READ_REPLICA_MODELS = json.loads(os.getenv(
+    'PUMPWOOD__AUTH__READ_REPLICA_MODELS',
+    '["api_permission", "groups", "row_permission", "system.KongService", '
+    '"system.KongRoute", "i8n.PumpwoodI8nTranslation"]'))
+"""JSON list of app labels or `app_label.ModelName` which ORM reads are
+   sent to the read replica."""
+PUMPWOOD__AUTH__READ_REPLICA_AUX = json.loads(os.getenv(
+    'PUMPWOOD__AUTH__READ_REPLICA_AUX',
+    '["GetRouteAux", "RouteAPIPermissionAux", "ApiPermissionAux", '
+    '"RowPermissionAux", "CapabilityMapAux", "PolicyEngine", '
+    '"PermissionMatrix"]'))
+"""JSON list of aux classes which raw SQL reads are sent to the read
+   replica."""
+PUMPWOOD__AUTH__READ_REPLICA_PIN_SECONDS = float(os.getenv(
+    'PUMPWOOD__AUTH__READ_REPLICA_PIN_SECONDS', 5))
+"""Seconds that reads of all workers sharing diskcache are sent to
+   primary database after a write of a routed model or a bump of
+   permission versions, it must be greater than replication lag."""
+
+#############
+# Kong sync #
+PUMPWOOD__AUTH__KONG_SYNC_WORKERS = int(os.getenv(
+    'PUMPWOOD__AUTH__KONG_SYNC_WORKERS', 8))
+"""Maximum number of concurrent calls to Kong admin API when
+   registering routes that differ from Kong state."""
+PUMPWOOD__AUTH__KONG_SKIP_SYNCED: bool = os.getenv(
+    'PUMPWOOD__AUTH__KONG_SKIP_SYNCED', 'TRUE') == 'TRUE'
+"""Skip registration of service definitions already synced, set
+   `FALSE` to check Kong state at every start if Kong configuration may
+   be lost (ex. DB-less Kong)."""
+
 #####################
 # SSO configuration #
 PUMPWOOD__SSO__REDIRECT_URL = os.getenv(
@@ -0,0 +1,159 @@
+"""Route auth reads to a read replica database.
+
+Add the router to Django settings and set the alias of the replica
+database with `PUMPWOOD__AUTH__READ_REPLICA_DB`:
+
+```python
+DATABASE_ROUTERS = ['pumpwood_djangoauth.db_router.PumpwoodAuthRouter']
+```
+
+ORM reads of models at `PUMPWOOD__AUTH__READ_REPLICA_MODELS` are sent to
+the replica. Raw SQL of aux classes at `PUMPWOOD__AUTH__READ_REPLICA_AUX`
+uses the connection returned by `get_read_connection`.
+"""
+import time
+from django.db import connections, DEFAULT_DB_ALIAS
+from pumpwood_djangoauth.config import (
+    diskcache, PUMPWOOD__AUTH__READ_REPLICA_DB,
+    PUMPWOOD__AUTH__READ_REPLICA_MODELS, PUMPWOOD__AUTH__READ_REPLICA_AUX,
+    PUMPWOOD__AUTH__READ_REPLICA_PIN_SECONDS)
+
+
+class ReadReplicaAux:
+    """Decide if reads can be sent to the read replica.
+
+    To read own writes, reads are sent to primary database while it is in
+    a transaction and for `PUMPWOOD__AUTH__READ_REPLICA_PIN_SECONDS` after
+    a write of a routed model, a raw SQL write or a bump of permission
+    versions (`pin_primary`). Pin time is stored at diskcache next to
+    permission versions of `PermissionCacheAux`, so it is shared by all
+    workers using the cache: caches keyed by a new version are filled
+    from primary and not with rows of a lagging replica. Writes made at
+    other pods do not pin reads, they are visible after replication lag.
+    """
+
+    PINNED_UNTIL_KEY = "read-replica--pinned-until"
+    """Diskcache key with wall clock time until which reads are sent to
+       primary database."""
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        """Check if a read replica is configured."""
+        return bool(PUMPWOOD__AUTH__READ_REPLICA_DB)
+
+    @classmethod
+    def is_routed_model(cls, model) -> bool:
+        """Check if reads of a model are configured to use the replica.
+
+        Args:
+            model:
+                Django model class.
+
+        Returns:
+            Return True if model app label or `app_label.ModelName` is at
+            `PUMPWOOD__AUTH__READ_REPLICA_MODELS`.
+        """
+        app_label = model._meta.app_label
+        model_label = "{}.{}".format(app_label, model._meta.object_name)
+        return (
+            app_label in PUMPWOOD__AUTH__READ_REPLICA_MODELS or
+            model_label in PUMPWOOD__AUTH__READ_REPLICA_MODELS)
+
+    @classmethod
+    def pin_primary(cls) -> None:
+        """Send reads of all workers to primary for the pin window.
+
+        It must be called before bumping cache versions, so reads that
+        see the new version also see the pin.
+        """
+        if not cls.is_enabled():
+            return None
+        diskcache.set(
+            cls.PINNED_UNTIL_KEY,
+            time.time() + PUMPWOOD__AUTH__READ_REPLICA_PIN_SECONDS,
+            expire=PUMPWOOD__AUTH__READ_REPLICA_PIN_SECONDS)
+
+    @classmethod
+    def is_pinned(cls) -> bool:
+        """Check if reads must be sent to primary database."""
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return True
+        pinned_until = diskcache.get(cls.PINNED_UNTIL_KEY, default=0.0)
+        return time.time() < pinned_until
+
+    @classmethod
+    def get_read_db(cls, aux: str = None, model=None) -> str:
+        """Return database alias to be used to read.
+
+        Args:
+            aux (str):
+                Name of the aux class performing the read.
+            model:
+                Model class being read.
+
+        Returns:
+            Return replica alias if replica is enabled for the aux class
+            or model and reads are not pinned to primary, else the default
+            database alias.
+        """
+        if not cls.is_enabled() or cls.is_pinned():
+            return DEFAULT_DB_ALIAS
+        if aux is not None and aux not in PUMPWOOD__AUTH__READ_REPLICA_AUX:
+            return DEFAULT_DB_ALIAS
+        if model is not None and not cls.is_routed_model(model):
+            return DEFAULT_DB_ALIAS
+        return PUMPWOOD__AUTH__READ_REPLICA_DB
+
+
+def get_read_connection(aux: str):
+    """Return database connection to be used by an aux class to read.
+
+    Args:
+        aux (str):
+            Name of the aux class performing the read.
+
+    Returns:
+        Return a Django connection wrapper.
+    """
+    return connections[ReadReplicaAux.get_read_db(aux=aux)]
+
+
+class PumpwoodAuthRouter:
+    """Database router sending auth models reads to read replica."""
+
+    def db_for_read(self, model, **hints):
+        """Return replica alias for reads of routed models."""
+        if not ReadReplicaAux.is_enabled():
+            return None
+        if not ReadReplicaAux.is_routed_model(model):
+            return None
+        return ReadReplicaAux.get_read_db(model=model)
+
+    def db_for_write(self, model, **hints):
+        """Write routed models at primary and pin reads to primary.
+
+        Primary is returned explicitly, otherwise Django would write
+        objects loaded from the replica at the replica.
+        """
+        if not ReadReplicaAux.is_enabled():
+            return None
+        if not ReadReplicaAux.is_routed_model(model):
+            return None
+        ReadReplicaAux.pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Allow relations between objects of primary and replica."""
+        if not ReadReplicaAux.is_enabled():
+            return None
+        databases = {DEFAULT_DB_ALIAS, PUMPWOOD__AUTH__READ_REPLICA_DB}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Do not run migrations at the replica."""
+        if ReadReplicaAux.is_enabled() and \
+                db == PUMPWOOD__AUTH__READ_REPLICA_DB:
+            return False
+        return None
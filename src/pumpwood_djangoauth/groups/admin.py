@@ -133,7 +133,7 @@ class PumpwoodUserGroupAdmin(admin.ModelAdmin):
     search_fields = ["description", "notes", ]
 
     list_display = (
-        "description", "notes", "updated_by", "updated_at",)
+        "description", "parent", "notes", "updated_by", "updated_at",)
     readonly_fields = ['updated_by', 'updated_at']
     inlines = [
         PumpwoodUserGroupM2MInline,
@@ -142,7 +142,8 @@ class PumpwoodUserGroupAdmin(admin.ModelAdmin):
     fieldsets = ((
              None, {
                  'fields': (
-                     'description', 'notes', 'updated_by', 'updated_at')
+                     'description', 'parent', 'notes', 'updated_by',
+                     'updated_at')
                  }
          ), (
              'Extra-info', {
@@ -158,11 +159,20 @@ class PumpwoodUserGroupAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
     def save_formset(self, request, form, formset, change):
-        """Add updated_by field to m2m models."""
+        """Add updated_by field to m2m models.
+
+        Users added and removed from group are saved in bulk using
+        `PumpwoodUserGroup.update_users`.
+        """
         instances = formset.save(commit=False)
+        remove_user_ids = []
         for obj in formset.deleted_objects:
-            obj.delete()
+            if isinstance(obj, PumpwoodUserGroupM2M):
+                remove_user_ids.append(obj.user_id)
+            else:
+                obj.delete()
 
+        add_user_ids = []
         for instance in instances:
             if isinstance(instance, PumpwoodPermissionPolicyGroupM2M):
                 instance.updated_by = request.user
@@ -171,10 +181,18 @@ class PumpwoodUserGroupAdmin(admin.ModelAdmin):
                 instance.updated_by = request.user
                 instance.save()
             elif isinstance(instance, PumpwoodUserGroupM2M):
-                instance.updated_by = request.user
-                instance.save()
+                if instance._state.adding:
+                    add_user_ids.append(instance.user_id)
+                else:
+                    instance.updated_by = request.user
+                    instance.save()
             else:
                 instance.save()
+
+        if add_user_ids or remove_user_ids:
+            form.instance.update_users(
+                updated_by_id=request.user.id, add_user_ids=add_user_ids,
+                remove_user_ids=remove_user_ids)
         formset.save_m2m()
 
     def get_route_name(self, obj=None):
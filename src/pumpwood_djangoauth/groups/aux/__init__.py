@@ -0,0 +1,8 @@
+"""Aux classes and functions for groups models."""
+from .closure import GroupClosureAux
+
+
+# You might also want to define what happens with 'from my_package import *'
+# by defining __all__
+__all__ = [
+    "GroupClosureAux"]
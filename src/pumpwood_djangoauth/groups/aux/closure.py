@@ -0,0 +1,124 @@
+"""Maintain transitive closure of user groups hierarchy."""
+from django.db import connection
+from pumpwood_djangoauth.db_router import ReadReplicaAux
+
+
+class GroupClosureAux:
+    """Maintain `groups__group_closure` table incrementally.
+
+    Closure table has one row `(ancestor, descendant, depth)` for each
+    group and each of its ancestors, including the group itself with
+    depth 0. Users of a group are effective members of all its ancestors,
+    so permission queries join user groups to permission groups with
+    one indexed join:
+
+    ```sql
+    JOIN public.groups__group_closure AS group_closure
+      ON group_closure.descendant_id = group_user_m2m.group_id
+    -- permission.group_id = group_closure.ancestor_id
+    ```
+    """
+
+    INSERT_NODE_SQL = """
+        INSERT INTO public.groups__group_closure
+            (ancestor_id, descendant_id, depth)
+        SELECT %(group_id)s, %(group_id)s, 0
+        UNION ALL
+        SELECT ancestor_id, %(group_id)s, depth + 1
+        FROM public.groups__group_closure
+        WHERE descendant_id = %(parent_id)s
+    """
+    """Add closure rows of a new group."""
+
+    DETACH_SUBTREE_SQL = """
+        DELETE FROM public.groups__group_closure
+        WHERE descendant_id IN (
+            SELECT descendant_id
+            FROM public.groups__group_closure
+            WHERE ancestor_id = %(group_id)s)
+          AND ancestor_id IN (
+            SELECT ancestor_id
+            FROM public.groups__group_closure
+            WHERE descendant_id = %(group_id)s
+              AND ancestor_id != %(group_id)s)
+    """
+    """Remove rows linking a group subtree to the group previous ancestors."""
+
+    ATTACH_SUBTREE_SQL = """
+        INSERT INTO public.groups__group_closure
+            (ancestor_id, descendant_id, depth)
+        SELECT
+            super_tree.ancestor_id,
+            sub_tree.descendant_id,
+            super_tree.depth + sub_tree.depth + 1
+        FROM public.groups__group_closure AS super_tree
+        CROSS JOIN public.groups__group_closure AS sub_tree
+        WHERE super_tree.descendant_id = %(parent_id)s
+          AND sub_tree.ancestor_id = %(group_id)s
+    """
+    """Link a group subtree to all ancestors of its new parent."""
+
+    REBUILD_SQL = """
+        DELETE FROM public.groups__group_closure;
+        INSERT INTO public.groups__group_closure
+            (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree AS (
+            SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth
+            FROM public.groups__group
+            UNION ALL
+            SELECT tree.ancestor_id, child.id, tree.depth + 1
+            FROM tree
+            JOIN public.groups__group AS child
+              ON child.parent_id = tree.descendant_id)
+        SELECT ancestor_id, descendant_id, depth
+        FROM tree;
+    """
+    """Rebuild closure table from `parent_id` column."""
+
+    @classmethod
+    def insert_node(cls, group_id: int, parent_id: int = None) -> None:
+        """Add closure rows of a newly created group.
+
+        Args:
+            group_id (int):
+                Id of the created group.
+            parent_id (int):
+                Id of the parent group, None for root groups.
+        """
+        ReadReplicaAux.pin_primary()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                cls.INSERT_NODE_SQL,
+                {"group_id": group_id, "parent_id": parent_id})
+
+    @classmethod
+    def move_node(cls, group_id: int, parent_id: int = None) -> None:
+        """Update closure rows of a group that changed parent.
+
+        All descendants of the group are moved with it. It must be called
+        inside a transaction.
+
+        Args:
+            group_id (int):
+                Id of the moved group.
+            parent_id (int):
+                Id of the new parent group, None if group became a root
+                group.
+        """
+        parameters = {"group_id": group_id, "parent_id": parent_id}
+        ReadReplicaAux.pin_primary()
+        with connection.cursor() as cursor:
+            cursor.execute(cls.DETACH_SUBTREE_SQL, parameters)
+            if parent_id is not None:
+                cursor.execute(cls.ATTACH_SUBTREE_SQL, parameters)
+
+    @classmethod
+    def rebuild(cls) -> None:
+        """Rebuild closure table from groups `parent_id`.
+
+        Used to repair closure table if groups were changed without
+        calling `save` (ex. `QuerySet.update`).
+        """
+        ReadReplicaAux.pin_primary()
+        with connection.cursor() as cursor:
+            cursor.execute(cls.REBUILD_SQL)
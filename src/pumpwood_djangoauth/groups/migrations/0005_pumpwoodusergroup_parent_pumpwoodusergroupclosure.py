@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0004_alter_pumpwoodusergroupm2m_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pumpwoodusergroup',
+            name='parent',
+            field=models.ForeignKey(blank=True, help_text='Parent group, users of this group will also have parent group permissions', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children_set', to='groups.pumpwoodusergroup', verbose_name='Parent group'),
+        ),
+        migrations.CreateModel(
+            name='PumpwoodUserGroupClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(help_text='Distance between groups on hierarchy', verbose_name='Depth')),
+                ('ancestor', models.ForeignKey(help_text='Ancestor group', on_delete=django.db.models.deletion.CASCADE, related_name='descendant_closure_set', to='groups.pumpwoodusergroup', verbose_name='Ancestor')),
+                ('descendant', models.ForeignKey(help_text='Descendant group', on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_closure_set', to='groups.pumpwoodusergroup', verbose_name='Descendant')),
+            ],
+            options={
+                'verbose_name': 'Group Closure',
+                'verbose_name_plural': 'Group Closure',
+                'db_table': 'groups__group_closure',
+                'indexes': [models.Index(fields=['descendant', 'ancestor'], name='groups__closure__desc_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+    ]
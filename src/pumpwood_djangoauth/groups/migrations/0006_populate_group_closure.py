@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:41
+"""Populate group closure table with existing groups."""
+from django.db import migrations
+
+
+populate_closure_sql = """
+INSERT INTO public.groups__group_closure
+    (ancestor_id, descendant_id, depth)
+SELECT id, id, 0
+FROM public.groups__group;
+"""
+clear_closure_sql = "DELETE FROM public.groups__group_closure;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0005_pumpwoodusergroup_parent_pumpwoodusergroupclosure'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            populate_closure_sql, reverse_sql=clear_closure_sql),
+    ]
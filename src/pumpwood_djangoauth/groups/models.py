@@ -1,17 +1,33 @@
 """Django models to set custom groups permission for Pumpwood end-points."""
-from django.db import models
+from typing import List
+from django.db import models, transaction, connection
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
 from pumpwood_communication.serializers import PumpWoodJSONEncoder
+from pumpwood_communication.exceptions import PumpWoodActionArgsException
+from pumpwood_djangoviews.action import action
+from pumpwood_djangoauth.groups.aux import GroupClosureAux
+from pumpwood_djangoauth.db_router import ReadReplicaAux
+from pumpwood_djangoauth.groups.signals import group_membership_changed
+from pumpwood_djangoauth.registration.aux import PermissionCacheAux
 
 
 class PumpwoodUserGroup(models.Model):
     """Permission group for Pumpwood End-Points.
 
     Create permission groups associating many users in a group to apply
-    PermissionPolicy collectivity.
+    PermissionPolicy collectivity. Groups can be nested using `parent`,
+    users of a group are effective members of all its ancestors.
+    Hierarchy is also stored at `PumpwoodUserGroupClosure` table updated
+    on `save`.
 
     Model fields:
         - **description [TextField]:** Description of the permission group.
+        - **parent [ForeignKey('PumpwoodUserGroup')]:** Parent group, users
+            of this group will have the permissions of the parent group.
         - **notes [TextField]:** Long notes associated with permission group.
         - **dimensions [JSONField]:** Key/Value tags for organization of
             permission groups on database.
@@ -33,6 +49,14 @@ class PumpwoodUserGroup(models.Model):
         verbose_name="Notes",
         help_text="A long description of the route.")
     """@private"""
+    parent = models.ForeignKey(
+        'self', on_delete=models.PROTECT,
+        null=True, blank=True, related_name='children_set',
+        verbose_name="Parent group",
+        help_text=(
+            "Parent group, users of this group will also have parent "
+            "group permissions"))
+    """@private"""
     dimensions = models.JSONField(
         default=dict, blank=True,
         verbose_name="Dimentions",
@@ -62,6 +86,205 @@ class PumpwoodUserGroup(models.Model):
         """__str__."""
         return self.description
 
+    def clean(self):
+        """Validate that parent does not create a cycle on hierarchy."""
+        super().clean()
+        self.validate_parent()
+
+    def validate_parent(self) -> None:
+        """Validate that parent is not the group or one of its descendants.
+
+        Raises:
+            ValidationError:
+                If parent is the group itself or one of its descendants.
+        """
+        if self.parent_id is None or self.pk is None:
+            return None
+
+        is_cycle = (
+            self.parent_id == self.pk or
+            PumpwoodUserGroupClosure.objects.filter(
+                ancestor_id=self.pk, descendant_id=self.parent_id).exists())
+        if is_cycle:
+            raise ValidationError({
+                'parent': [
+                    "Parent group can not be the group itself or one of "
+                    "its descendants"]})
+
+    def save(self, *args, **kwargs):
+        """Save group and update closure table if parent changed."""
+        self.validate_parent()
+        is_new = self._state.adding
+        previous_parent_id = None
+        if not is_new:
+            previous_parent_id = PumpwoodUserGroup.objects\
+                .filter(pk=self.pk)\
+                .values_list('parent_id', flat=True).first()
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                GroupClosureAux.insert_node(
+                    group_id=self.pk, parent_id=self.parent_id)
+            elif previous_parent_id != self.parent_id:
+                GroupClosureAux.move_node(
+                    group_id=self.pk, parent_id=self.parent_id)
+
+                # Users of the group and its descendants changed effective
+                # membership
+                user_ids = set(PumpwoodUserGroupM2M.objects.filter(
+                    group__ancestor_closure_set__ancestor_id=self.pk)
+                    .values_list('user_id', flat=True))
+                self._send_membership_changed(user_ids=user_ids)
+
+    REMOVE_USERS_SQL = """
+        DELETE FROM public.groups__group_user_m2m
+        WHERE group_id = %(group_id)s
+          AND user_id = ANY(%(user_ids)s)
+        RETURNING user_id
+    """
+    """Remove users from group with one query."""
+
+    def _send_membership_changed(self, user_ids: set) -> None:
+        """Send `group_membership_changed` once transaction is commited."""
+        if not user_ids:
+            return None
+        group_ids = {self.pk}
+        transaction.on_commit(lambda: group_membership_changed.send(
+            sender=PumpwoodUserGroup, group_ids=group_ids,
+            user_ids=user_ids))
+
+    @staticmethod
+    def _validate_user_ids(user_ids: List[int]) -> set:
+        """Check that all users exist.
+
+        Raises:
+            PumpWoodActionArgsException:
+                If some of the users do not exist.
+        """
+        User = get_user_model() # NOQA
+        user_ids = set(user_ids)
+        existing_ids = set(User.objects.filter(id__in=user_ids)
+                           .values_list('id', flat=True))
+        missing_ids = user_ids - existing_ids
+        if missing_ids:
+            msg = "Users not found: {missing_ids}"
+            raise PumpWoodActionArgsException(
+                message=msg, payload={'missing_ids': sorted(missing_ids)})
+        return user_ids
+
+    def update_users(self, updated_by_id: int,
+                     add_user_ids: List[int] = None,
+                     remove_user_ids: List[int] = None) -> dict:
+        """Add and remove users from group in bulk.
+
+        Users are removed with one `DELETE` and added with
+        `bulk_create(ignore_conflicts=True)` at one transaction, model
+        signals are not sent. After commit `group_membership_changed` is
+        sent once with all affected users.
+
+        Args:
+            updated_by_id (int):
+                Id of the user responsible for the change.
+            add_user_ids (List[int]):
+                Ids of the users to add to group.
+            remove_user_ids (List[int]):
+                Ids of the users to remove from group.
+
+        Returns:
+            Return a dictionary with the number of users added and
+            removed (`n_added`, `n_removed`).
+        """
+        add_user_ids = set(add_user_ids or [])
+        remove_user_ids = set(remove_user_ids or [])
+        with transaction.atomic():
+            removed_ids = set()
+            if remove_user_ids:
+                # Raw SQL writes are not seen by database router
+                ReadReplicaAux.pin_primary()
+                with connection.cursor() as cursor:
+                    cursor.execute(self.REMOVE_USERS_SQL, {
+                        "group_id": self.pk,
+                        "user_ids": sorted(remove_user_ids)})
+                    removed_ids = {row[0] for row in cursor.fetchall()}
+
+            added_ids = set()
+            if add_user_ids:
+                existing_ids = set(PumpwoodUserGroupM2M.objects.filter(
+                    group_id=self.pk, user_id__in=add_user_ids)
+                    .values_list('user_id', flat=True))
+                added_ids = add_user_ids - existing_ids
+                PumpwoodUserGroupM2M.objects.bulk_create([
+                    PumpwoodUserGroupM2M(
+                        group_id=self.pk, user_id=user_id,
+                        updated_by_id=updated_by_id)
+                    for user_id in sorted(added_ids)],
+                    ignore_conflicts=True, batch_size=1000)
+            self._send_membership_changed(user_ids=added_ids | removed_ids)
+        return {'n_added': len(added_ids), 'n_removed': len(removed_ids)}
+
+    @action(info="Add users to group in bulk", request='request')
+    def add_users(self, user_ids: List[int], request) -> dict:
+        """Add users to group in bulk.
+
+        Args:
+            user_ids (List[int]):
+                Ids of the users to add, users already at group are
+                ignored.
+            request:
+                Django request.
+        """
+        user_ids = self._validate_user_ids(user_ids)
+        return self.update_users(
+            updated_by_id=request.user.id, add_user_ids=user_ids)
+
+    @action(info="Remove users from group in bulk", request='request')
+    def remove_users(self, user_ids: List[int], request) -> dict:
+        """Remove users from group in bulk.
+
+        Args:
+            user_ids (List[int]):
+                Ids of the users to remove, users not at group are
+                ignored.
+            request:
+                Django request.
+        """
+        return self.update_users(
+            updated_by_id=request.user.id, remove_user_ids=user_ids)
+
+    @action(info="Replace users of the group in bulk", request='request')
+    def replace_users(self, user_ids: List[int], request) -> dict:
+        """Set group users, removing users that are not on the list.
+
+        Args:
+            user_ids (List[int]):
+                Ids of the users that will be at group.
+            request:
+                Django request.
+        """
+        user_ids = self._validate_user_ids(user_ids)
+        with transaction.atomic():
+            current_ids = set(PumpwoodUserGroupM2M.objects.filter(
+                group_id=self.pk).values_list('user_id', flat=True))
+            return self.update_users(
+                updated_by_id=request.user.id,
+                add_user_ids=user_ids - current_ids,
+                remove_user_ids=current_ids - user_ids)
+
+    @classmethod
+    @action(info="Rebuild group hierarchy closure table",
+            permission_role='is_superuser')
+    def rebuild_closure(cls) -> int:
+        """Rebuild group hierarchy closure table from groups parent.
+
+        Returns:
+            Return the number of rows at closure table.
+        """
+        with transaction.atomic():
+            GroupClosureAux.rebuild()
+            transaction.on_commit(PermissionCacheAux.invalidate_all)
+        return PumpwoodUserGroupClosure.objects.count()
+
     class Meta:
         """Meta class."""
         db_table = 'groups__group'
@@ -69,6 +292,48 @@ class PumpwoodUserGroup(models.Model):
         verbose_name_plural = 'Permission Groups'
 
 
+class PumpwoodUserGroupClosure(models.Model):
+    """Transitive closure of user groups hierarchy.
+
+    One row for each group and each of its ancestors, including the group
+    itself with depth 0. It is maintained by `PumpwoodUserGroup.save`
+    and must not be edited directly.
+
+    Model fields:
+        - **ancestor [ForeignKey('PumpwoodUserGroup')]:** Ancestor group.
+        - **descendant [ForeignKey('PumpwoodUserGroup')]:** Descendant
+            group, users of this group are members of ancestor group.
+        - **depth [PositiveIntegerField]:** Distance between groups on
+            hierarchy.
+    """
+
+    ancestor = models.ForeignKey(
+        PumpwoodUserGroup, on_delete=models.CASCADE,
+        related_name="descendant_closure_set", verbose_name="Ancestor",
+        help_text="Ancestor group")
+    """@private"""
+    descendant = models.ForeignKey(
+        PumpwoodUserGroup, on_delete=models.CASCADE,
+        related_name="ancestor_closure_set", verbose_name="Descendant",
+        help_text="Descendant group")
+    """@private"""
+    depth = models.PositiveIntegerField(
+        null=False, blank=False, verbose_name="Depth",
+        help_text="Distance between groups on hierarchy")
+    """@private"""
+
+    class Meta:
+        """Meta class."""
+        db_table = 'groups__group_closure'
+        unique_together = [['ancestor', 'descendant', ], ]
+        indexes = [
+            models.Index(
+                fields=['descendant', 'ancestor'],
+                name='groups__closure__desc_idx')]
+        verbose_name = 'Group Closure'
+        verbose_name_plural = 'Group Closure'
+
+
 class PumpwoodUserGroupM2M(models.Model):
     """Permission group user association.
 
@@ -125,3 +390,19 @@ class PumpwoodUserGroupM2M(models.Model):
         unique_together = [['user', 'group', ], ]
         verbose_name = 'User -> Group'
         verbose_name_plural = 'User -> Group'
+
+
+@receiver(post_save, sender=PumpwoodUserGroupM2M)
+@receiver(post_delete, sender=PumpwoodUserGroupM2M)
+def send_user_group_m2m_changed(sender, instance, **kwargs):
+    """Send `group_membership_changed` when a membership is changed."""
+    user_ids = {instance.user_id}
+    group_ids = {instance.group_id}
+    transaction.on_commit(lambda: group_membership_changed.send(
+        sender=PumpwoodUserGroupM2M, group_ids=group_ids, user_ids=user_ids))
+
+
+@receiver(group_membership_changed)
+def invalidate_membership_permission_cache(sender, user_ids, **kwargs):
+    """Invalidate permission caches of users with membership changed."""
+    PermissionCacheAux.invalidate_users(user_ids=user_ids)
@@ -13,6 +13,11 @@ class SerializerPumpwoodUserGroup(DynamicFieldsModelSerializer):
     model_class = ClassNameField()
 
     # ForeignKey
+    parent_id = serializers.IntegerField(allow_null=True, required=False)
+    parent = LocalForeignKeyField(
+        serializer=(
+            "pumpwood_djangoauth.groups.serializers."
+            "SerializerPumpwoodUserGroup"))
     updated_by_id = serializers.IntegerField(allow_null=False, required=True)
     updated_by = LocalForeignKeyField(
         serializer=(
@@ -24,11 +29,13 @@ class SerializerPumpwoodUserGroup(DynamicFieldsModelSerializer):
         """Meta class."""
         model = PumpwoodUserGroup
         fields = (
-            'pk', 'model_class', 'description', 'notes', 'dimensions',
-            'extra_info', "updated_by_id", "updated_at", 'updated_by')
+            'pk', 'model_class', 'description', 'notes', 'parent_id',
+            'parent', 'dimensions', 'extra_info', "updated_by_id",
+            "updated_at", 'updated_by')
         list_fields = (
-            'pk', 'model_class', 'description', 'notes', 'dimensions',
-            'extra_info', "updated_by_id", "updated_at", 'updated_by')
+            'pk', 'model_class', 'description', 'notes', 'parent_id',
+            'dimensions', 'extra_info', "updated_by_id", "updated_at",
+            'updated_by')
         read_only = ["updated_by_id", "updated_at"]
 
     def create(self, validated_data):
@@ -0,0 +1,8 @@
+"""Signals associated with user groups."""
+from django.dispatch import Signal
+
+
+group_membership_changed = Signal()
+"""Sent once when users are added or removed from groups, including bulk
+   operations that do not send model signals. Receivers get `group_ids`
+   and `user_ids` (sets of the affected groups and users) as arguments."""
@@ -3,3 +3,15 @@ from django.apps import AppConfig
 
 class I8nConfig(AppConfig):
     name = 'pumpwood_djangoauth.i8n'
+
+    def ready(self):
+        """Load translation catalogs at first request after apps are ready.
+
+        Catalogs are not loaded here so process startup, migrations and
+        management commands do not query translations.
+        """
+        from django.core.signals import request_started
+        from pumpwood_djangoauth.i8n.catalog import (
+            preload_translation_catalog, PRELOAD_DISPATCH_UID)
+        request_started.connect(
+            preload_translation_catalog, dispatch_uid=PRELOAD_DISPATCH_UID)
@@ -0,0 +1,103 @@
+"""Precompiled gzip JSON bundles of translation catalogs."""
+import gzip
+import json
+import hashlib
+import threading
+from pumpwood_djangoauth.config import diskcache
+from pumpwood_djangoauth.i8n.catalog import translation_catalog
+
+
+class PumpwoodI8nBundle:
+    """Gzip JSON documents with all translations of a catalog.
+
+    Bundles are compiled from the in-memory catalog of the
+    language/user_type and kept in memory and at diskcache, so other
+    workers of the pod do not need to compile them again. Only the bundle
+    of the catalog that changed is compiled again when its version is
+    bumped.
+
+    Bundle document has keys `language`, `user_type`, `version`,
+    `translations` and `plural_translations`, translations are
+    dictionaries `{tag: {sentence: translation}}` with only sentences that
+    have a translation.
+    """
+
+    DISKCACHE_KEY_TEMPLATE = (
+        "i8n-bundle--{language}--{user_type}--v{version}")
+    """Template of the diskcache key used to store compiled bundles."""
+
+    def __init__(self):
+        """__init__."""
+        self._lock = threading.Lock()
+        self._bundles = {}
+
+    def get(self, language: str, user_type: str) -> dict:
+        """Get compiled bundle for language and user_type.
+
+        Args:
+            language (str):
+                Language of the bundle.
+            user_type (str):
+                User type of the bundle.
+
+        Returns:
+            Return a dictionary with keys `etag` (strong ETag derived from
+            catalog version and content), `version` and `content` (gzip
+            compressed JSON). Return None if catalog could not be loaded.
+        """
+        catalog_entry = translation_catalog.get_entry(
+            language=language, user_type=user_type)
+        if catalog_entry is None:
+            return None
+
+        key = (language, user_type)
+        mapping = catalog_entry['mapping']
+        bundle = self._bundles.get(key)
+        if bundle is not None and bundle['mapping'] is mapping:
+            return bundle
+
+        with self._lock:
+            version = catalog_entry['version']
+            diskcache_key = self.DISKCACHE_KEY_TEMPLATE.format(
+                language=language, user_type=user_type, version=version)
+            bundle = diskcache.get(diskcache_key)
+            if bundle is None:
+                bundle = self._compile(
+                    language=language, user_type=user_type,
+                    version=version, mapping=mapping)
+                diskcache.set(
+                    diskcache_key, bundle,
+                    expire=int(translation_catalog.max_age))
+            bundle = dict(bundle, mapping=mapping)
+            self._bundles[key] = bundle
+        return bundle
+
+    @staticmethod
+    def _compile(language: str, user_type: str, version: int,
+                 mapping) -> dict:
+        """Compile catalog mapping to a gzip JSON document."""
+        translations = {}
+        plural_translations = {}
+        for (sentence, tag, plural), value in mapping.items():
+            translation = value[0]
+            if not translation:
+                continue
+            target = plural_translations if plural else translations
+            target.setdefault(tag, {})[sentence] = translation
+
+        document = json.dumps({
+            'language': language, 'user_type': user_type,
+            'version': version, 'translations': translations,
+            'plural_translations': plural_translations},
+            sort_keys=True, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(document).hexdigest()[:32]
+        return {
+            'etag': '"{version}-{digest}"'.format(
+                version=version, digest=digest),
+            'version': version,
+            # mtime=0 to make compressed content deterministic
+            'content': gzip.compress(document, mtime=0)}
+
+
+translation_bundle = PumpwoodI8nBundle()
+"""Bundle singleton used by translation bundle end-point."""
@@ -0,0 +1,190 @@
+"""Bulk loaded in-memory catalogs of translations."""
+import os
+import json
+import time
+import datetime
+import threading
+from types import MappingProxyType
+from loguru import logger
+from django.apps import apps
+from django.utils import timezone
+from pumpwood_djangoauth.config import diskcache
+
+_catalog_check_interval = float(os.getenv(
+    "PUMPWOOD__I8N__CATALOG_CHECK_INTERVAL", "30"))
+_catalog_max_age = float(os.getenv(
+    "PUMPOOD__I8N__CACHE_EXPIRY", "1"))
+_catalog_preload = json.loads(os.getenv(
+    "PUMPWOOD__I8N__PRELOAD_CATALOGS", '[["", ""]]'))
+
+
+class PumpwoodI8nCatalog:
+    """In-memory catalogs of translations by language and user_type.
+
+    All translations of a (language, user_type) are loaded with one query
+    and kept as a read-only mapping
+    `(sentence, tag, plural) -> (translation, id, is_stale)`, `is_stale`
+    indicates that `last_used_at` was older than a day when catalog was
+    loaded.
+
+    Catalog versions are stored at diskcache and bumped when translations
+    are changed, catalogs are reloaded when version changes. Version is
+    checked at most once each `check_interval` seconds, and catalogs are
+    also reloaded after `max_age` hours since diskcache is not shared
+    among pods.
+    """
+
+    VERSION_KEY_TEMPLATE = "i8n-catalog-version--{language}--{user_type}"
+    """Template of the diskcache key used to store catalog versions."""
+
+    def __init__(self, check_interval: float = 30, max_age: float = 1):
+        """__init__.
+
+        Args:
+            check_interval (float):
+                Seconds between checks of catalog version.
+            max_age (float):
+                Hours after which catalog is reloaded even if version has
+                not changed.
+        """
+        self._check_interval = check_interval
+        self._max_age = max_age * 3600
+        self._lock = threading.Lock()
+        self._catalogs = {}
+
+    @property
+    def max_age(self) -> float:
+        """Seconds after which catalogs are reloaded."""
+        return self._max_age
+
+    @classmethod
+    def get_version(cls, language: str, user_type: str) -> int:
+        """Get current version of a catalog."""
+        key = cls.VERSION_KEY_TEMPLATE.format(
+            language=language, user_type=user_type)
+        return diskcache.get(key, default=0)
+
+    @classmethod
+    def bump_version(cls, language: str, user_type: str) -> int:
+        """Bump version of a catalog, forcing its reload."""
+        key = cls.VERSION_KEY_TEMPLATE.format(
+            language=language, user_type=user_type)
+        return diskcache.incr(key, default=0)
+
+    def get(self, language: str, user_type: str) -> MappingProxyType:
+        """Get catalog for language and user_type.
+
+        Args:
+            language (str):
+                Language of the catalog.
+            user_type (str):
+                User type of the catalog.
+
+        Returns:
+            Return a read-only mapping `(sentence, tag, plural) ->
+            (translation, id, is_stale)` or None if apps are not ready or
+            it was not possible to load catalog.
+        """
+        entry = self.get_entry(language=language, user_type=user_type)
+        if entry is None:
+            return None
+        return entry['mapping']
+
+    def get_entry(self, language: str, user_type: str) -> dict:
+        """Get catalog for language and user_type with its version.
+
+        Args:
+            language (str):
+                Language of the catalog.
+            user_type (str):
+                User type of the catalog.
+
+        Returns:
+            Return a dictionary with keys `version`, `mapping`, `loaded_at`
+            and `checked_at`. `mapping` is a read-only mapping
+            `(sentence, tag, plural) -> (translation, id, is_stale)`.
+            Return None if apps are not ready or it was not possible to
+            load catalog. After an error, catalog load is not retried for
+            `check_interval` seconds.
+        """
+        if not apps.ready:
+            return None
+
+        key = (language, user_type)
+        now = time.monotonic()
+        entry = self._catalogs.get(key)
+        if entry is not None and now - entry['checked_at'] < \
+                self._check_interval:
+            return entry if entry['mapping'] is not None else None
+
+        try:
+            version = self.get_version(
+                language=language, user_type=user_type)
+            is_valid = (
+                entry is not None and entry['version'] == version and
+                now - entry['loaded_at'] < self._max_age)
+            if is_valid:
+                entry = dict(entry, checked_at=now)
+                self._catalogs[key] = entry
+                return entry
+
+            with self._lock:
+                mapping = self._load(language=language, user_type=user_type)
+                entry = {
+                    'version': version, 'mapping': mapping,
+                    'loaded_at': now, 'checked_at': now}
+                self._catalogs[key] = entry
+            return entry
+        except Exception:
+            logger.exception("Error when loading i8n catalog")
+            self._catalogs[key] = {
+                'version': None, 'mapping': None,
+                'loaded_at': now, 'checked_at': now}
+            return None
+
+    def preload(self, catalogs: list) -> None:
+        """Load catalogs before they are used.
+
+        Args:
+            catalogs (list):
+                List of `[language, user_type]` of the catalogs to load.
+        """
+        for language, user_type in catalogs:
+            self.get_entry(language=language, user_type=user_type)
+
+    @staticmethod
+    def _load(language: str, user_type: str) -> MappingProxyType:
+        """Load all translations of a language/user_type with one query."""
+        from pumpwood_djangoauth.i8n.models import PumpwoodI8nTranslation
+        stale_time = timezone.now() - datetime.timedelta(days=1)
+        query = PumpwoodI8nTranslation.objects\
+            .filter(language=language, user_type=user_type)\
+            .values_list(
+                'id', 'sentence', 'tag', 'plural', 'translation',
+                'last_used_at')
+        return MappingProxyType({
+            (sentence, tag, plural): (
+                translation, translation_id, last_used_at < stale_time)
+            for translation_id, sentence, tag, plural, translation,
+            last_used_at in query.iterator()})
+
+
+translation_catalog = PumpwoodI8nCatalog(
+    check_interval=_catalog_check_interval, max_age=_catalog_max_age)
+"""Catalog singleton used by `aux_translate_string`."""
+
+
+PRELOAD_DISPATCH_UID = "pumpwood-i8n-preload-catalog"
+"""Dispatch uid of `preload_translation_catalog` receiver."""
+
+
+def preload_translation_catalog(sender, **kwargs):
+    """Load `PUMPWOOD__I8N__PRELOAD_CATALOGS` at first request of worker.
+
+    Connected to `request_started` at `I8nConfig.ready` and disconnected
+    after first call, so catalogs are loaded once after apps are ready and
+    not during process startup.
+    """
+    from django.core.signals import request_started
+    request_started.disconnect(dispatch_uid=PRELOAD_DISPATCH_UID)
+    translation_catalog.preload(catalogs=_catalog_preload)
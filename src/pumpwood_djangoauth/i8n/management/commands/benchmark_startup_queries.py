@@ -0,0 +1,86 @@
+"""Benchmark database queries and time of process startup."""
+import sys
+import json
+import subprocess # NOQA
+from django.core.management.base import BaseCommand, CommandError
+
+
+STARTUP_SCRIPT = """
+import json
+import time
+import importlib
+start = time.perf_counter()
+import django
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+with CaptureQueriesContext(connection) as context:
+    django.setup()
+    setup_time = time.perf_counter() - start
+    from django.apps import apps
+    for app_config in apps.get_app_configs():
+        for module in ['models', 'admin', 'views', 'serializers']:
+            try:
+                importlib.import_module(app_config.name + '.' + module)
+            except ModuleNotFoundError:
+                pass
+print(json.dumps({
+    'setup_time': setup_time,
+    'total_time': time.perf_counter() - start,
+    'queries': [q['sql'] for q in context.captured_queries]}))
+"""
+"""Script run at a new interpreter, it prints queries made by
+   `django.setup()` and import of apps models, admin, views and
+   serializers as JSON at last line."""
+
+
+class Command(BaseCommand):
+    """Check that process startup does not query translations."""
+
+    help = (
+        "Run `django.setup()` and import apps models, admin, views and "
+        "serializers at a new process capturing database queries. Fail if "
+        "any query touches `i8n__translation` table.")
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--max-queries', type=int, default=None,
+            help="Also fail if startup made more queries than this value.")
+        parser.add_argument(
+            '--show-queries', action='store_true',
+            help="Print captured queries.")
+
+    def handle(self, *args, **options):
+        """Run startup at a new process and check captured queries."""
+        process = subprocess.run( # NOQA
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            capture_output=True, text=True)
+        if process.returncode != 0:
+            raise CommandError(
+                "Error at startup process:\n" + process.stderr)
+        results = json.loads(process.stdout.strip().splitlines()[-1])
+
+        queries = results['queries']
+        translation_queries = [
+            q for q in queries if 'i8n__translation' in q]
+        self.stdout.write(
+            "setup: {setup:.3f}s; setup and imports: {total:.3f}s; "
+            "queries: {n}; translation queries: {n_translation}".format(
+                setup=results['setup_time'], total=results['total_time'],
+                n=len(queries), n_translation=len(translation_queries)))
+        if options['show_queries']:
+            for q in queries:
+                self.stdout.write("  " + q)
+
+        if translation_queries:
+            raise CommandError(
+                "Startup made {n} translation queries".format(
+                    n=len(translation_queries)))
+        max_queries = options['max_queries']
+        if max_queries is not None and max_queries < len(queries):
+            raise CommandError(
+                "Startup made {n} queries, above {max_queries}".format(
+                    n=len(queries), max_queries=max_queries))
+        self.stdout.write(self.style.SUCCESS(
+            "Startup made no translation queries."))
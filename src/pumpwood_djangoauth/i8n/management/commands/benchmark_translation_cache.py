@@ -0,0 +1,77 @@
+"""Benchmark memory used by the in-memory translation cache."""
+import gc
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand, CommandError
+from pumpwood_djangoauth.i8n.translate import (
+    TranslationLRUCache, CACHE_KEY_TEMPLATE)
+
+
+class Command(BaseCommand):
+    """Fill a translation cache with distinct sentences and check memory."""
+
+    help = (
+        "Set distinct sentences at a `TranslationLRUCache` and fail if "
+        "memory allocated by the cache, measured with tracemalloc, is "
+        "above `--max-mb` times `--tolerance`.")
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--n-sentences', type=int, default=100000,
+            help="Number of distinct sentences set at the cache.")
+        parser.add_argument(
+            '--max-mb', type=float, default=8,
+            help="Memory cap of the benchmarked cache in MB.")
+        parser.add_argument(
+            '--max-entries', type=int, default=50000,
+            help="Entries cap of the benchmarked cache.")
+        parser.add_argument(
+            '--tolerance', type=float, default=1.1,
+            help="Accepted ratio between allocated memory and memory cap, "
+                 "cache size is an estimate.")
+
+    def handle(self, *args, **options):
+        """Run benchmark and raise CommandError if memory cap is broken."""
+        max_bytes = int(options['max_mb'] * 1024 * 1024)
+
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        cache = TranslationLRUCache(
+            max_entries=options['max_entries'], max_bytes=max_bytes,
+            ttl=3600)
+        for i in range(options['n_sentences']):
+            sentence = "Benchmark sentence number {i}".format(i=i)
+            key = CACHE_KEY_TEMPLATE.format(
+                sentence=sentence, tag="benchmark", plural=False,
+                language="pt-br", user_type="api")
+            cache.set(key, "Frase de benchmark número {i}".format(i=i))
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        allocated, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stats = cache.stats()
+        self.stdout.write(
+            "sentences: {n}; time: {elapsed:.2f}s; entries: {entries}; "
+            "evictions: {evictions}".format(
+                n=options['n_sentences'], elapsed=elapsed, **stats))
+        self.stdout.write(
+            "estimated: {estimated:.2f}MB; allocated: {allocated:.2f}MB; "
+            "peak: {peak:.2f}MB; cap: {cap:.2f}MB".format(
+                estimated=stats['bytes'] / 1024 ** 2,
+                allocated=allocated / 1024 ** 2, peak=peak / 1024 ** 2,
+                cap=max_bytes / 1024 ** 2))
+
+        if options['max_entries'] < stats['entries']:
+            raise CommandError(
+                "Cache kept {entries} entries, above cap of {cap}".format(
+                    entries=stats['entries'], cap=options['max_entries']))
+        if max_bytes * options['tolerance'] < allocated:
+            raise CommandError(
+                "Cache allocated {allocated:.2f}MB, above {limit:.2f}MB "
+                "(cap times tolerance)".format(
+                    allocated=allocated / 1024 ** 2,
+                    limit=max_bytes * options['tolerance'] / 1024 ** 2))
+        self.stdout.write(self.style.SUCCESS("Translation cache is bounded."))
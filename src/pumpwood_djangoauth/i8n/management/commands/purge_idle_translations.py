@@ -0,0 +1,50 @@
+"""Remove idle translations from database."""
+from django.core.management.base import BaseCommand
+from pumpwood_djangoauth.i8n.models import PumpwoodI8nTranslation
+
+
+class Command(BaseCommand):
+    """Remove translations not used for a number of days."""
+
+    help = (
+        "Remove translations not used for a number of days, translations "
+        "with do_not_remove=True are kept.")
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--idle-days', type=int, default=90,
+            help="Days without use to consider a translation idle.")
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of translations removed by each batch.")
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only report idle translations, do not remove them.")
+
+    def handle(self, *args, **options):
+        """Run purge and print report."""
+        results = PumpwoodI8nTranslation.purge_idle(
+            idle_days=options['idle_days'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'])
+
+        self.stdout.write(
+            "Idle translations (last used before {cutoff}): {n_idle}".format(
+                cutoff=results['cutoff'].isoformat(),
+                n_idle=results['n_idle']))
+        for catalog in results['by_catalog']:
+            self.stdout.write(
+                "  language[{language}] user_type[{user_type}]: "
+                "{n_idle}".format(**catalog))
+        if results['sample']:
+            self.stdout.write("Sample of idle sentences:")
+            for sentence in results['sample']:
+                self.stdout.write("  - {}".format(sentence[:100]))
+
+        if results['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                "Dry run, no translation was removed."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                "Removed translations: {}".format(results['n_deleted'])))
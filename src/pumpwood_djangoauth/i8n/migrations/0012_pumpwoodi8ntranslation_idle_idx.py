@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-19 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('i8n', '0011_i8s_blank_sentence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pumpwoodi8ntranslation',
+            index=models.Index(fields=['do_not_remove', 'last_used_at'], name='i8n__translation__idle_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('i8n', '0012_pumpwoodi8ntranslation_idle_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pumpwoodi8ntranslation',
+            index=models.Index(fields=['language', 'user_type'], name='i8n__translation__catalog_idx'),
+        ),
+    ]
@@ -1,8 +1,18 @@
 """Manage Kong routes for Pumpwood."""
-from django.db import models
+import json
+import hashlib
+import datetime
+from typing import List
+from django.db import models, connection, transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
 from pumpwood_djangoviews.action import action
+from pumpwood_communication.exceptions import PumpWoodActionArgsException
 from django.utils import timezone
 from pumpwood_djangoauth.config import diskcache, DISKCACHE_EXPIRATION
+from pumpwood_djangoauth.db_router import ReadReplicaAux
+from pumpwood_djangoauth.i8n.catalog import PumpwoodI8nCatalog
+from pumpwood_djangoauth.i8n.usage import translation_usage_buffer
 
 
 class PumpwoodI8nTranslation(models.Model):
@@ -10,10 +20,9 @@ class PumpwoodI8nTranslation(models.Model):
 
     TRANSLATION_CACHE_TAG = "i8n-translation"
     """Tag used to cache translations on diskcache."""
-    TRANSLATION_CACHE_HASH_TEMPLATE = (
-        "{sentence}__{tag}__{plural}__{language}__{user_type}")
-    """Template used to create the str that will be hashed to create diskcache
-       key."""
+    TRANSLATION_CACHE_KEY_TEMPLATE = "i8n-translation--v{version}--{digest}"
+    """Template used to create diskcache key from catalog version and
+       the digest of sentence/tag/plural/language/user_type."""
 
     sentence = models.TextField(
         null=False, unique=False, blank=True,
@@ -60,55 +69,93 @@ class PumpwoodI8nTranslation(models.Model):
         verbose_name_plural = 'Pumpwood I8n Translations'
         unique_together = [[
             'sentence', 'tag', 'plural', 'language', 'user_type']]
+        indexes = [
+            models.Index(
+                fields=['do_not_remove', 'last_used_at'],
+                name='i8n__translation__idle_idx'),
+            models.Index(
+                fields=['language', 'user_type'],
+                name='i8n__translation__catalog_idx'),
+        ]
 
     @classmethod
     def _get_translate_cache_key(cls, sentence: str, tag: str = "",
                                  plural: bool = False, language: str = "",
-                                 user_type: str = "") -> str:
+                                 user_type: str = "",
+                                 version: int = None) -> str:
         """Get translate cache key.
 
-        Uses `TRANSLATION_CACHE_HASH_TEMPLATE` to create a str and hash
-        this value to gererate the key of diskcache,
-        """
-        cls.TRANSLATION_CACHE_TAG
-        string_value = cls.TRANSLATION_CACHE_HASH_TEMPLATE.format(
-            sentence=sentence, tag=tag, plural=plural,
-            language=language, user_type=user_type)
+        Key is created using a sha256 digest of sentence/tag/plural/
+        language/user_type, so it is the same for all processes, and the
+        catalog version of language/user_type. Bumping catalog version
+        invalidates all cached translations of the catalog.
 
-        # Using Python hash, collision should not be a great problem... not
-        # used for authenticatication.
-        return hash(string_value)
+        Args:
+            sentence (str):
+                Sentence to be translated.
+            tag (str):
+                Tag of the translation.
+            plural (bool):
+                If translation is plural.
+            language (str):
+                Language of the translation.
+            user_type (str):
+                User type of the translation.
+            version (int):
+                Catalog version, if not set it will be fetched from
+                diskcache.
+        """
+        if version is None:
+            version = PumpwoodI8nCatalog.get_version(
+                language=language, user_type=user_type)
+        string_value = json.dumps(
+            [sentence, tag, bool(plural), language, user_type])
+        digest = hashlib.sha256(string_value.encode('utf-8')).hexdigest()
+        return cls.TRANSLATION_CACHE_KEY_TEMPLATE.format(
+            version=version, digest=digest)
 
     @classmethod
     def _get_translate_cache(cls, sentence: str, tag: str,
                              plural: bool, language: str,
-                             user_type: str) -> str:
-        """Get translate cache key.
+                             user_type: str, version: int = None) -> str:
+        """Get translation from diskcache.
 
-        Uses `TRANSLATION_CACHE_HASH_TEMPLATE` to create a str and hash
-        this value to gererate the key of diskcache,
+        Check `_get_translate_cache_key` for key creation.
         """
         key = cls._get_translate_cache_key(
             sentence=sentence, tag=tag, plural=plural,
-            language=language, user_type=user_type)
+            language=language, user_type=user_type, version=version)
         return diskcache.get(key)
 
     @classmethod
     def _set_translate_cache(cls, sentence: str, tag: str,
                              plural: bool, language: str,
-                             user_type: str, value: str) -> str:
+                             user_type: str, value: str,
+                             version: int = None) -> str:
         """Set translate cache value.
 
-        Uses `TRANSLATION_CACHE_HASH_TEMPLATE` to create a str and hash
-        this value to gererate the key of diskcache.
+        Check `_get_translate_cache_key` for key creation.
         """
         key = cls._get_translate_cache_key(
             sentence=sentence, tag=tag, plural=plural,
-            language=language, user_type=user_type)
+            language=language, user_type=user_type, version=version)
         return diskcache.set(
             key=key, value=value, expire=DISKCACHE_EXPIRATION,
             tag=cls.TRANSLATION_CACHE_TAG)
 
+    @classmethod
+    def _delete_translate_cache(cls, sentence: str, tag: str,
+                                plural: bool, language: str,
+                                user_type: str) -> bool:
+        """Delete translation from diskcache.
+
+        Check `_get_translate_cache_key` for key creation.
+        """
+        key = cls._get_translate_cache_key(
+            sentence=sentence, tag=tag, plural=plural,
+            language=language, user_type=user_type)
+        return diskcache.delete(key)
+
     @classmethod
     @action(info=(
         'Translate sentence according to sentence/tag/plural/'
@@ -143,9 +190,11 @@ class PumpwoodI8nTranslation(models.Model):
             same sentence.
         """
         # Check if translation is cached on diskcache
+        version = PumpwoodI8nCatalog.get_version(
+            language=language, user_type=user_type)
         cached_value = cls._get_translate_cache(
             sentence=sentence, tag=tag, plural=plural, language=language,
-            user_type=user_type)
+            user_type=user_type, version=version)
         if cached_value is not None:
             return cached_value
 
@@ -158,16 +207,287 @@ class PumpwoodI8nTranslation(models.Model):
                 language=language, user_type=user_type)
             translation_obj.save()
         else:
-            # Update once a day not to over request backend
+            # Update once a day, updates are buffered and flushed in bulk
+            # to not add writes to the translation path
             now_time = timezone.now()
             diff_timeused = now_time - translation_obj.last_used_at
             if 1 <= diff_timeused.days:
-                translation_obj.last_used_at = now_time
-                translation_obj.save()
+                translation_usage_buffer.touch(translation_obj.id)
 
         # Cache value to reduce calls on database
         return_value = translation_obj.translation or sentence
         cls._set_translate_cache(
             sentence=sentence, tag=tag, plural=plural, language=language,
-            user_type=user_type, value=return_value)
+            user_type=user_type, value=return_value, version=version)
         return return_value
+
+    @classmethod
+    def _parse_translate_entry(cls, entry) -> tuple:
+        """Parse a translate_many entry to a tuple.
+
+        Entries can be dictionaries with keys `sentence`, `tag`, `plural`,
+        `language` and `user_type` or lists/tuples with values in this
+        order. Only sentence is obligatory.
+        """
+        if isinstance(entry, dict):
+            if 'sentence' not in entry:
+                msg = "translate_many entries must have a 'sentence' key"
+                raise PumpWoodActionArgsException(
+                    message=msg, payload={'entry': entry})
+            entry_tuple = (
+                entry['sentence'], entry.get('tag', ''),
+                entry.get('plural', False), entry.get('language', ''),
+                entry.get('user_type', ''))
+        elif isinstance(entry, (list, tuple)) and 1 <= len(entry) <= 5:
+            entry_tuple = (
+                tuple(entry) + ('', False, '', '')[len(entry) - 1:])
+        else:
+            msg = (
+                "translate_many entries must be a dictionary or a list "
+                "(sentence, tag, plural, language, user_type)")
+            raise PumpWoodActionArgsException(
+                message=msg, payload={'entry': entry})
+
+        sentence, tag, plural, language, user_type = entry_tuple
+        return (
+            sentence, tag or '', bool(plural), language or '',
+            user_type or '')
+
+    @classmethod
+    @action(info=(
+        'Translate a list of sentences/tag/plural/language/user_type '
+        'with one query.'))
+    def translate_many(cls, translations: List[dict]) -> List[str]:
+        """Fetch translations of many sentences from database.
+
+        All translations are fetched with one query, sentences not
+        present at the table are created with one bulk insert.
+
+        Args:
+            translations (List[dict]):
+                List of dictionaries with keys `sentence`, `tag`, `plural`,
+                `language` and `user_type` or lists with these values in
+                this order. Only sentence is obligatory, check `translate`
+                for information about each key.
+
+        Returns:
+            Return the translated strings in the same order of
+            `translations`. If no translation found, return same sentence.
+        """
+        entries = [cls._parse_translate_entry(x) for x in translations]
+        results = [None] * len(entries)
+
+        # Check if translations are cached on diskcache
+        versions = {
+            (x[3], x[4]): PumpwoodI8nCatalog.get_version(
+                language=x[3], user_type=x[4])
+            for x in set(entries)}
+        missing = {}
+        for i, entry in enumerate(entries):
+            sentence, tag, plural, language, user_type = entry
+            cached_value = cls._get_translate_cache(
+                sentence=sentence, tag=tag, plural=plural,
+                language=language, user_type=user_type,
+                version=versions[(language, user_type)])
+            if cached_value is not None:
+                results[i] = cached_value
+            else:
+                missing.setdefault(entry, []).append(i)
+        if not missing:
+            return results
+
+        # Fetch a superset of the missing translations with one query
+        query = cls.objects\
+            .filter(
+                sentence__in={x[0] for x in missing.keys()},
+                language__in={x[3] for x in missing.keys()},
+                user_type__in={x[4] for x in missing.keys()})\
+            .values_list(
+                'id', 'sentence', 'tag', 'plural', 'language',
+                'user_type', 'translation', 'last_used_at')
+        now_time = timezone.now()
+        found = {}
+        for row in query:
+            row_entry = tuple(row[1:6])
+            if row_entry not in missing:
+                continue
+            found[row_entry] = row[6]
+            # Update once a day, updates are buffered and flushed in bulk
+            if 1 <= (now_time - row[7]).days:
+                translation_usage_buffer.touch(row[0])
+
+        new_objects = [
+            cls(sentence=sentence, tag=tag, plural=plural,
+                language=language, user_type=user_type)
+            for sentence, tag, plural, language, user_type in missing.keys()
+            if (sentence, tag, plural, language, user_type) not in found]
+        if new_objects:
+            cls.objects.bulk_create(new_objects, ignore_conflicts=True)
+
+        # Cache values to reduce calls on database
+        for entry, index_list in missing.items():
+            sentence, tag, plural, language, user_type = entry
+            return_value = found.get(entry) or sentence
+            cls._set_translate_cache(
+                sentence=sentence, tag=tag, plural=plural,
+                language=language, user_type=user_type, value=return_value,
+                version=versions[(language, user_type)])
+            for i in index_list:
+                results[i] = return_value
+        return results
+
+    @classmethod
+    @action(info='Statistics of the worker in-memory translation cache.',
+            permission_role='is_superuser')
+    def local_cache_stats(cls) -> dict:
+        """Return resident size and eviction statistics of translation cache.
+
+        Statistics are local to the worker process that answered the
+        request.
+
+        Returns:
+            Dictionary with keys `entries`, `bytes`, `max_entries`,
+            `max_bytes`, `hits`, `misses`, `evictions` and `expirations`.
+        """
+        from pumpwood_djangoauth.i8n.translate import (
+            get_translation_cache_stats)
+        return get_translation_cache_stats()
+
+    @classmethod
+    @action(info='Remove translations not used for more than idle_days.',
+            permission_role='is_superuser')
+    def purge_idle(cls, idle_days: int = 90, batch_size: int = 1000,
+                   dry_run: bool = True) -> dict:
+        """Remove translations that were not used for `idle_days`.
+
+        Translations with `do_not_remove=True` are never removed. Idle
+        translations are fetched using keyset pagination on id and
+        removed in batches of `batch_size`, each batch on its own
+        transaction. Catalog versions of the affected language/user_type
+        are bumped once at the end.
+
+        Args:
+            idle_days (int):
+                Number of days without use to consider a translation idle.
+            batch_size (int):
+                Number of translations removed by each batch.
+            dry_run (bool):
+                If True, idle translations are only reported and not
+                removed.
+
+        Returns:
+            A dictionary with keys `dry_run`, `cutoff`, `n_idle`,
+            `n_deleted`, `by_catalog` (number of idle translations by
+            language/user_type) and `sample` (first idle sentences).
+        """
+        if idle_days < 1 or batch_size < 1:
+            msg = "idle_days and batch_size must be greater than 0"
+            raise PumpWoodActionArgsException(
+                message=msg, payload={
+                    'idle_days': idle_days, 'batch_size': batch_size})
+
+        # Write buffered usage before checking for idle translations
+        translation_usage_buffer.flush()
+        cutoff = timezone.now() - datetime.timedelta(days=idle_days)
+        last_id = 0
+        n_idle = 0
+        n_deleted = 0
+        by_catalog = {}
+        sample = []
+        while True:
+            batch = list(
+                cls.objects
+                .filter(
+                    do_not_remove=False, last_used_at__lt=cutoff,
+                    id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'language', 'user_type', 'sentence')
+                [:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            n_idle += len(batch)
+            for __, language, user_type, sentence in batch:
+                catalog_key = (language, user_type)
+                by_catalog[catalog_key] = by_catalog.get(catalog_key, 0) + 1
+                if len(sample) < 20:
+                    sample.append(sentence)
+            if dry_run:
+                continue
+
+            # Use raw delete to not trigger per row signals, conditions
+            # are checked again since translations might have been used
+            ReadReplicaAux.pin_primary()
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "DELETE FROM i8n__translation "
+                        "WHERE id = ANY(%(ids)s) "
+                        "AND do_not_remove = FALSE "
+                        "AND last_used_at < %(cutoff)s",
+                        {'ids': [x[0] for x in batch], 'cutoff': cutoff})
+                    n_deleted += cursor.rowcount
+
+        if not dry_run:
+            for language, user_type in by_catalog.keys():
+                PumpwoodI8nCatalog.bump_version(
+                    language=language, user_type=user_type)
+        return {
+            'dry_run': dry_run,
+            'cutoff': cutoff,
+            'n_idle': n_idle,
+            'n_deleted': n_deleted,
+            'by_catalog': [
+                {'language': language, 'user_type': user_type,
+                 'n_idle': n}
+                for (language, user_type), n in sorted(by_catalog.items())],
+            'sample': sample}
+
+
+@receiver(pre_save, sender=PumpwoodI8nTranslation)
+def keep_previous_translation_key(sender, instance=None, **kwargs):
+    """Keep previous key values of edited translations.
+
+    They are used to invalidate caches of the previous
+    sentence/tag/plural/language/user_type if they were changed.
+    """
+    instance._previous_key = None
+    if instance.pk is None:
+        return None
+    instance._previous_key = sender.objects\
+        .filter(pk=instance.pk)\
+        .values_list(
+            'sentence', 'tag', 'plural', 'language', 'user_type')\
+        .first()
+
+
+@receiver(post_save, sender=PumpwoodI8nTranslation)
+@receiver(post_delete, sender=PumpwoodI8nTranslation)
+def invalidate_translation_cache(sender, instance=None, created=False,
+                                 update_fields=None, **kwargs):
+    """Invalidate caches when a translation is changed.
+
+    Translation diskcache entry is removed and catalog version of the
+    language/user_type is bumped, invalidating in-memory catalogs of all
+    workers. New sentences without translation created by `translate` and
+    updates of `last_used_at` do not change the result of the translation,
+    caches are not invalidated for them.
+    """
+    if created and not instance.translation:
+        return None
+    if update_fields is not None and set(update_fields) == {'last_used_at'}:
+        return None
+
+    keys = {(
+        instance.sentence, instance.tag, instance.plural,
+        instance.language, instance.user_type)}
+    previous_key = getattr(instance, '_previous_key', None)
+    if previous_key is not None:
+        keys.add(tuple(previous_key))
+    for sentence, tag, plural, language, user_type in keys:
+        sender._delete_translate_cache(
+            sentence=sentence, tag=tag, plural=plural, language=language,
+            user_type=user_type)
+    for language, user_type in {(x[3], x[4]) for x in keys}:
+        PumpwoodI8nCatalog.bump_version(
+            language=language, user_type=user_type)
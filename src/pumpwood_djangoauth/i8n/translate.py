@@ -1,19 +1,159 @@
 """Create a class to make lazy translation of strings."""
 import os
-import datetime
+import sys
+import time
+import threading
+from typing import List, Any
+from collections import OrderedDict
+from django.apps import apps
+from django.utils.functional import lazy
+from pumpwood_djangoauth.i8n.catalog import translation_catalog
+from pumpwood_djangoauth.i8n.usage import translation_usage_buffer
 
-# Translation cache to reduce backend calls
-_translation_cache: dict = {}
 _cache_expiry = float(os.getenv(
     "PUMPOOD__I8N__CACHE_EXPIRY", "1"))
+_cache_max_entries = int(os.getenv(
+    "PUMPWOOD__I8N__CACHE_MAX_ENTRIES", "50000"))
+_cache_max_mb = float(os.getenv(
+    "PUMPWOOD__I8N__CACHE_MAX_MB", "32"))
 CACHE_KEY_TEMPLATE: str = (
     "{sentence}||{tag}||{plural}||{language}||{user_type}")
 
 
+class TranslationLRUCache:
+    """Least recently used cache bounded by entries and memory with TTL.
+
+    Size of each entry is estimated using `sys.getsizeof` of key and value
+    plus a fixed overhead for the cache structures.
+    """
+
+    ENTRY_OVERHEAD = 280
+    """Estimated bytes used by cache structures for each entry, calibrated
+       with `benchmark_translation_cache` command."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        """__init__.
+
+        Args:
+            max_entries (int):
+                Maximum number of entries kept on cache.
+            max_bytes (int):
+                Maximum estimated memory used by cache entries.
+            ttl (float):
+                Seconds that an entry is considered valid.
+        """
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: str) -> Any:
+        """Get a value from cache, return None if not set or expired."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._misses += 1
+                return None
+
+            value, expire_at, size = item
+            if expire_at <= now:
+                del self._data[key]
+                self._bytes -= size
+                self._expirations += 1
+                self._misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Set a value at cache evicting least recently used entries."""
+        size = sys.getsizeof(key) + sys.getsizeof(value) + \
+            self.ENTRY_OVERHEAD
+        expire_at = time.monotonic() + self._ttl
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._data[key] = (value, expire_at, size)
+            self._bytes += size
+            while self._data and (
+                    self._max_entries < len(self._data) or
+                    self._max_bytes < self._bytes):
+                __, (__, __, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries from cache."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Return resident size and usage statistics of the cache.
+
+        Returns:
+            Dictionary with keys `entries`, `bytes`, `max_entries`,
+            `max_bytes`, `hits`, `misses`, `evictions` and `expirations`.
+        """
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self._max_entries,
+                'max_bytes': self._max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'expirations': self._expirations}
+
+
+# Translation cache to reduce backend calls
+_translation_cache = TranslationLRUCache(
+    max_entries=_cache_max_entries,
+    max_bytes=int(_cache_max_mb * 1024 * 1024),
+    ttl=_cache_expiry * 3600)
+
+
+def _get_catalog_translation(sentence, tag, plural, language,
+                             user_type) -> tuple:
+    """Get translation from in-memory catalog.
+
+    Translations not used in the last day when catalog was loaded are
+    marked as used at the usage buffer.
+
+    Returns:
+        Return a tuple (is_found, translation).
+    """
+    catalog = translation_catalog.get(language=language, user_type=user_type)
+    if catalog is None:
+        return False, None
+
+    catalog_value = catalog.get((sentence, tag, plural))
+    if catalog_value is None:
+        return False, None
+
+    translation, translation_id, is_stale = catalog_value
+    if is_stale:
+        translation_usage_buffer.touch(translation_id)
+    return True, translation or sentence
+
+
 def aux_translate_string(sentence, tag, plural, language, user_type) -> str:
     """Translate string using microservice.
 
-    Cache results to reduce database calls.
+    Translation is looked up first at the in-memory catalog of the
+    language/user_type, sentences not present at the catalog are fetched
+    from database and cached to reduce database calls.
 
     Args:
         sentence (str):
@@ -31,27 +171,43 @@ def aux_translate_string(sentence, tag, plural, language, user_type) -> str:
     Returns:
         Return translated sentence.
     """
+    __, translation = _translate_string(
+        sentence=sentence, tag=tag, plural=plural, language=language,
+        user_type=user_type)
+    return translation
+
+
+def _translate_string(sentence, tag, plural, language,
+                      user_type) -> tuple:
+    """Translate string returning if translation was resolved.
+
+    Returns:
+        Return a tuple (is_resolved, translation), `is_resolved` is False
+        if untranslated sentence was returned because apps are not ready or
+        database could not be queried.
+    """
     if sentence is None:
-        return None
+        return True, None
+
+    # Do not query database before apps are ready, during startup,
+    # translation will be resolved again when lazy string is used
+    if not apps.ready:
+        return False, sentence
+
+    is_found, translation = _get_catalog_translation(
+        sentence=sentence, tag=tag, plural=plural, language=language,
+        user_type=user_type)
+    if is_found:
+        return True, translation
 
-    now_time = datetime.datetime.utcnow()
+    # If not expired and not None translation will be returned
+    # without calling backend
     cache_key = CACHE_KEY_TEMPLATE.format(
         sentence=sentence, tag=tag, plural=plural, language=language,
         user_type=user_type)
-    cache_results = _translation_cache.get(cache_key, {})
-    # Check if translation can be considered expired or is not set yet
-    translation = cache_results.get("translation")
-    expiry_time = cache_results.get(
-        "expiry_time", datetime.datetime(1990, 1, 1))
-
-    # Translation cache not set
-    is_translation_none = translation is None
-    # Translation expired
-    is_translation_expired = expiry_time <= now_time
-    if not is_translation_none and not is_translation_expired:
-        # If not expired and not None translation will be returned
-        # without calling backend
-        return translation
+    translation = _translation_cache.get(cache_key)
+    if translation is not None:
+        return True, translation
 
     try:
         from pumpwood_djangoauth.i8n.models import PumpwoodI8nTranslation
@@ -59,17 +215,158 @@ def aux_translate_string(sentence, tag, plural, language, user_type) -> str:
             sentence=sentence, tag=tag, plural=plural,
             language=language, user_type=user_type)
     except Exception:
-        return sentence
+        return False, sentence
+
+    _translation_cache.set(cache_key, translation)
+    return True, translation
+
+
+def aux_translate_many(translations: List[dict]) -> List[str]:
+    """Translate many strings with at most one database query.
+
+    Translations are looked up at the in-memory catalog and local cache,
+    the missing ones are fetched together using
+    `PumpwoodI8nTranslation.translate_many`.
+
+    Args:
+        translations (List[dict]):
+            List of dictionaries with keys `sentence`, `tag`, `plural`,
+            `language` and `user_type`. Only sentence is obligatory.
+
+    Returns:
+        Return translated sentences in the same order of `translations`.
+    """
+    if not apps.ready:
+        return [x['sentence'] for x in translations]
+
+    results = [None] * len(translations)
+    missing_index = []
+    missing_entries = []
+    for i, entry in enumerate(translations):
+        sentence = entry['sentence']
+        tag = entry.get('tag', '')
+        plural = entry.get('plural', False)
+        language = entry.get('language', '')
+        user_type = entry.get('user_type', '')
+        if sentence is None:
+            continue
+
+        is_found, translation = _get_catalog_translation(
+            sentence=sentence, tag=tag, plural=plural, language=language,
+            user_type=user_type)
+        if is_found:
+            results[i] = translation
+            continue
+
+        cache_key = CACHE_KEY_TEMPLATE.format(
+            sentence=sentence, tag=tag, plural=plural, language=language,
+            user_type=user_type)
+        translation = _translation_cache.get(cache_key)
+        if translation is not None:
+            results[i] = translation
+            continue
+
+        missing_index.append((i, cache_key))
+        missing_entries.append({
+            'sentence': sentence, 'tag': tag, 'plural': plural,
+            'language': language, 'user_type': user_type})
+
+    if not missing_entries:
+        return results
+
+    try:
+        from pumpwood_djangoauth.i8n.models import PumpwoodI8nTranslation
+        missing_translations = PumpwoodI8nTranslation.translate_many(
+            translations=missing_entries)
+    except Exception:
+        for (i, cache_key), entry in zip(missing_index, missing_entries):
+            results[i] = entry['sentence']
+        return results
+
+    for (i, cache_key), translation in zip(
+            missing_index, missing_translations):
+        results[i] = translation
+        _translation_cache.set(cache_key, translation)
+    return results
+
+
+class LazyTranslationKey:
+    """Arguments of a lazy translation and its resolved value."""
+
+    __slots__ = (
+        'sentence', 'tag', 'plural', 'language', 'user_type', 'value')
+
+    def __init__(self, sentence, tag, plural, language, user_type):
+        """__init__."""
+        self.sentence = sentence
+        self.tag = tag
+        self.plural = plural
+        self.language = language
+        self.user_type = user_type
+        self.value = None
+
+    def __getstate__(self):
+        """Pickle arguments without resolved value."""
+        return (
+            self.sentence, self.tag, self.plural, self.language,
+            self.user_type)
+
+    def __setstate__(self, state):
+        """Unpickle arguments."""
+        self.__init__(*state)
+
 
-    expiry_time = now_time + datetime.timedelta(hours=_cache_expiry)
-    _translation_cache[cache_key] = {
-        "translation": translation, "expiry_time": expiry_time}
+def _resolve_lazy_translation(key: LazyTranslationKey) -> str:
+    """Resolve a lazy translation once, memoizing translated value.
+
+    Untranslated sentences returned before apps are ready or on database
+    errors are not memoized, they are resolved again on next use.
+    """
+    if key.value is not None:
+        return key.value
+    is_resolved, translation = _translate_string(
+        sentence=key.sentence, tag=key.tag, plural=key.plural,
+        language=key.language, user_type=key.user_type)
+    if is_resolved:
+        key.value = translation
     return translation
 
 
+_lazy_translate_string = lazy(_resolve_lazy_translation, str)
+
+
 def t(sentence, tag='', plural=False, language='', user_type=''):
-    """Create a Lazy String to translate sentence when used."""
-    return aux_translate_string(
-        sentence=sentence, tag=tag,
-        plural=plural, language=language,
-        user_type=user_type)
+    """Create a Lazy String to translate sentence when used.
+
+    Translation is resolved the first time the object is converted to
+    string (`str`, format, concatenation, ...) after apps are ready and
+    memoized, so it can be used at model `Meta` and fields definition
+    without any database query at import time.
+    """
+    if sentence is None:
+        return None
+    return _lazy_translate_string(LazyTranslationKey(
+        sentence=sentence, tag=tag, plural=plural, language=language,
+        user_type=user_type))
+
+
+def t_many(translations: List[dict]) -> List[str]:
+    """Translate a list of sentences at once.
+
+    Args:
+        translations (List[dict]):
+            List of dictionaries with keys `sentence`, `tag`, `plural`,
+            `language` and `user_type`. Only sentence is obligatory.
+
+    Returns:
+        Return translated sentences in the same order of `translations`.
+    """
+    return aux_translate_many(translations=translations)
+
+
+def get_translation_cache_stats() -> dict:
+    """Return resident size and eviction statistics of translation cache.
+
+    Statistics are local to the worker process.
+    """
+    return _translation_cache.stats()
@@ -1,4 +1,5 @@
 """Register URL."""
+from django.urls import path
 from pumpwood_djangoviews.routers import PumpWoodRouter
 from pumpwood_djangoauth.i8n import views
 
@@ -7,6 +8,9 @@ pumpwoodrouter = PumpWoodRouter()
 pumpwoodrouter.register(viewset=views.RestPumpwoodI8nTranslation)
 
 urlpatterns = [
+    path(
+        'rest/pumpwood/i8n-bundle/', views.view__get_translation_bundle,
+        name='rest__pumpwood_i8n_bundle'),
 ]
 
 urlpatterns += pumpwoodrouter.urls
@@ -0,0 +1,123 @@
+"""Write-behind buffer of translations usage."""
+import os
+import time
+import atexit
+import threading
+from loguru import logger
+from django.db import connection, transaction
+from django.utils import timezone
+
+_usage_flush_interval = float(os.getenv(
+    "PUMPWOOD__I8N__USAGE_FLUSH_INTERVAL", "60"))
+
+
+class TranslationUsageBuffer:
+    """Buffer ids of used translations and flush `last_used_at` in bulk.
+
+    Ids are kept in memory at each worker and flushed with one
+    `UPDATE ... WHERE id = ANY(...)` after `flush_interval` seconds, so
+    usage tracking does not add writes to translation read path. Each id
+    is buffered at most once each `touch_interval` seconds by worker,
+    touch times older than `touch_interval` are pruned at each flush and
+    at most `max_touched` are kept.
+    """
+
+    UPDATE_SQL = (
+        "UPDATE i8n__translation SET last_used_at = %(now)s "
+        "WHERE id = ANY(%(ids)s)")
+    """Query used to update last_used_at of the buffered ids."""
+
+    def __init__(self, flush_interval: float = 60,
+                 touch_interval: float = 86400,
+                 max_touched: int = 100000):
+        """__init__.
+
+        Args:
+            flush_interval (float):
+                Seconds between flushes of buffered ids.
+            touch_interval (float):
+                Seconds that an id will not be buffered again after
+                being touched.
+            max_touched (int):
+                Maximum number of touch times kept in memory, most recent
+                ones are kept.
+        """
+        self._flush_interval = flush_interval
+        self._touch_interval = touch_interval
+        self._max_touched = max_touched
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._touched_at = {}
+        self._last_flush = time.monotonic()
+
+    def touch(self, translation_id: int) -> None:
+        """Mark a translation as used.
+
+        Args:
+            translation_id (int):
+                Id of the translation used.
+        """
+        now = time.monotonic()
+        with self._lock:
+            touched_at = self._touched_at.get(translation_id)
+            if touched_at is not None and \
+                    now - touched_at < self._touch_interval:
+                return None
+            self._touched_at[translation_id] = now
+            self._pending.add(translation_id)
+            time_since_flush = now - self._last_flush
+        if self._flush_interval <= time_since_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Update `last_used_at` of buffered ids with one query."""
+        with self._lock:
+            pending = self._pending
+            self._pending = set()
+            self._last_flush = time.monotonic()
+            self._prune_touched(now=self._last_flush)
+        if not pending:
+            return None
+
+        try:
+            # Savepoint if called inside a transaction, errors must not
+            # abort the outer transaction
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        self.UPDATE_SQL,
+                        {'now': timezone.now(), 'ids': sorted(pending)})
+        except Exception:
+            logger.exception(
+                "Error when flushing i8n usage, {n} ids not updated",
+                n=len(pending))
+            # Let ids be touched again on next use
+            with self._lock:
+                for translation_id in pending:
+                    self._touched_at.pop(translation_id, None)
+
+    def _prune_touched(self, now: float) -> None:
+        """Remove expired touch times and cap their number.
+
+        Must be called holding `_lock`.
+
+        Args:
+            now (float):
+                Current monotonic time.
+        """
+        touched_at = {
+            translation_id: touched
+            for translation_id, touched in self._touched_at.items()
+            if now - touched < self._touch_interval}
+        if self._max_touched < len(touched_at):
+            recent = sorted(
+                touched_at.items(), key=lambda x: x[1],
+                reverse=True)[:self._max_touched]
+            touched_at = dict(recent)
+        self._touched_at = touched_at
+
+
+translation_usage_buffer = TranslationUsageBuffer(
+    flush_interval=_usage_flush_interval)
+"""Usage buffer singleton used by translation functions."""
+atexit.register(translation_usage_buffer.flush)
@@ -1,9 +1,39 @@
 """Create views for metabase end-points."""
+from rest_framework.decorators import api_view, permission_classes
 from pumpwood_djangoviews.views import PumpWoodRestService
+from pumpwood_communication.exceptions import PumpWoodException
 from pumpwood_djangoauth.config import storage_object, microservice
+from pumpwood_djangoauth.permissions import PumpwoodIsAuthenticated
+from pumpwood_djangoauth.views import etag_gzip_json_response
 from pumpwood_djangoauth.i8n.models import PumpwoodI8nTranslation
 from pumpwood_djangoauth.i8n.serializers import (
     PumpwoodI8nTranslationSerializer)
+from pumpwood_djangoauth.i8n.bundle import translation_bundle
+
+
+@api_view(['GET'])
+@permission_classes([PumpwoodIsAuthenticated])
+def view__get_translation_bundle(request):
+    """Return all translations of a language/user_type as gzip JSON.
+
+    Query parameters `language` and `user_type` select the catalog. A
+    strong ETag is returned and requests with a matching
+    `If-None-Match` header receive a 304 response.
+    """
+    language = request.GET.get('language', '')
+    user_type = request.GET.get('user_type', '')
+    bundle = translation_bundle.get(language=language, user_type=user_type)
+    if bundle is None:
+        msg = (
+            "It was not possible to load translation catalog for "
+            "language [{language}] and user_type [{user_type}]")
+        raise PumpWoodException(
+            message=msg, payload={
+                'language': language, 'user_type': user_type})
+
+    return etag_gzip_json_response(
+        request=request, etag=bundle['etag'],
+        get_content=lambda: bundle['content'])
 
 
 class RestPumpwoodI8nTranslation(PumpWoodRestService):
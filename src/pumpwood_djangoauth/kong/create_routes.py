@@ -1,9 +1,8 @@
 """Auxiliar module to create routes and services."""
 import os
-import time
-import random
 import textwrap
 from copy import deepcopy
+from loguru import logger
 from slugify import slugify
 
 
@@ -15,6 +14,11 @@ def register_auth_kong_objects(service_url: str, service_description: str,
                                service_extra_info: dict = {}):
     """Register auth objects in kong and add them to database.
 
+    Only routes that differ from Kong state are registered at Kong, see
+    `KongSyncAux`. Registration is made by one process for each service
+    definition, see `RegistrationLockAux`; other processes return without
+    waiting.
+
     Args:
         service_url (str):
             Microservice endpoint url.
@@ -67,19 +71,23 @@ def register_auth_kong_objects(service_url: str, service_description: str,
             Icon that will be associated with service.
         service_extra_info (dict):
             Extra info that will be saved with service.
+
+    Returns:
+        Return True if this process registered the service definition and
+        False if it was skipped.
     """
     from django import db
     from django.core.wsgi import get_wsgi_application
+    from pumpwood_djangoauth.config import PUMPWOOD__AUTH__KONG_SKIP_SYNCED
 
     # Load apps before importing then to code
     db.connections.close_all()
     get_wsgi_application()
-    from pumpwood_djangoauth.system.models import KongService, KongRoute
+    from pumpwood_djangoauth.kong.sync import KongSyncAux
+    from pumpwood_djangoauth.kong.registration_lock import (
+        RegistrationLockAux)
 
     temp_routes = deepcopy(routes)
-    sleep_time = random.uniform(0, 5)/60 # NOQA
-    print("Slepping random time to not crash workers: ", sleep_time)
-    time.sleep(sleep_time)
 
     ###########################
     # Get viewset information #
@@ -126,27 +134,44 @@ def register_auth_kong_objects(service_url: str, service_description: str,
                 "search_options": search_options
             }})
 
-    # Create Service
-    kong_service = KongService.create_service(
-        service_url=service_url,
-        service_name=service_name,
-        description=service_description,
-        notes=service_notes,
-        healthcheck_route=healthcheck_route,
-        dimensions=service_dimensions,
-        icon=service_icon,
-        extra_info=service_extra_info)
+    service = {
+        "service_url": service_url,
+        "service_name": service_name,
+        "description": service_description,
+        "notes": service_notes,
+        "healthcheck_route": healthcheck_route,
+        "dimensions": service_dimensions,
+        "icon": service_icon,
+        "extra_info": deepcopy(service_extra_info)}
+
+    # Only one process registers each service definition, others skip
+    definition_hash = RegistrationLockAux.get_definition_hash(
+        service=service, routes=temp_routes)
+    is_synced = PUMPWOOD__AUTH__KONG_SKIP_SYNCED and \
+        RegistrationLockAux.is_synced(
+            service_name=service_name, definition_hash=definition_hash)
+    if is_synced:
+        msg = "Service definition [{service_name}] already registered"
+        logger.info(msg.format(service_name=service_name))
+        return False
+    with RegistrationLockAux.try_lock(definition_hash) as is_locked:
+        if not is_locked:
+            msg = (
+                "Service definition [{service_name}] being registered by "
+                "other process")
+            logger.info(msg.format(service_name=service_name))
+            return False
+        is_synced = PUMPWOOD__AUTH__KONG_SKIP_SYNCED and \
+            RegistrationLockAux.is_synced(
+                service_name=service_name, definition_hash=definition_hash)
+        if is_synced:
+            msg = "Service definition [{service_name}] already registered"
+            logger.info(msg.format(service_name=service_name))
+            return False
 
-    # Create Routes
-    for route in temp_routes:
-        KongRoute.create_route(
-            service_id=kong_service["pk"],
-            route_url=route["route_url"],
-            route_name=route["route_name"],
-            route_type=route["route_type"],
-            strip_path=route.get("strip_path", False),
-            description=route["description"],
-            notes=route["notes"],
-            dimensions=route["dimensions"],
-            icon=route["icon"],
-            extra_info=route["extra_info"])
+        # Sync service and routes with Kong and database, definition is
+        # marked as synced only if all routes were registered
+        KongSyncAux.sync(service=service, routes=temp_routes)
+        RegistrationLockAux.set_synced(
+            service_name=service_name, definition_hash=definition_hash)
+    return True
@@ -0,0 +1,142 @@
+"""Elect one process to register a service definition on Kong."""
+import os
+import json
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from django.db import connection
+
+
+class RegistrationLockAux:
+    """Lock registration of service definitions to one process.
+
+    Definitions are identified by a hash of service and routes, it is
+    saved at `KongService.extra_info["definition_hash"]` by `set_synced`
+    after sync succeeded.
+    A Postgres session advisory lock keyed by the hash is used so only one
+    process of all workers and replicas registers each definition, others
+    skip without waiting. On other databases a local file lock is used,
+    electing one process for each host.
+    """
+
+    HASH_KEY = "definition_hash"
+    """Key of `KongService.extra_info` with the hash of last synced
+       definition."""
+
+    LOCK_FILE_TEMPLATE = "pumpwood-kong-registration--{definition_hash}.lock"
+    """Template of lock file name used if database is not Postgres."""
+
+    @classmethod
+    def get_definition_hash(cls, service: dict, routes: list) -> str:
+        """Return hash of a service definition.
+
+        Args:
+            service (dict):
+                Service definition, see `KongSyncAux.sync`.
+            routes (list):
+                Route definitions, see `KongSyncAux.sync`.
+
+        Returns:
+            Return sha256 hex digest of definition serialized as JSON.
+        """
+        definition = json.dumps(
+            {"service": service, "routes": routes}, sort_keys=True,
+            default=str)
+        return hashlib.sha256(definition.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def is_synced(cls, service_name: str, definition_hash: str) -> bool:
+        """Check if definition was already synced.
+
+        Args:
+            service_name (str):
+                Name of the service.
+            definition_hash (str):
+                Hash returned by `get_definition_hash`.
+
+        Returns:
+            Return True if service at database was synced with the
+            definition.
+        """
+        from pumpwood_djangoauth.system.models import KongService
+
+        return KongService.objects.filter(**{
+            "service_name": service_name,
+            "extra_info__" + cls.HASH_KEY: definition_hash}).exists()
+
+    @classmethod
+    def set_synced(cls, service_name: str, definition_hash: str) -> None:
+        """Save hash of synced definition at service `extra_info`.
+
+        It must be called only after sync of service and all its routes
+        succeeded, so a failed sync is retried by next process.
+
+        Args:
+            service_name (str):
+                Name of the service.
+            definition_hash (str):
+                Hash returned by `get_definition_hash`.
+        """
+        from pumpwood_djangoauth.system.models import KongService
+
+        service_obj = KongService.objects\
+            .filter(service_name=service_name).first()
+        service_obj.extra_info[cls.HASH_KEY] = definition_hash
+        service_obj.save(update_fields=['extra_info'])
+
+    @classmethod
+    @contextmanager
+    def try_lock(cls, definition_hash: str):
+        """Try to acquire registration lock without waiting.
+
+        Args:
+            definition_hash (str):
+                Hash returned by `get_definition_hash`.
+
+        Yields:
+            Return True if lock was acquired and False if other process
+            holds it.
+        """
+        if connection.vendor == 'postgresql':
+            with cls._try_advisory_lock(definition_hash) as is_locked:
+                yield is_locked
+        else:
+            with cls._try_file_lock(definition_hash) as is_locked:
+                yield is_locked
+
+    @classmethod
+    @contextmanager
+    def _try_advisory_lock(cls, definition_hash: str):
+        """Try Postgres session advisory lock keyed by definition hash."""
+        # Advisory lock keys are signed bigint
+        key = int.from_bytes(
+            bytes.fromhex(definition_hash[:16]), 'big', signed=True)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+            is_locked = cursor.fetchone()[0]
+        try:
+            yield is_locked
+        finally:
+            if is_locked:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
+
+    @classmethod
+    @contextmanager
+    def _try_file_lock(cls, definition_hash: str):
+        """Try local file lock, stand-in for databases other than Postgres."""
+        import fcntl
+
+        path = os.path.join(
+            tempfile.gettempdir(),
+            cls.LOCK_FILE_TEMPLATE.format(definition_hash=definition_hash))
+        with open(path, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
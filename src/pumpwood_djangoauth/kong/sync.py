@@ -0,0 +1,336 @@
+"""Declarative sync of services and routes with Kong and database."""
+from copy import deepcopy
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from django.db import transaction
+from django.db.models import Q
+from pumpwood_communication import exceptions
+from pumpwood_djangoauth.config import (
+    kong_api, PUMPWOOD__AUTH__KONG_SYNC_WORKERS)
+from pumpwood_djangoauth.registration.aux.permission_cache import (
+    PermissionCacheAux)
+
+
+class KongSyncAux:
+    """Sync desired services and routes with Kong and database.
+
+    Kong state is fetched once with `kong_api.list_all_routes`, only
+    routes missing at Kong or that differ from what was registered are
+    sent to Kong using a bounded thread pool and database rows are
+    inserted/updated in bulk. Routes that are not at desired state are
+    not removed.
+    """
+
+    ROUTE_FIELDS = [
+        'service_id', 'route_url', 'route_name', 'route_kong_id',
+        'route_type', 'description', 'notes', 'icon', 'dimensions',
+        'extra_info']
+    """Fields of `KongRoute` set by the sync, `availability` is set only
+       if passed on route definition."""
+
+    @classmethod
+    def get_kong_state(cls) -> dict:
+        """Return paths registered at Kong for each service name."""
+        return kong_api.list_all_routes()
+
+    @classmethod
+    def sync(cls, service: dict, routes: List[dict] = [],
+             kong_state: dict = None,
+             max_workers: int = None) -> dict:
+        """Sync a service and its routes with Kong and database.
+
+        Args:
+            service (dict):
+                Service definition with keys of `KongService.create_service`
+                arguments, `service_url`, `service_name`, `description`,
+                `notes`, `healthcheck_route`, `dimensions`, `icon` and
+                `extra_info`.
+            routes (List[dict]):
+                Route definitions with keys of `KongRoute.create_route`
+                arguments, `route_url`, `route_name`, `route_type`,
+                `description`, `notes`, `dimensions`, `icon`, `extra_info`
+                and optional `strip_path` and `availability`.
+            kong_state (dict):
+                State returned by `get_kong_state`, it will be fetched if
+                not passed.
+            max_workers (int):
+                Maximum number of concurrent calls to Kong, default
+                `PUMPWOOD__AUTH__KONG_SYNC_WORKERS`.
+
+        Returns:
+            Return a dictionary with `service_id` and counts of
+            `kong_registered`, `db_created`, `db_updated` and
+            `unchanged` routes.
+
+        Raises:
+            PumpWoodException:
+                Raise if registration of any route at Kong failed, see
+                `_sync_routes`.
+        """
+        from pumpwood_djangoauth.system.models import KongRoute
+
+        possible_types = [x[0] for x in KongRoute.ROUTE_TYPES]
+        for route in routes:
+            if route["route_type"] not in possible_types:
+                msg = (
+                    "route_type of route [{route_name}] must be in "
+                    "{possible_types}")
+                raise exceptions.PumpWoodActionArgsException(
+                    message=msg, payload={
+                        "route_name": route["route_name"],
+                        "possible_types": possible_types})
+
+        if kong_state is None:
+            kong_state = cls.get_kong_state()
+        kong_paths = kong_state.get(service["service_name"])
+        service_obj = cls._sync_service(
+            service=service, kong_paths=kong_paths)
+        return cls._sync_routes(
+            service_obj=service_obj, routes=routes,
+            kong_paths=kong_paths or [],
+            max_workers=max_workers or PUMPWOOD__AUTH__KONG_SYNC_WORKERS)
+
+    @classmethod
+    def _sync_service(cls, service: dict, kong_paths: list = None):
+        """Register service at Kong if necessary and upsert it on database.
+
+        Args:
+            service (dict):
+                Service definition.
+            kong_paths (list):
+                Paths registered at Kong for the service, None if service
+                is not registered at Kong.
+
+        Returns:
+            Return the `KongService` object.
+        """
+        from pumpwood_djangoauth.system.models import KongService
+
+        service_name = service["service_name"]
+        service_url = service["service_url"]
+        healthcheck_route = service.get("healthcheck_route")
+        service_obj = KongService.objects\
+            .filter(
+                Q(service_name=service_name) |
+                Q(service_url=service_url))\
+            .first()
+
+        is_registered = (
+            kong_paths is not None and service_obj is not None and
+            service_obj.service_name == service_name and
+            service_obj.service_url == service_url and
+            service_obj.healthcheck_route == healthcheck_route and
+            (healthcheck_route is None or healthcheck_route in kong_paths))
+        if is_registered:
+            kong_data = service_obj.extra_info.get("kong_data")
+            service_kong_id = service_obj.service_kong_id
+        else:
+            kong_data = kong_api.register_service(
+                service_name=service_name, service_url=service_url,
+                healthcheck_route=healthcheck_route,
+                connect_timeout=service.get("connect_timeout"),
+                write_timeout=service.get("write_timeout"),
+                read_timeout=service.get("read_timeout"),
+                retries=service.get("retries"),
+                client_max_body_size=service.get("client_max_body_size"))
+            service_kong_id = kong_data["id"]
+
+        extra_info = deepcopy(service.get("extra_info") or {})
+        extra_info["kong_data"] = kong_data
+        values = {
+            "service_url": service_url,
+            "service_name": service_name,
+            "service_kong_id": service_kong_id,
+            "description": service["description"],
+            "notes": service["notes"],
+            "healthcheck_route": healthcheck_route,
+            "dimensions": service.get("dimensions") or {},
+            "icon": service.get("icon"),
+            "extra_info": extra_info}
+        if service_obj is None:
+            service_obj = KongService(**values)
+            service_obj.save()
+        elif cls._set_changed(service_obj, values):
+            service_obj.save()
+        return service_obj
+
+    @classmethod
+    def _sync_routes(cls, service_obj, routes: List[dict],
+                     kong_paths: list, max_workers: int) -> dict:
+        """Register changed routes at Kong and upsert them in bulk.
+
+        Args:
+            service_obj (KongService):
+                Service associated with the routes.
+            routes (List[dict]):
+                Route definitions.
+            kong_paths (list):
+                Paths registered at Kong for the service.
+            max_workers (int):
+                Maximum number of concurrent calls to Kong.
+
+        Returns:
+            Return a dictionary with `service_id` and counts of
+            `kong_registered`, `db_created`, `db_updated` and
+            `unchanged` routes.
+
+        Raises:
+            PumpWoodException:
+                Raise if registration of any route at Kong failed, after
+                persisting the routes that succeeded. Payload has the
+                error of each failed route at `errors`.
+        """
+        from pumpwood_djangoauth.system.models import KongRoute
+
+        route_names = [r["route_name"] for r in routes]
+        route_urls = [r["route_url"] for r in routes]
+        map_name = {}
+        map_url = {}
+        registred_routes = KongRoute.objects.filter(
+            Q(route_name__in=route_names) | Q(route_url__in=route_urls))
+        for registred_route in registred_routes:
+            map_name[registred_route.route_name] = registred_route
+            map_url[registred_route.route_url] = registred_route
+
+        # Find routes that differ from what is registered at Kong
+        existing = {}
+        to_register = []
+        for route in routes:
+            route_obj = (
+                map_name.get(route["route_name"]) or
+                map_url.get(route["route_url"]))
+            existing[route["route_name"]] = route_obj
+            kong_data = {}
+            if route_obj is not None:
+                kong_data = route_obj.extra_info.get("kong_data") or {}
+            is_registered = (
+                route_obj is not None and
+                route["route_url"] in kong_paths and
+                route_obj.service_id == service_obj.id and
+                route_obj.route_url == route["route_url"] and
+                kong_data.get("name") == route["route_name"] and
+                kong_data.get("strip_path", False) ==
+                route.get("strip_path", False))
+            if not is_registered:
+                to_register.append(route)
+
+        # Kong calls are IO bound, threads do not access database
+        kong_results = {}
+        kong_errors = {}
+        if to_register:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    route["route_name"]: executor.submit(
+                        kong_api.register_route,
+                        service_name=service_obj.service_name,
+                        route_name=route["route_name"],
+                        route_url=route["route_url"],
+                        strip_path=route.get("strip_path", False))
+                    for route in to_register}
+                for route_name, future in futures.items():
+                    try:
+                        kong_results[route_name] = future.result()
+                    except Exception as e:
+                        kong_errors[route_name] = str(e)
+
+        to_create = []
+        to_update = []
+        update_availability = []
+        for route in routes:
+            if route["route_name"] in kong_errors:
+                continue
+            route_obj = existing[route["route_name"]]
+            kong_data = kong_results.get(route["route_name"])
+            if kong_data is None:
+                kong_data = route_obj.extra_info.get("kong_data")
+            extra_info = deepcopy(route.get("extra_info") or {})
+            extra_info["kong_data"] = kong_data
+            values = {
+                "service_id": service_obj.id,
+                "route_url": route["route_url"],
+                "route_name": route["route_name"],
+                "route_kong_id": kong_data["id"],
+                "route_type": route["route_type"],
+                "description": route["description"],
+                "notes": route["notes"],
+                "icon": route.get("icon"),
+                "dimensions": route.get("dimensions") or {},
+                "extra_info": extra_info}
+            availability = route.get("availability")
+            if route_obj is None:
+                if availability is not None:
+                    values["availability"] = availability
+                to_create.append(KongRoute(**values))
+                continue
+
+            # Keep availability when none is passed on definition
+            if availability is not None:
+                values["availability"] = availability
+            if cls._set_changed(route_obj, values):
+                if availability is not None:
+                    update_availability.append(route_obj)
+                else:
+                    to_update.append(route_obj)
+
+        # Bulk operations do not send post_save signals
+        with transaction.atomic():
+            if to_create:
+                KongRoute.objects.bulk_create(
+                    to_create, update_conflicts=True,
+                    unique_fields=['route_name'],
+                    update_fields=[
+                        f for f in cls.ROUTE_FIELDS if f != 'route_name'])
+            if to_update:
+                KongRoute.objects.bulk_update(
+                    to_update, fields=cls.ROUTE_FIELDS)
+            if update_availability:
+                KongRoute.objects.bulk_update(
+                    update_availability,
+                    fields=cls.ROUTE_FIELDS + ['availability'])
+            if to_create or to_update or update_availability:
+                transaction.on_commit(PermissionCacheAux.invalidate_routes)
+
+        n_updated = len(to_update) + len(update_availability)
+        result = {
+            "service_id": service_obj.id,
+            "kong_registered": len(to_register) - len(kong_errors),
+            "db_created": len(to_create),
+            "db_updated": n_updated,
+            "unchanged": (
+                len(routes) - len(kong_errors) - len(to_create) -
+                n_updated)}
+        msg = "Kong sync of service [{service_name}]: {result}".format(
+            service_name=service_obj.service_name, result=result)
+        logger.info(msg)
+
+        if kong_errors:
+            msg = (
+                "Error registering routes {route_names} of service "
+                "[{service_name}] at Kong, other routes were synced")
+            raise exceptions.PumpWoodException(
+                message=msg, payload={
+                    "route_names": sorted(kong_errors.keys()),
+                    "service_name": service_obj.service_name,
+                    "errors": kong_errors})
+        return result
+
+    @staticmethod
+    def _set_changed(obj, values: dict) -> bool:
+        """Set values that differ from object attributes.
+
+        Args:
+            obj:
+                Django model object.
+            values (dict):
+                Attribute values.
+
+        Returns:
+            Return True if any attribute was changed.
+        """
+        is_changed = False
+        for key, value in values.items():
+            if getattr(obj, key) != value:
+                setattr(obj, key, value)
+                is_changed = True
+        return is_changed
@@ -1,7 +1,19 @@
 """Functions to log activity at rest APIs."""
+import atexit
 import datetime
 from loguru import logger
 from pumpwood_communication.serializers import pumpJsonDump
+from pumpwood_djangoauth.config import (
+    PUMPWOOD__AUTH__USAGE_ROLLUP, PUMPWOOD__AUTH__USAGE_ROLLUP_FLUSH_INTERVAL)
+from pumpwood_djangoauth.log.rollup import ApiUsageRollup
+
+
+api_usage_rollup = ApiUsageRollup(
+    flush_interval=PUMPWOOD__AUTH__USAGE_ROLLUP_FLUSH_INTERVAL)
+"""Aggregate API calls at hourly/daily rollup tables if
+   `PUMPWOOD__AUTH__USAGE_ROLLUP` is set."""
+if PUMPWOOD__AUTH__USAGE_ROLLUP:
+    atexit.register(api_usage_rollup.flush)
 
 
 def log_api_request(user_id: int, permission_check: str, request_method: str,
@@ -16,6 +28,9 @@ def log_api_request(user_id: int, permission_check: str, request_method: str,
     If rabbitmq_api is not set, logs will be sent to STDOUT with prefix,
     ## api_request_log ## .
 
+    If `PUMPWOOD__AUTH__USAGE_ROLLUP` is set, call is also counted at
+    hourly/daily usage rollup tables.
+
     Args:
         user_id (int):
             ID of the logged user reponsible for the request.
@@ -58,4 +73,11 @@ def log_api_request(user_id: int, permission_check: str, request_method: str,
     log_template = "{time} | api_request | {log_dict}".format(
         time=log_time, log_dict=log_dict_str)
     logger.opt(raw=True).info(log_template)
+
+    if PUMPWOOD__AUTH__USAGE_ROLLUP:
+        api_usage_rollup.add(
+            user_id=user_id, path=log_dict['path'],
+            end_point=log_dict['end_point'],
+            request_method=log_dict['request_method'],
+            permission_check=log_dict['permission_check'])
     return None
@@ -1,17 +1,105 @@
 """Logging Middlewares."""
+import io
 import logging
 from pumpwood_djangoauth.log.functions import log_api_request
 from knox.auth import TokenAuthentication
-from pumpwood_djangoauth.config import MEDIA_URL
+from pumpwood_djangoauth.config import (
+    MEDIA_URL, PUMPWOOD__AUTH__LOG_PAYLOAD_PEEK_SIZE)
 
 request_logger = logging.getLogger(__name__)
 
+TEXT_CONTENT_TYPES = [
+    'application/json', 'application/x-www-form-urlencoded',
+    'application/xml']
+"""Content types that will have payload captured, other than `text/*`."""
+
 
 def list_get_or_none(list_obj, i):
     """Get an element from a list or return None."""
     return list_obj[i] if i < len(list_obj) else None
 
 
+class PeekedStream:
+    """Input stream that replays peeked bytes before the original stream.
+
+    Used to replace `request._stream` after peeking the body, so the view
+    still receives the full payload.
+    """
+
+    def __init__(self, peeked: bytes, stream):
+        """__init__.
+
+        Args:
+            peeked (bytes):
+                Bytes already read from stream.
+            stream:
+                Original stream, positioned after the peeked bytes.
+        """
+        self._peeked = io.BytesIO(peeked)
+        self._stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        """Read from peeked bytes and then from original stream."""
+        if size is None or size < 0:
+            return self._peeked.read() + self._stream.read()
+        data = self._peeked.read(size)
+        if len(data) < size:
+            data += self._stream.read(size - len(data))
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        """Read a line from peeked bytes and then from original stream."""
+        if size is None:
+            size = -1
+        line = self._peeked.readline(size)
+        if line.endswith(b"\n") or (0 <= size <= len(line)):
+            return line
+        remaining = -1 if size < 0 else size - len(line)
+        return line + self._stream.readline(remaining)
+
+
+def peek_request_payload(request,
+                         size: int = PUMPWOOD__AUTH__LOG_PAYLOAD_PEEK_SIZE
+                         ) -> str:
+    """Peek at most `size` bytes of request body without consuming it.
+
+    Body is not loaded in memory, only `size` bytes are read from the input
+    stream and it is replaced by a `PeekedStream` that replays them. Binary
+    and multipart content types are not captured.
+
+    Args:
+        request:
+            Django request.
+        size (int):
+            Maximum number of bytes to capture.
+
+    Returns:
+        Decoded captured payload or None if payload was not captured.
+    """
+    if size <= 0:
+        return None
+
+    content_type = request.content_type or ''
+    is_text = (
+        content_type in TEXT_CONTENT_TYPES or
+        content_type.startswith('text/') or
+        content_type.endswith('+json'))
+    if not is_text:
+        return None
+
+    # If body was already loaded there is no need to read stream
+    body = getattr(request, '_body', None)
+    if body is not None:
+        data = body[:size]
+    else:
+        stream = getattr(request, '_stream', None)
+        if stream is None or getattr(request, '_read_started', False):
+            return None
+        data = stream.read(size)
+        request._stream = PeekedStream(peeked=data, stream=stream)
+    return data.decode('utf-8', errors='replace')
+
+
 class RequestLogMiddleware:
     """Request Logging Middleware for Pumpwood Calls."""
 
@@ -57,11 +145,9 @@ class RequestLogMiddleware:
         end_point = list_get_or_none(splited_full_path, 7)
         first_arg = list_get_or_none(splited_full_path, 6)
 
-        # Do not log payload with multipart
         payload = None
-        is_multipart = request.content_type == "multipart/form-data"
-        if request_method == 'post' and not is_multipart:
-            payload = request.body[:300]
+        if request_method == 'post':
+            payload = peek_request_payload(request)
 
         log_api_request(
             user_id=request.user.id,
@@ -127,9 +213,8 @@ class RequestLogMiddleware:
             first_arg = list_get_or_none(splited_full_path, 3)
             second_arg = list_get_or_none(splited_full_path, 4)
             payload = None
-            is_multipart = request.content_type == "multipart/form-data"
-            if request_method == 'post' and not is_multipart:
-                payload = request.body[:300]
+            if request_method == 'post':
+                payload = peek_request_payload(request)
             log_api_request(
                 user_id=user_id,
                 permission_check='ok',
@@ -0,0 +1,214 @@
+"""Incremental hourly/daily rollups of API calls."""
+import time
+import datetime
+import threading
+from loguru import logger
+from django.db import connection, transaction
+
+
+class ApiUsageRollup:
+    """Aggregate API calls in memory and upsert them at rollup tables.
+
+    Calls are counted at each worker by hour, route, user, end-point and
+    request method. Counters are flushed to `pumpwood__route_usage_hourly`
+    and `pumpwood__route_usage_daily` using `INSERT ... ON CONFLICT`, so
+    analytics queries never have to scan the raw API logs.
+
+    Calls without an authenticated user or that do not match a registered
+    route are not aggregated, they are kept only at the raw logs. Counters
+    of routes or users deleted before the flush are skipped and counters
+    are upserted by chunks, so an error does not lose all of them.
+    Remaining counters are flushed at process exit (see
+    `log_api_request`).
+    """
+
+    UPSERT_SQL = """
+        INSERT INTO {table}
+            ({period}, route_id, user_id, end_point, request_method,
+             n_calls, n_failed)
+        SELECT
+            counter.period, counter.route_id, counter.user_id,
+            counter.end_point, counter.request_method, counter.n_calls,
+            counter.n_failed
+        FROM (VALUES {values}) AS counter
+            (period, route_id, user_id, end_point, request_method,
+             n_calls, n_failed)
+        WHERE EXISTS (
+                SELECT 1 FROM {route_table} AS route
+                WHERE route.{route_pk} = counter.route_id)
+          AND EXISTS (
+                SELECT 1 FROM {user_table} AS usr
+                WHERE usr.{user_pk} = counter.user_id)
+        ON CONFLICT ({period}, route_id, user_id, end_point, request_method)
+        DO UPDATE SET
+            n_calls = {table}.n_calls + EXCLUDED.n_calls,
+            n_failed = {table}.n_failed + EXCLUDED.n_failed
+    """
+    """Upsert query of rollup tables, counters of routes or users deleted
+       since they were counted are skipped."""
+
+    ROW_TEMPLATE = (
+        "(%s::{period_type}, %s::bigint, %s::bigint, %s, %s, %s::bigint, "
+        "%s::bigint)")
+    """Template of each row at `VALUES`, `period_type` is `timestamptz`
+       for hourly and `date` for daily rollup."""
+
+    CHUNK_SIZE = 1000
+    """Number of counters upserted by each statement, each chunk runs
+       at its own savepoint so errors lose only its counters."""
+
+    def __init__(self, flush_interval: int = 60,
+                 route_refresh_interval: int = 300):
+        """__init__.
+
+        Args:
+            flush_interval (int):
+                Seconds that counters are kept in memory before flushing
+                them to database.
+            route_refresh_interval (int):
+                Seconds that route urls are kept in memory to map paths to
+                routes.
+        """
+        self._flush_interval = flush_interval
+        self._route_refresh_interval = route_refresh_interval
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._last_flush = time.monotonic()
+        self._routes = []
+        self._routes_loaded_at = None
+
+    def add(self, user_id: int, path: str, end_point: str,
+            request_method: str, permission_check: str) -> None:
+        """Count an API call, flushing counters if flush interval passed.
+
+        Args:
+            user_id (int):
+                ID of the user responsible for the call.
+            path (str):
+                Full request path.
+            end_point (str):
+                End-point used at the call.
+            request_method (str):
+                HTTP method used on the call.
+            permission_check (str):
+                Result of the permission check, 'failed' calls are also
+                counted at `n_failed`.
+        """
+        if user_id is None or not path:
+            return None
+
+        route_id = self._map_path_route(path)
+        if route_id is None:
+            return None
+
+        hour = datetime.datetime.now(datetime.UTC).replace(
+            minute=0, second=0, microsecond=0)
+        key = (
+            hour, route_id, user_id, (end_point or '')[:100],
+            (request_method or '')[:10])
+        is_failed = int(permission_check == 'failed')
+        with self._lock:
+            n_calls, n_failed = self._counters.get(key, (0, 0))
+            self._counters[key] = (n_calls + 1, n_failed + is_failed)
+            time_since_flush = time.monotonic() - self._last_flush
+        if self._flush_interval <= time_since_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Upsert in memory counters at hourly and daily rollup tables."""
+        with self._lock:
+            counters = self._counters
+            self._counters = {}
+            self._last_flush = time.monotonic()
+        if not counters:
+            return None
+
+        hourly_rows = []
+        daily_counters = {}
+        for key, (n_calls, n_failed) in counters.items():
+            hour, route_id, user_id, end_point, request_method = key
+            hourly_rows.append((
+                hour, route_id, user_id, end_point, request_method,
+                n_calls, n_failed))
+            daily_key = (
+                hour.date(), route_id, user_id, end_point, request_method)
+            daily_n_calls, daily_n_failed = daily_counters.get(
+                daily_key, (0, 0))
+            daily_counters[daily_key] = (
+                daily_n_calls + n_calls, daily_n_failed + n_failed)
+        daily_rows = [
+            key + value for key, value in daily_counters.items()]
+
+        self._upsert(
+            table='pumpwood__route_usage_hourly', period='hour',
+            period_type='timestamptz', rows=hourly_rows)
+        self._upsert(
+            table='pumpwood__route_usage_daily', period='day',
+            period_type='date', rows=daily_rows)
+
+    def _upsert(self, table: str, period: str, period_type: str,
+                rows: list) -> None:
+        """Upsert counters at a rollup table by chunks.
+
+        Args:
+            table (str):
+                Rollup table.
+            period (str):
+                Period column of the table, `hour` or `day`.
+            period_type (str):
+                Database type of period column.
+            rows (list):
+                Rows `(period, route_id, user_id, end_point,
+                request_method, n_calls, n_failed)`.
+        """
+        from django.contrib.auth import get_user_model
+        from pumpwood_djangoauth.system.models import KongRoute
+
+        user_meta = get_user_model()._meta
+        route_meta = KongRoute._meta
+        row_template = self.ROW_TEMPLATE.format(period_type=period_type)
+        for i in range(0, len(rows), self.CHUNK_SIZE):
+            chunk = rows[i:i + self.CHUNK_SIZE]
+            sql = self.UPSERT_SQL.format(
+                table=table, period=period,
+                values=", ".join([row_template] * len(chunk)),
+                route_table=route_meta.db_table,
+                route_pk=route_meta.pk.column,
+                user_table=user_meta.db_table, user_pk=user_meta.pk.column)
+            params = [value for row in chunk for value in row]
+            try:
+                # Savepoint if flush runs inside a request transaction
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute(sql, params)
+            except Exception:
+                logger.exception(
+                    "Error when flushing API usage rollup to {table}, "
+                    "{n} counters lost", table=table, n=len(chunk))
+
+    def _map_path_route(self, path: str) -> int:
+        """Map a request path to a route id using longest url prefix."""
+        now = time.monotonic()
+        is_expired = (
+            self._routes_loaded_at is None or
+            self._route_refresh_interval < now - self._routes_loaded_at)
+        if is_expired:
+            from pumpwood_djangoauth.system.models import KongRoute
+            try:
+                routes = [
+                    ("/" + route_url.strip("/") + "/", route_id)
+                    for route_url, route_id in KongRoute.objects
+                    .values_list('route_url', 'id')]
+            except Exception:
+                logger.exception("Error when loading routes for API usage")
+                routes = []
+            # Sort by url length so the first match is the longest prefix
+            routes.sort(key=lambda x: len(x[0]), reverse=True)
+            self._routes = routes
+            self._routes_loaded_at = now
+
+        norm_path = "/" + path.strip("/") + "/"
+        for route_url, route_id in self._routes:
+            if norm_path.startswith(route_url):
+                return route_id
+        return None
@@ -2,8 +2,11 @@
 # Import specific functions/classes from submodules
 from .api_permission import ApiPermissionAux
 from .row_permission import RowPermissionAux
+from .permission_cache import PermissionCacheAux
+from .capability_map import CapabilityMapAux
 
 
 __docformat__ = "google"
 __all__ = [
-    ApiPermissionAux, RowPermissionAux]
+    ApiPermissionAux, RowPermissionAux, PermissionCacheAux,
+    CapabilityMapAux]
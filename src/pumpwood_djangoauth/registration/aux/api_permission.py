@@ -1,8 +1,10 @@
 """Functions to help fetching permissions from user."""
-import pandas as pd
 import importlib.resources as pkg_resources
-from typing import List
-from django.db import connection
+from typing import List, Dict, Tuple
+from pumpwood_djangoauth.config import diskcache, DISKCACHE_EXPIRATION
+from pumpwood_djangoauth.db_router import get_read_connection
+from pumpwood_djangoauth.registration.aux.permission_cache import (
+    PermissionCacheAux)
 
 # Read sql query from package resources
 group_user_api_permissions = pkg_resources.read_text(
@@ -11,7 +13,29 @@ group_user_api_permissions = pkg_resources.read_text(
 
 
 class ApiPermissionAux:
-    """Auxiliary class to fetch user's permissions."""
+    """Auxiliary class to fetch user's permissions.
+
+    Serialized routes are cached at diskcache by routes version of
+    `PermissionCacheAux`, so routes are serialized once after each route
+    change instead of at each call. Permission rows of users are cached by
+    user permission version.
+    """
+
+    ROLE_COLUMNS = [
+        'can_delete', 'can_delete_file', 'can_delete_many', 'can_list',
+        'can_list_without_pag', 'can_retrieve', 'can_retrieve_file',
+        'can_run_actions', 'can_save']
+    """Role columns returned by `group_user_api_permissions.sql` after
+       `route_id`."""
+
+    ROUTES_CACHE_TAG = "api-permission-routes"
+    """Tag of cached serialized routes."""
+
+    ROUTES_CACHE_KEY_TEMPLATE = "api-permission-routes--v[{version}]"
+    """Template of the key of cached serialized routes."""
+
+    USER_CACHE_KEY_TEMPLATE = "api-permission--u[{user_id}]_v[{version}]"
+    """Template of the key of cached permission rows of an user."""
 
     @classmethod
     def get(cls, user, request):
@@ -29,62 +53,92 @@ class ApiPermissionAux:
             return cls._get_non_superuser(user=user, request=request)
 
     @classmethod
-    def _get_superuser(cls, request) -> List[dict]:
-        """Return permissions of a superuser.
-
-        It will simulate allow permission from all routes, but they will be not
-        present on database
+    def get_routes(cls, request) -> Dict[int, dict]:
+        """Return serialized routes using cache.
 
         Args:
             request:
                 Django request.
+
+        Returns:
+            Return a dictionary mapping route id to route serialized with
+            `KongRouteSerializer` default fields and `__display_name__`.
         """
         # Import dependencies on function to skip circular imports
         from pumpwood_djangoauth.system.models import KongRoute
         from pumpwood_djangoauth.system.serializers import KongRouteSerializer
 
-        all_routes = KongRoute.objects.all()
+        key = cls.ROUTES_CACHE_KEY_TEMPLATE.format(
+            version=PermissionCacheAux.get_routes_version())
+        map_route = diskcache.get(key)
+        if map_route is not None:
+            return map_route
+
         routed_data = KongRouteSerializer(
-            all_routes, many=True, default_fields=True,
+            KongRoute.objects.all(), many=True, default_fields=True,
             context={'request': request}).data
-
-        list_permissions = []
+        map_route = {}
         for r in routed_data:
+            r = dict(r)
             r['__display_name__'] = r.get('route_name')
-            list_permissions.append({
-                'route_id': r['pk'],
-                'route': r,
-                'can_list': True,
-                'can_list_without_pag': True,
-                'can_retrieve': True,
-                'can_retrieve_file': True,
-                'can_delete': True,
-                'can_delete_many': True,
-                'can_delete_file': True,
-                'can_save': True,
-                'can_run_actions': True})
-        return list_permissions
+            map_route[r['pk']] = r
+        diskcache.set(
+            key=key, value=map_route, expire=DISKCACHE_EXPIRATION,
+            tag=cls.ROUTES_CACHE_TAG)
+        return map_route
 
     @classmethod
-    def _get_non_superuser(cls, user, request) -> List[dict]:
-        """Get non superuser permissions associated with user."""
-        from pumpwood_djangoauth.system.models import KongRoute
-        from pumpwood_djangoauth.system.serializers import KongRouteSerializer
+    def get_rows(cls, user_id: int) -> Tuple[tuple]:
+        """Return permission rows of a non superuser using cache.
 
-        query_parameters = {"user_id": user.id}
-        with connection.cursor() as cursor:
-            cursor.execute(group_user_api_permissions, query_parameters)
-            rows = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-        pd_results = pd.DataFrame(rows, columns=columns)
+        Args:
+            user_id (int):
+                User primary key.
 
-        query_result = KongRoute.objects.filter(id__in=pd_results['route_id'])
-        routed_data = KongRouteSerializer(
-            query_result, many=True, default_fields=True,
-            context={'request': request}).data
-        for r in routed_data:
-            r['__display_name__'] = r.get('route_name')
-        map_route = dict([(r['pk'], r) for r in routed_data])
+        Returns:
+            Return a tuple of rows `(route_id, *ROLE_COLUMNS)`.
+        """
+        key = cls.USER_CACHE_KEY_TEMPLATE.format(
+            user_id=user_id,
+            version=PermissionCacheAux.get_version(user_id=user_id))
+        rows = diskcache.get(key)
+        if rows is not None:
+            return rows
+
+        read_connection = get_read_connection(aux='ApiPermissionAux')
+        with read_connection.cursor() as cursor:
+            cursor.execute(
+                group_user_api_permissions, {"user_id": user_id})
+            rows = tuple(cursor.fetchall())
+        diskcache.set(key=key, value=rows, expire=DISKCACHE_EXPIRATION)
+        return rows
+
+    @classmethod
+    def _get_superuser(cls, request) -> List[dict]:
+        """Return permissions of a superuser.
+
+        It will simulate allow permission from all routes, but they will be not
+        present on database
+
+        Args:
+            request:
+                Django request.
+        """
+        list_permissions = []
+        for route_id, route in cls.get_routes(request=request).items():
+            permission = {'route_id': route_id, 'route': route}
+            permission.update(dict.fromkeys(cls.ROLE_COLUMNS, True))
+            list_permissions.append(permission)
+        return list_permissions
 
-        pd_results['route'] = pd_results['route_id'].map(map_route)
-        return pd_results
+    @classmethod
+    def _get_non_superuser(cls, user, request) -> List[dict]:
+        """Get non superuser permissions associated with user."""
+        map_route = cls.get_routes(request=request)
+        list_permissions = []
+        for route_id, *values in cls.get_rows(user_id=user.id):
+            permission = {'route_id': route_id}
+            permission.update(zip(cls.ROLE_COLUMNS, values))
+            permission['route'] = map_route.get(route_id)
+            list_permissions.append(permission)
+        return list_permissions
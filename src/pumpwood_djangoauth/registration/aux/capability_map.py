@@ -0,0 +1,130 @@
+"""Compact map of user's permissions on all routes for frontends."""
+import gzip
+import json
+import time
+import importlib.resources as pkg_resources
+from pumpwood_djangoauth.config import diskcache, DISKCACHE_EXPIRATION
+from pumpwood_djangoauth.db_router import get_read_connection
+from pumpwood_djangoauth.registration.aux.api_permission import (
+    ApiPermissionAux)
+from pumpwood_djangoauth.registration.aux.permission_cache import (
+    PermissionCacheAux)
+from pumpwood_djangoauth.system.aux.policy_engine import PolicyEngine
+
+# Read sql query from package resources
+user_action_permissions = pkg_resources.read_text(
+    'pumpwood_djangoauth.registration.aux.query',
+    'user_action_permissions.sql')
+
+
+class CapabilityMapAux:
+    """Build capability map of an user as a gzip JSON document.
+
+    Document has keys:
+    - `etag`: ETag of the document.
+    - `roles`: role names, the role at index `i` is the bit `1 << i` of
+      the route masks.
+    - `routes`: route id to role bitmask, routes without permission are
+      omitted.
+    - `actions`: route id to `{"allow": [...], "deny": [...]}` with
+      actions of custom action policies. An action can be run if route
+      mask has `can_run_actions` bit or action is at `allow` list.
+
+    ETag is composed by user's permission version and routes version from
+    `PermissionCacheAux`, and a time window of `DISKCACHE_EXPIRATION`
+    seconds since changes made at other pods do not bump local versions.
+    Compiled documents are cached at diskcache by ETag.
+    """
+
+    CACHE_KEY_TEMPLATE = "capability-map--u[{user_id}]_e[{etag}]"
+    """Template of the diskcache key of compiled capability maps."""
+
+    @classmethod
+    def get_etag(cls, user) -> str:
+        """Return strong ETag of the user's capability map.
+
+        Args:
+            user (User):
+                User of the capability map.
+
+        Returns:
+            Return a quoted ETag string.
+        """
+        window = int(time.time() // max(int(DISKCACHE_EXPIRATION), 1))
+        return '"{kind}{version}.{routes_version}.{window}"'.format(
+            kind='s' if user.is_superuser else 'u',
+            version=PermissionCacheAux.get_version(user_id=user.id),
+            routes_version=PermissionCacheAux.get_routes_version(),
+            window=window)
+
+    @classmethod
+    def get(cls, user, etag: str = None) -> dict:
+        """Return compiled capability map of the user.
+
+        Args:
+            user (User):
+                User of the capability map.
+            etag (str):
+                ETag returned by `get_etag`, computed if not set.
+
+        Returns:
+            Return a dictionary with keys `etag` and `content` (gzip
+            compressed JSON).
+        """
+        etag = etag or cls.get_etag(user=user)
+        key = cls.CACHE_KEY_TEMPLATE.format(user_id=user.id, etag=etag)
+        capability_map = diskcache.get(key)
+        if capability_map is not None:
+            return capability_map
+
+        document = json.dumps(
+            cls.build(user=user, etag=etag),
+            separators=(',', ':')).encode('utf-8')
+        capability_map = {
+            'etag': etag,
+            # mtime=0 to make compressed content deterministic
+            'content': gzip.compress(document, mtime=0)}
+        diskcache.set(key, capability_map, expire=DISKCACHE_EXPIRATION)
+        return capability_map
+
+    @classmethod
+    def build(cls, user, etag: str = None) -> dict:
+        """Build capability map document of the user.
+
+        Args:
+            user (User):
+                User of the capability map.
+            etag (str):
+                ETag to be set at the document.
+
+        Returns:
+            Return capability map document.
+        """
+        from pumpwood_djangoauth.system.models import KongRoute
+
+        routes = {}
+        actions = {}
+        if user.is_superuser:
+            all_roles = (1 << len(PolicyEngine.ROLE_COLUMNS)) - 1
+            for route_id in KongRoute.objects.values_list('id', flat=True):
+                routes[route_id] = all_roles
+        else:
+            for route_id, *values in ApiPermissionAux.get_rows(
+                    user_id=user.id):
+                mask = PolicyEngine.get_role_mask(
+                    dict(zip(ApiPermissionAux.ROLE_COLUMNS, values)))
+                if mask:
+                    routes[route_id] = mask
+
+            read_connection = get_read_connection(aux='CapabilityMapAux')
+            with read_connection.cursor() as cursor:
+                cursor.execute(user_action_permissions, {"user_id": user.id})
+                rows = cursor.fetchall()
+            for route_id, action, is_allowed in rows:
+                route_actions = actions.setdefault(
+                    route_id, {"allow": [], "deny": []})
+                route_actions["allow" if is_allowed else "deny"].append(
+                    action)
+        return {
+            'etag': etag, 'roles': PolicyEngine.ROLE_COLUMNS,
+            'routes': routes, 'actions': actions}
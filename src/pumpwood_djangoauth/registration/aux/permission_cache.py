@@ -0,0 +1,107 @@
+"""Invalidation of users' permission caches."""
+from typing import List
+from pumpwood_djangoauth.config import diskcache
+from pumpwood_djangoauth.db_router import ReadReplicaAux
+
+
+class PermissionCacheAux:
+    """Invalidate API and row permission caches of users.
+
+    API permission cache keys include a version stamp composed by a global
+    and a per user version stored at diskcache, invalidating users bumps
+    their version so all their cached permissions are ignored without
+    scanning cache keys. Row permission cache entries are removed
+    directly.
+
+    Since diskcache is local to each pod, invalidation affects only the
+    pod that processed the change, other pods will refresh permissions
+    after `DISKCACHE_EXPIRATION`.
+
+    Bumping versions pins reads to primary database for the read replica
+    pin window (`ReadReplicaAux.pin_primary`), so caches keyed by the new
+    version are not filled with rows of a lagging replica.
+    """
+
+    USER_VERSION_KEY_TEMPLATE = "permission-version--user[{user_id}]"
+    """Template of the diskcache key with user permission version."""
+
+    GLOBAL_VERSION_KEY = "permission-version--global"
+    """Diskcache key with global permission version."""
+
+    ROUTES_VERSION_KEY = "permission-version--routes"
+    """Diskcache key with version of registered routes."""
+
+    @classmethod
+    def get_version(cls, user_id: int) -> str:
+        """Get permission version of an user.
+
+        Args:
+            user_id (int):
+                User primary key.
+
+        Returns:
+            Return a string `{global_version}.{user_version}` to be used
+            at permission cache keys.
+        """
+        return "{}.{}".format(
+            cls.get_global_version(), cls.get_user_version(user_id=user_id))
+
+    @classmethod
+    def get_global_version(cls) -> int:
+        """Get global permission version, bumped when policies change."""
+        return diskcache.get(cls.GLOBAL_VERSION_KEY, default=0)
+
+    @classmethod
+    def get_user_version(cls, user_id: int) -> int:
+        """Get user permission version, bumped when memberships change."""
+        return diskcache.get(
+            cls.USER_VERSION_KEY_TEMPLATE.format(user_id=user_id),
+            default=0)
+
+    @classmethod
+    def get_routes_version(cls) -> int:
+        """Get version of registered routes."""
+        return diskcache.get(cls.ROUTES_VERSION_KEY, default=0)
+
+    @classmethod
+    def invalidate_users(cls, user_ids: List[int]) -> int:
+        """Invalidate permission caches of users.
+
+        Args:
+            user_ids (List[int]):
+                Primary keys of the users to invalidate caches.
+
+        Returns:
+            Return the number of users invalidated.
+        """
+        from pumpwood_djangoauth.views import (
+            PumpWoodRestServiceRowPermission)
+
+        user_ids = set(user_ids)
+        ReadReplicaAux.pin_primary()
+        with diskcache.transact():
+            for user_id in user_ids:
+                diskcache.incr(
+                    cls.USER_VERSION_KEY_TEMPLATE.format(user_id=user_id),
+                    default=0)
+                diskcache.delete(
+                    PumpWoodRestServiceRowPermission
+                    .get_row_permission_cache_key(user_id=user_id))
+        return len(user_ids)
+
+    @classmethod
+    def invalidate_all(cls) -> None:
+        """Invalidate permission caches of all users."""
+        from pumpwood_djangoauth.views import (
+            PumpWoodRestServiceRowPermission)
+
+        ReadReplicaAux.pin_primary()
+        diskcache.incr(cls.GLOBAL_VERSION_KEY, default=0)
+        diskcache.evict(
+            PumpWoodRestServiceRowPermission.ROW_PERMISSION_CACHE_TAG)
+
+    @classmethod
+    def invalidate_routes(cls) -> None:
+        """Invalidate caches built from registered routes."""
+        ReadReplicaAux.pin_primary()
+        diskcache.incr(cls.ROUTES_VERSION_KEY, default=0)
@@ -1,14 +1,14 @@
 SELECT
   sub.route_id,
-  BOOL_AND(can_delete) AS can_delete,
-  BOOL_AND(can_delete_file) AS can_delete_file,
-  BOOL_AND(can_delete_many) AS can_delete_many,
-  BOOL_AND(can_list) AS can_list,
-  BOOL_AND(can_list_without_pag) AS can_list_without_pag,
-  BOOL_AND(can_retrieve) AS can_retrieve,
-  BOOL_AND(can_retrieve_file) AS can_retrieve_file,
-  BOOL_AND(can_run_actions) AS can_run_actions,
-  BOOL_AND(can_save) AS can_save
+  BOOL_OR(can_delete) AS can_delete,
+  BOOL_OR(can_delete_file) AS can_delete_file,
+  BOOL_OR(can_delete_many) AS can_delete_many,
+  BOOL_OR(can_list) AS can_list,
+  BOOL_OR(can_list_without_pag) AS can_list_without_pag,
+  BOOL_OR(can_retrieve) AS can_retrieve,
+  BOOL_OR(can_retrieve_file) AS can_retrieve_file,
+  BOOL_OR(can_run_actions) AS can_run_actions,
+  BOOL_OR(can_save) AS can_save
 FROM (
   -- Group permissions
   -- Use general policy to add permission to all avaiable routes
@@ -51,8 +51,10 @@ FROM (
       WHEN general_policy = 'write' THEN TRUE
       ELSE FALSE END AS can_save
   FROM public.api_permission__policy_group_m2m AS group_m2m
+  JOIN public.groups__group_closure AS group_closure
+    ON group_m2m.group_id = group_closure.ancestor_id
   JOIN public.groups__group_user_m2m AS group_user_m2m
-    ON group_m2m.group_id = group_user_m2m.group_id
+    ON group_closure.descendant_id = group_user_m2m.group_id
   JOIN public.pumpwood__route AS route
     ON 1=1
   WHERE custom_policy_id IS NULL
@@ -73,8 +75,10 @@ FROM (
     api_policy.can_run_actions,
     api_policy.can_save
   FROM public.api_permission__policy_group_m2m AS group_m2m
+  JOIN public.groups__group_closure AS group_closure
+    ON group_m2m.group_id = group_closure.ancestor_id
   JOIN public.groups__group_user_m2m AS group_user_m2m
-    ON group_m2m.group_id = group_user_m2m.group_id
+    ON group_closure.descendant_id = group_user_m2m.group_id
   JOIN public.api_permission__policy AS api_policy
     ON api_policy.id = group_m2m.custom_policy_id
   WHERE group_user_m2m.user_id = %(user_id)s
@@ -146,4 +150,3 @@ FROM (
   WHERE user_id = %(user_id)s
 ) AS sub
 GROUP BY sub.route_id
-WHERE 1=1
@@ -0,0 +1,37 @@
+SELECT
+  sub.route_id,
+  sub.action,
+  BOOL_OR(sub.is_allowed) AS is_allowed
+FROM (
+  -- Group action custom policies
+  SELECT
+    api_policy.route_id,
+    policy_action.action,
+    policy_action.is_allowed
+  FROM public.api_permission__policy_group_m2m AS group_m2m
+  JOIN public.groups__group_closure AS group_closure
+    ON group_m2m.group_id = group_closure.ancestor_id
+  JOIN public.groups__group_user_m2m AS group_user_m2m
+    ON group_closure.descendant_id = group_user_m2m.group_id
+  JOIN public.api_permission__policy AS api_policy
+    ON api_policy.id = group_m2m.custom_policy_id
+  JOIN public.api_permission__policy_action AS policy_action
+    ON policy_action.policy_id = api_policy.id
+  WHERE group_user_m2m.user_id = %(user_id)s
+
+  UNION ALL
+
+  -- User action custom policies
+  SELECT
+    api_policy.route_id,
+    policy_action.action,
+    policy_action.is_allowed
+  FROM public.api_permission__policy_user_m2m AS user_m2m
+  JOIN public.api_permission__policy AS api_policy
+    ON api_policy.id = user_m2m.custom_policy_id
+  JOIN public.api_permission__policy_action AS policy_action
+    ON policy_action.policy_id = api_policy.id
+  WHERE user_m2m.user_id = %(user_id)s
+) AS sub
+GROUP BY sub.route_id, sub.action
+ORDER BY sub.route_id, sub.action
@@ -0,0 +1,15 @@
+SELECT row_permission_id
+FROM public.row_permission__user_m2m
+WHERE user_id = %(user_id)s
+
+UNION
+
+SELECT row_permission.row_permission_id
+FROM public.groups__group_user_m2m AS group_user_m2m
+JOIN public.groups__group_closure AS group_closure
+	ON group_user_m2m.group_id = group_closure.descendant_id
+JOIN public.row_permission__group_m2m AS row_permission
+	ON group_closure.ancestor_id = row_permission.group_id
+WHERE group_user_m2m.user_id = %(user_id)s
+
+ORDER BY 1
@@ -1,12 +1,18 @@
 """Functions to help fetching permissions from user."""
+import time
 import importlib.resources as pkg_resources
-from typing import List
+from typing import List, Tuple, Union
+from pumpwood_djangoauth.db_router import (
+    ReadReplicaAux, get_read_connection)
 
 
 # Read sql query from package resources
 sql_content = pkg_resources.read_text(
     'pumpwood_djangoauth.registration.aux.query',
     'group_user_row_permissions.sql')
+ids_sql_content = pkg_resources.read_text(
+    'pumpwood_djangoauth.registration.aux.query',
+    'user_row_permission_ids.sql')
 
 
 class RowPermissionAux:
@@ -56,8 +62,72 @@ class RowPermissionAux:
             SerializerPumpwoodRowPermission)
 
         query_parameters = {"user_id": user.id}
-        query_result = PumpwoodRowPermission.objects.raw(
-            sql_content, query_parameters)
+        query_result = PumpwoodRowPermission.objects\
+            .using(ReadReplicaAux.get_read_db(aux='RowPermissionAux'))\
+            .raw(sql_content, query_parameters)
         return SerializerPumpwoodRowPermission(
             query_result, many=True, default_fields=True,
             context={'request': request}).data
+
+    @classmethod
+    def get_ids(cls, user) -> Union[Tuple[int], None]:
+        """Get ids of row permissions associated with user.
+
+        Fetch only `row_permission_id` with one query, without loading
+        and serializing row permission objects.
+
+        Args:
+            user (User):
+                User object to fetch associated permissions.
+
+        Returns:
+            Return a sorted tuple of row permission ids associated with user
+            directly or by groups. Return None for superusers, indicating
+            that row permission filter must not be applied.
+        """
+        if user.is_superuser:
+            return None
+
+        read_connection = get_read_connection(aux='RowPermissionAux')
+        with read_connection.cursor() as cursor:
+            cursor.execute(ids_sql_content, {"user_id": user.id})
+            return tuple(row[0] for row in cursor.fetchall())
+
+    @classmethod
+    def benchmark(cls, user, request, n_repeats: int = 10) -> dict:
+        """Compare time spent by serialized and ids-only resolution.
+
+        Args:
+            user (User):
+                User object to fetch associated permissions.
+            request:
+                Django request.
+            n_repeats (int):
+                Number of times each resolution will be executed.
+
+        Returns:
+            Return a dictionary with mean time in milliseconds of each
+            resolution (`serialized_ms`, `ids_ms`), the number of ids
+            returned and if both resolutions returned the same ids.
+        """
+        start = time.perf_counter()
+        for i in range(n_repeats):
+            serialized = cls.get(user=user, request=request)
+        serialized_ms = \
+            (time.perf_counter() - start) * 1000 / n_repeats
+
+        start = time.perf_counter()
+        for i in range(n_repeats):
+            ids = cls.get_ids(user=user)
+        ids_ms = (time.perf_counter() - start) * 1000 / n_repeats
+
+        serialized_ids = sorted(x['pk'] for x in serialized)
+        is_same = (
+            ids is None if user.is_superuser
+            else list(ids) == serialized_ids)
+        return {
+            'n_repeats': n_repeats,
+            'n_ids': len(serialized_ids),
+            'serialized_ms': serialized_ms,
+            'ids_ms': ids_ms,
+            'is_same': is_same}
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0013_change_user_column_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pumpwoodmfatoken',
+            index=models.Index(fields=['expire_at'], name='pumpwood__mfa_token__exp_idx'),
+        ),
+    ]
@@ -115,6 +115,84 @@ class UserProfile(models.Model):
         user = User.objects.get(id=user_id)
         return RowPermissionAux.get(user=user, request=request)
 
+    @classmethod
+    @action(info="List ids of user's associated row permissions",
+            request='request', permission_role='is_authenticated')
+    def self_row_permission_ids(cls, request) -> List[int]:
+        """List ids of row permissions associated with logged user.
+
+        Args:
+            request:
+                Django request.
+
+        Returns:
+            Return a sorted list of row permission ids, superusers will
+            return None since they are not filtered by row permissions.
+        """
+        ids = RowPermissionAux.get_ids(user=request.user)
+        return None if ids is None else list(ids)
+
+    @classmethod
+    @action(info="Compare time of row permissions resolutions for a user",
+            request='request', permission_role='is_superuser')
+    def benchmark_row_permissions(cls, user_id: int, request,
+                                  n_repeats: int = 10) -> dict:
+        """Compare serialized and ids-only row permission resolution.
+
+        Args:
+            user_id (int):
+                User's id associated with row permissions.
+            request:
+                Django request.
+            n_repeats (int):
+                Number of times each resolution will be executed.
+        """
+        if n_repeats < 1:
+            msg = "n_repeats must be greater than 0"
+            raise PumpWoodActionArgsException(message=msg)
+        User = get_user_model() # NOQA
+        user = User.objects.get(id=user_id)
+        return RowPermissionAux.benchmark(
+            user=user, request=request, n_repeats=n_repeats)
+
+    @classmethod
+    @action(info="List routes most called by self at the last days",
+            request='request', permission_role='is_authenticated')
+    def self_usage_routes(cls, request, days: int = 30,
+                          limit: int = 20) -> List[dict]:
+        """List routes most called by logged user at the last days.
+
+        Args:
+            request:
+                Django request.
+            days (int):
+                Number of days to consider on the aggregation.
+            limit (int):
+                Number of routes to return.
+        """
+        from pumpwood_djangoauth.system.models import KongRoute
+        return KongRoute.usage_top_routes(
+            days=days, user_id=request.user.id, limit=limit)
+
+    @classmethod
+    @action(info="List routes most called by user at the last days",
+            permission_role='is_superuser')
+    def user_usage_routes(cls, user_id: int, days: int = 30,
+                          limit: int = 20) -> List[dict]:
+        """List routes most called by user at the last days.
+
+        Args:
+            user_id (int):
+                User's id to list most called routes.
+            days (int):
+                Number of days to consider on the aggregation.
+            limit (int):
+                Number of routes to return.
+        """
+        from pumpwood_djangoauth.system.models import KongRoute
+        return KongRoute.usage_top_routes(
+            days=days, user_id=user_id, limit=limit)
+
     @classmethod
     @action(info="List user's assciated API permissions",
             request='request', permission_role='is_superuser')
@@ -363,6 +441,9 @@ class PumpwoodMFAToken(models.Model):
     class Meta:
         """Meta."""
         db_table = 'pumpwood__mfa_token'
+        indexes = [
+            models.Index(
+                fields=['expire_at'], name='pumpwood__mfa_token__exp_idx')]
         verbose_name = 'MFA Token'
         verbose_name_plural = 'MFA Tokens'
 
@@ -31,6 +31,10 @@ urlpatterns = [
         'rest/registration/retrieveauthenticateduser/',
         views.retrieve_authenticated_user,
         name='rest__registration__retrieveauthenticateduser'),
+    path(
+        'rest/registration/self-capabilities/',
+        views.retrieve_self_capabilities,
+        name='rest__registration__self_capabilities'),
 
     # MFA end-points
     path(
@@ -13,7 +13,9 @@ from pumpwood_djangoviews.views import PumpWoodRestService
 # Aux imports
 from pumpwood_djangoauth.config import storage_object, microservice
 from pumpwood_djangoauth.permissions import PumpwoodIsAuthenticated
+from pumpwood_djangoauth.views import etag_gzip_json_response
 from pumpwood_djangoauth.registration.mfa_aux import MFALoginResponse
+from pumpwood_djangoauth.registration.aux import CapabilityMapAux
 from pumpwood_communication.exceptions import (
     PumpWoodUnauthorized, PumpWoodForbidden)
 
@@ -334,6 +336,24 @@ def retrieve_authenticated_user(request):
     return Response(self_user_data)
 
 
+@api_view(['GET'])
+@permission_classes([PumpwoodIsAuthenticated])
+def retrieve_self_capabilities(request):
+    """Return capability map of the authenticated user as gzip JSON.
+
+    Map has role bitmasks by route and allowed/denied custom actions, see
+    `CapabilityMapAux`. A strong ETag is returned and requests with a
+    matching `If-None-Match` header receive a 304 response.
+    """
+    etag = CapabilityMapAux.get_etag(user=request.user)
+    return etag_gzip_json_response(
+        request=request, etag=etag,
+        get_content=lambda: CapabilityMapAux.get(
+            user=request.user, etag=etag)['content'],
+        cache_control='private, no-cache',
+        vary='Accept-Encoding, Authorization')
+
+
 class RestUser(PumpWoodRestService):
     """End-point with information about Pumpwood users."""
 
@@ -0,0 +1,8 @@
+"""Aux classes and functions for row permission models."""
+from .rls import RowLevelSecurityAux
+
+
+# You might also want to define what happens with 'from my_package import *'
+# by defining __all__
+__all__ = [
+    "RowLevelSecurityAux"]
@@ -0,0 +1,285 @@
+"""Postgres Row-Level Security policies generated from row permissions."""
+from typing import List, FrozenSet
+from contextlib import contextmanager
+from django.apps import apps
+from django.db import connection, transaction
+from pumpwood_communication import exceptions
+from pumpwood_djangoauth.config import diskcache, DISKCACHE_EXPIRATION
+
+
+class RowLevelSecurityAux:
+    """Generate and apply Postgres RLS policies for row permission tables.
+
+    Policies are created for tables of models with a `row_permission_id`
+    field and filter rows using `row_permission__user_membership` view and
+    the settings `pumpwood.user_id` and `pumpwood.is_superuser`, set local
+    to the transaction of each request of views using `rls` strategy.
+
+    Rows are not visible when `pumpwood.user_id` is not set, so querysets
+    evaluated after the request transaction do not return unfiltered rows.
+    RLS is enabled by default only at tables of models served by views
+    using `rls` strategy (`list_rls_tables`); views using other strategies
+    run inside `bypass` if their table has RLS enabled, since they filter
+    rows at Django. Other code that must read or write all rows of RLS
+    tables (commands, workers, admin) must run inside `bypass`, which sets
+    `pumpwood.rls_bypass` local to a transaction. Postgres superusers and
+    roles with `BYPASSRLS` are not filtered.
+    """
+
+    POLICY_NAME = 'pumpwood__row_permission'
+    """Name of the policy created at the tables."""
+
+    USER_SETTING = 'pumpwood.user_id'
+    """Session setting with the id of the request user."""
+
+    SUPERUSER_SETTING = 'pumpwood.is_superuser'
+    """Session setting indicating if the request user is a superuser."""
+
+    BYPASS_SETTING = 'pumpwood.rls_bypass'
+    """Setting that disables row filter when set to `on`."""
+
+    POLICY_TEMPLATE = """
+        CREATE POLICY {policy} ON {table}
+        USING (
+            current_setting('{bypass_setting}', true) = 'on'
+            OR current_setting('{superuser_setting}', true) = 'true'
+            OR row_permission_id IS NULL
+            OR row_permission_id IN (
+                SELECT membership.row_permission_id
+                FROM public.row_permission__user_membership AS membership
+                WHERE membership.user_id = NULLIF(
+                    current_setting('{user_setting}', true), '')::bigint))
+    """
+    """Template of the policy, `WITH CHECK` defaults to `USING` condition.
+       Empty or unset `pumpwood.user_id` matches no membership."""
+
+    MEMBERSHIP_TABLES = [
+        'row_permission__group_m2m', 'row_permission__user_m2m']
+    """Tables associating row permissions with users and groups, they are
+       read by the policy and are never filtered."""
+
+    ENABLED_TABLES_CACHE_KEY = "row-level-security--enabled-tables"
+    """Diskcache key of the tables with RLS enabled."""
+
+    @classmethod
+    def list_tables(cls) -> List[str]:
+        """List tables of models with `row_permission_id` field.
+
+        Returns:
+            Return a sorted list of table names of managed and concrete
+            models with `row_permission_id` field, except
+            `MEMBERSHIP_TABLES`.
+        """
+        tables = set()
+        for model in apps.get_models():
+            is_concrete = (
+                model._meta.managed and not model._meta.proxy and
+                not model._meta.abstract)
+            if not is_concrete:
+                continue
+            attnames = [
+                field.attname for field in model._meta.concrete_fields]
+            if 'row_permission_id' in attnames:
+                tables.add(model._meta.db_table)
+        return sorted(tables - set(cls.MEMBERSHIP_TABLES))
+
+    @classmethod
+    def list_rls_tables(cls) -> List[str]:
+        """List tables served only by views using `rls` strategy.
+
+        Views are subclasses of `PumpWoodRestServiceRowPermission`, they
+        must be imported (ex. loading URL configuration). Tables that are
+        also served by views using other strategies are not returned.
+
+        Returns:
+            Return a sorted list of table names at `list_tables`.
+        """
+        from pumpwood_djangoauth.views import (
+            PumpWoodRestServiceRowPermission)
+
+        rls_tables = set()
+        other_tables = set()
+        views = [PumpWoodRestServiceRowPermission]
+        while views:
+            view = views.pop()
+            views.extend(view.__subclasses__())
+            service_model = getattr(view, 'service_model', None)
+            if service_model is None:
+                continue
+            if view.row_permission_strategy == 'rls':
+                rls_tables.add(service_model._meta.db_table)
+            else:
+                other_tables.add(service_model._meta.db_table)
+        return sorted(
+            (rls_tables - other_tables) & set(cls.list_tables()))
+
+    @classmethod
+    def list_enabled_tables(cls) -> FrozenSet[str]:
+        """Return tables with RLS enabled at database.
+
+        Result is cached at diskcache, `enable` and `disable` remove the
+        cache after commit.
+
+        Returns:
+            Return a frozenset of table names, empty if database is not
+            Postgres.
+        """
+        if connection.vendor != 'postgresql':
+            return frozenset()
+        tables = diskcache.get(cls.ENABLED_TABLES_CACHE_KEY)
+        if tables is not None:
+            return tables
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname FROM pg_class "
+                "WHERE relkind = 'r' AND relrowsecurity "
+                "  AND relnamespace = 'public'::regnamespace")
+            tables = frozenset(row[0] for row in cursor.fetchall())
+        diskcache.set(
+            cls.ENABLED_TABLES_CACHE_KEY, tables,
+            expire=DISKCACHE_EXPIRATION)
+        return tables
+
+    @classmethod
+    def _clear_enabled_tables(cls) -> None:
+        """Remove cache of tables with RLS enabled."""
+        diskcache.delete(cls.ENABLED_TABLES_CACHE_KEY)
+
+    @classmethod
+    def get_enable_sql(cls, table: str) -> List[str]:
+        """Return SQL statements to enable RLS on a table.
+
+        Args:
+            table (str):
+                Table name.
+
+        Returns:
+            Return a list of SQL statements. `FORCE ROW LEVEL SECURITY` is
+            used so the policy is also applied to the table owner, usually
+            the application database user.
+        """
+        quoted_table = connection.ops.quote_name(table)
+        quoted_policy = connection.ops.quote_name(cls.POLICY_NAME)
+        return [
+            "DROP POLICY IF EXISTS {policy} ON {table}".format(
+                policy=quoted_policy, table=quoted_table),
+            cls.POLICY_TEMPLATE.format(
+                policy=quoted_policy, table=quoted_table,
+                user_setting=cls.USER_SETTING,
+                superuser_setting=cls.SUPERUSER_SETTING,
+                bypass_setting=cls.BYPASS_SETTING),
+            "ALTER TABLE {table} ENABLE ROW LEVEL SECURITY".format(
+                table=quoted_table),
+            "ALTER TABLE {table} FORCE ROW LEVEL SECURITY".format(
+                table=quoted_table)]
+
+    @classmethod
+    def get_disable_sql(cls, table: str) -> List[str]:
+        """Return SQL statements to disable RLS on a table.
+
+        Args:
+            table (str):
+                Table name.
+
+        Returns:
+            Return a list of SQL statements.
+        """
+        quoted_table = connection.ops.quote_name(table)
+        quoted_policy = connection.ops.quote_name(cls.POLICY_NAME)
+        return [
+            "DROP POLICY IF EXISTS {policy} ON {table}".format(
+                policy=quoted_policy, table=quoted_table),
+            "ALTER TABLE {table} NO FORCE ROW LEVEL SECURITY".format(
+                table=quoted_table),
+            "ALTER TABLE {table} DISABLE ROW LEVEL SECURITY".format(
+                table=quoted_table)]
+
+    @classmethod
+    def enable(cls, tables: List[str] = None) -> List[str]:
+        """Create policies and enable RLS at tables in one transaction.
+
+        Args:
+            tables (List[str]):
+                Tables to enable RLS, if not set tables returned by
+                `list_rls_tables` are used.
+
+        Returns:
+            Return the list of tables with RLS enabled.
+        """
+        tables = tables or cls.list_rls_tables()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for table in tables:
+                    for sql in cls.get_enable_sql(table):
+                        cursor.execute(sql)
+            transaction.on_commit(cls._clear_enabled_tables)
+        return tables
+
+    @classmethod
+    def disable(cls, tables: List[str] = None) -> List[str]:
+        """Drop policies and disable RLS at tables in one transaction.
+
+        Args:
+            tables (List[str]):
+                Tables to disable RLS, if not set all tables returned by
+                `list_tables` are used.
+
+        Returns:
+            Return the list of tables with RLS disabled.
+        """
+        tables = tables or cls.list_tables()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for table in tables:
+                    for sql in cls.get_disable_sql(table):
+                        cursor.execute(sql)
+            transaction.on_commit(cls._clear_enabled_tables)
+        return tables
+
+    @classmethod
+    def set_user(cls, user) -> None:
+        """Set settings used by policies for the request user.
+
+        Settings are local to the current transaction (`SET LOCAL`), they
+        are discarded at commit or rollback so persistent connections are
+        never reused with the settings of other request. Raw SQL executed
+        at the same transaction is also filtered.
+
+        Args:
+            user (User):
+                Request user.
+
+        Raises:
+            PumpWoodException:
+                If called outside an atomic block.
+        """
+        if not connection.in_atomic_block:
+            msg = (
+                "Row-Level Security user must be set inside a transaction, "
+                "user [{user_id}]")
+            raise exceptions.PumpWoodException(
+                message=msg, payload={"user_id": user.id})
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config(%(user_setting)s, %(user_id)s, true), "
+                "set_config(%(superuser_setting)s, %(is_superuser)s, true)",
+                {
+                    "user_setting": cls.USER_SETTING,
+                    "user_id": str(user.id),
+                    "superuser_setting": cls.SUPERUSER_SETTING,
+                    "is_superuser": 'true' if user.is_superuser else 'false'})
+
+    @classmethod
+    @contextmanager
+    def bypass(cls):
+        """Run code in a transaction that is not filtered by policies.
+
+        Bypass setting is local to the transaction.
+        """
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT set_config(%(bypass_setting)s, 'on', true)",
+                    {"bypass_setting": cls.BYPASS_SETTING})
+            yield
@@ -0,0 +1,84 @@
+"""Compare query plans of row permission filter strategies."""
+import re
+import time
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from pumpwood_djangoauth.views import PumpWoodRestServiceRowPermission
+
+
+class Command(BaseCommand):
+    """Explain a model query filtered with each row permission strategy."""
+
+    help = (
+        "Run EXPLAIN for a model query filtered by the row permissions of "
+        "an user using each row permission strategy, reporting planning "
+        "and execution time.")
+
+    TIME_PATTERN = re.compile(
+        r"(Planning|Execution) Time: (?P<time>[0-9.]+) ms")
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            'model', type=str,
+            help="Model with row_permission_id as `app_label.ModelName`.")
+        parser.add_argument(
+            '--user-id', type=int, required=True,
+            help="Id of the user used to filter rows.")
+        parser.add_argument(
+            '--strategy', type=str, action='append',
+            choices=PumpWoodRestServiceRowPermission
+            .ROW_PERMISSION_STRATEGIES,
+            help="Strategy to explain, all strategies if not set.")
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help="Run EXPLAIN ANALYZE, executing the queries.")
+        parser.add_argument(
+            '--print-plan', action='store_true',
+            help="Print the full query plan of each strategy.")
+
+    def handle(self, *args, **options):
+        """Explain query with each strategy and print report."""
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+        if not hasattr(model, 'row_permission_id'):
+            raise CommandError(
+                "Model [{}] has no row_permission_id".format(
+                    options['model']))
+
+        User = get_user_model() # NOQA
+        user = User.objects.get(id=options['user_id'])
+        if user.is_superuser:
+            self.stdout.write(self.style.WARNING(
+                "Superusers are not filtered by row permission."))
+            return None
+
+        strategies = options['strategy'] or \
+            PumpWoodRestServiceRowPermission.ROW_PERMISSION_STRATEGIES
+        for strategy in strategies:
+            # Ids are fetched when filter is built, outside of timing
+            query = PumpWoodRestServiceRowPermission.filter_row_permission(
+                query=model.objects.all(), user=user, strategy=strategy)
+
+            start = time.perf_counter()
+            plan = query.explain(analyze=options['analyze'], summary=True)
+            total_ms = (time.perf_counter() - start) * 1000
+            sql, params = query.query.sql_with_params()
+            times = {
+                match.group(1): match.group('time')
+                for match in self.TIME_PATTERN.finditer(plan)}
+
+            self.stdout.write(self.style.SUCCESS(
+                "[{strategy}] query size: {size} chars, params: {n_params}, "
+                "planning: {planning} ms, execution: {execution} ms, "
+                "round trip: {total:.3f} ms".format(
+                    strategy=strategy, size=len(sql),
+                    n_params=len(params),
+                    planning=times.get('Planning', '-'),
+                    execution=times.get('Execution', '-'),
+                    total=total_ms)))
+            if options['print_plan']:
+                self.stdout.write(plan)
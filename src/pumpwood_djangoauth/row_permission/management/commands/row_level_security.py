@@ -0,0 +1,75 @@
+"""Manage Postgres Row-Level Security policies of row permission tables."""
+from django.urls import get_resolver
+from django.core.management.base import BaseCommand, CommandError
+from pumpwood_djangoauth.row_permission.aux import RowLevelSecurityAux
+
+
+class Command(BaseCommand):
+    """Enable, disable or print RLS policies for row permission tables."""
+
+    help = (
+        "Enable, disable or print Postgres Row-Level Security policies for "
+        "tables of models with row_permission_id field. By default `enable` "
+        "and `sql` use only tables served by views with `rls` strategy.")
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            'operation', type=str, choices=['enable', 'disable', 'sql'],
+            help="Operation to perform, `sql` only prints statements.")
+        parser.add_argument(
+            '--table', type=str, action='append',
+            help="Table to apply operation. If not set, `enable` and `sql` "
+                 "use tables served only by views with `rls` strategy and "
+                 "`disable` all tables with row_permission_id.")
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Allow enabling RLS at tables not served by views with "
+                 "`rls` strategy, code reading them (admin, workers) must "
+                 "use `RowLevelSecurityAux.bypass`.")
+
+    def handle(self, *args, **options):
+        """Run operation and print affected tables."""
+        # Import URL configuration so all views are registered
+        get_resolver().url_patterns
+
+        operation = options['operation']
+        all_tables = RowLevelSecurityAux.list_tables()
+        rls_tables = RowLevelSecurityAux.list_rls_tables()
+        if options['table']:
+            tables = options['table']
+        elif operation == 'disable':
+            tables = all_tables
+        else:
+            tables = rls_tables
+        unknown_tables = set(tables) - set(all_tables)
+        if unknown_tables:
+            raise CommandError(
+                "Tables without row_permission_id: {}".format(
+                    ", ".join(sorted(unknown_tables))))
+        not_rls_tables = set(tables) - set(rls_tables)
+        if operation == 'enable' and not_rls_tables and \
+                not options['force']:
+            raise CommandError(
+                "Tables not served by views with rls strategy, rows would "
+                "be hidden from other views, admin and workers (use "
+                "--force): {}".format(", ".join(sorted(not_rls_tables))))
+        if not tables:
+            self.stdout.write("No tables to {}".format(operation))
+            return None
+
+        if operation == 'sql':
+            for table in tables:
+                for sql in RowLevelSecurityAux.get_enable_sql(table):
+                    self.stdout.write(sql.strip() + ";")
+            return None
+
+        if operation == 'enable':
+            tables = RowLevelSecurityAux.enable(tables=tables)
+        else:
+            tables = RowLevelSecurityAux.disable(tables=tables)
+        for table in tables:
+            self.stdout.write("  {}".format(table))
+        self.stdout.write(self.style.SUCCESS(
+            "Row-Level Security {operation}d at {n} tables".format(
+                operation=operation, n=len(tables))))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:05
+
+from django.db import migrations
+
+
+#######################
+# View SQL definition #
+drop_view = "DROP VIEW IF EXISTS public.row_permission__user_membership;"
+view_sql = """
+CREATE VIEW public.row_permission__user_membership AS
+SELECT
+  user_m2m.user_id,
+  user_m2m.row_permission_id
+FROM public.row_permission__user_m2m AS user_m2m
+UNION
+SELECT
+  group_user_m2m.user_id,
+  group_m2m.row_permission_id
+FROM public.groups__group_user_m2m AS group_user_m2m
+JOIN public.row_permission__group_m2m AS group_m2m
+  ON group_user_m2m.group_id = group_m2m.group_id;
+"""
+#######################
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0004_alter_pumpwoodusergroupm2m_options'),
+        ('row_permission', '0006_add_codes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(drop_view, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(view_sql, reverse_sql=drop_view)
+    ]
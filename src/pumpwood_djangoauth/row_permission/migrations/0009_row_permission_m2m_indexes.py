@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('row_permission', '0008_row_permission_user_membership_closure'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pumpwoodrowpermissiongroupm2m',
+            index=models.Index(fields=['group', 'row_permission'], name='row_perm__group_m2m_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pumpwoodrowpermissionuserm2m',
+            index=models.Index(fields=['user', 'row_permission'], name='row_perm__user_m2m_idx'),
+        ),
+    ]
@@ -121,6 +121,10 @@ class PumpwoodRowPermissionGroupM2M(models.Model):
     class Meta:
         """Meta class."""
         db_table = 'row_permission__group_m2m'
+        indexes = [
+            models.Index(
+                fields=['group', 'row_permission'],
+                name='row_perm__group_m2m_idx')]
         verbose_name = 'Row permission Policy -> Group'
         verbose_name_plural = 'Row permission Policy -> Group'
 
@@ -181,5 +185,9 @@ class PumpwoodRowPermissionUserM2M(models.Model):
     class Meta:
         """Meta class."""
         db_table = 'row_permission__user_m2m'
+        indexes = [
+            models.Index(
+                fields=['user', 'row_permission'],
+                name='row_perm__user_m2m_idx')]
         verbose_name = 'Row permission Policy -> User'
         verbose_name_plural = 'Row permission Policy -> User'
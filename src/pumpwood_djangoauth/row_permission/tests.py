@@ -1,3 +1,167 @@
+"""Tests of row permission app."""
+from contextlib import contextmanager
+from django.db import models, connection
 from django.test import TestCase
+from django.contrib.auth import get_user_model
+from pumpwood_djangoauth.views import PumpWoodRestServiceRowPermission
+from pumpwood_djangoauth.row_permission.aux import RowLevelSecurityAux
+from pumpwood_djangoauth.row_permission.models import (
+    PumpwoodRowPermission, PumpwoodRowPermissionUserM2M)
 
-# Create your tests here.
+
+class RLSTestDocument(models.Model):
+    """Model served by a view using `in_list` strategy."""
+
+    description = models.TextField()
+    row_permission = models.ForeignKey(
+        PumpwoodRowPermission, null=True, on_delete=models.CASCADE,
+        related_name='+')
+
+    class Meta:
+        """Meta."""
+        app_label = 'row_permission'
+        db_table = 'row_permission__test_document'
+
+
+class RLSTestReport(models.Model):
+    """Model served by a view using `rls` strategy."""
+
+    description = models.TextField()
+    row_permission = models.ForeignKey(
+        PumpwoodRowPermission, null=True, on_delete=models.CASCADE,
+        related_name='+')
+
+    class Meta:
+        """Meta."""
+        app_label = 'row_permission'
+        db_table = 'row_permission__test_report'
+
+
+class RestRLSTestDocument(PumpWoodRestServiceRowPermission):
+    """View of documents filtering rows at Django."""
+
+    service_model = RLSTestDocument
+    row_permission_strategy = 'in_list'
+
+
+class RestRLSTestReport(PumpWoodRestServiceRowPermission):
+    """View of reports filtering rows with Row-Level Security."""
+
+    service_model = RLSTestReport
+    row_permission_strategy = 'rls'
+
+
+class RowLevelSecurityTest(TestCase):
+    """Check that RLS does not hide rows of views using other strategies."""
+
+    TEST_ROLE = 'pumpwood_rls_test'
+    """Role without superuser, Postgres superusers are not filtered."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create tables of test models."""
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(RLSTestDocument)
+            schema_editor.create_model(RLSTestReport)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drop tables of test models."""
+        super().tearDownClass()
+        with connection.schema_editor() as schema_editor:
+            schema_editor.delete_model(RLSTestDocument)
+            schema_editor.delete_model(RLSTestReport)
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create rows with and without row permission."""
+        User = get_user_model() # NOQA
+        cls.user = User.objects.create_user(username='test--rls')
+        allowed = PumpwoodRowPermission.objects.create(
+            code='test--allowed', description='test--allowed',
+            updated_by=cls.user)
+        denied = PumpwoodRowPermission.objects.create(
+            code='test--denied', description='test--denied',
+            updated_by=cls.user)
+        PumpwoodRowPermissionUserM2M.objects.create(
+            user=cls.user, row_permission=allowed, updated_by=cls.user)
+        for model in [RLSTestDocument, RLSTestReport]:
+            model.objects.bulk_create([
+                model(description='allowed', row_permission=allowed),
+                model(description='denied', row_permission=denied),
+                model(description='public', row_permission=None)])
+
+    def setUp(self):
+        """Clear cache of tables with RLS, tests rollback DDL."""
+        RowLevelSecurityAux._clear_enabled_tables()
+        self.addCleanup(RowLevelSecurityAux._clear_enabled_tables)
+
+    @contextmanager
+    def as_non_superuser(self):
+        """Run queries with a role that is filtered by policies."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT current_setting('is_superuser')")
+            is_superuser = cursor.fetchone()[0] == 'on'
+            if is_superuser:
+                cursor.execute(
+                    "CREATE ROLE {role} NOLOGIN".format(role=self.TEST_ROLE))
+                # Role and grants are rolled back with test transaction
+                cursor.execute(
+                    "GRANT SELECT ON ALL TABLES IN SCHEMA public "
+                    "TO {role}".format(role=self.TEST_ROLE))
+                cursor.execute(
+                    "SET LOCAL ROLE {role}".format(role=self.TEST_ROLE))
+        try:
+            yield
+        finally:
+            if is_superuser:
+                with connection.cursor() as cursor:
+                    cursor.execute("RESET ROLE")
+
+    def get_descriptions(self, model) -> list:
+        """Return sorted descriptions of visible rows."""
+        return sorted(model.objects.values_list('description', flat=True))
+
+    def test_list_rls_tables(self):
+        """Only tables served only by `rls` views are enabled by default."""
+        rls_tables = RowLevelSecurityAux.list_rls_tables()
+        self.assertIn('row_permission__test_report', rls_tables)
+        self.assertNotIn('row_permission__test_document', rls_tables)
+        for table in RowLevelSecurityAux.MEMBERSHIP_TABLES:
+            self.assertNotIn(table, RowLevelSecurityAux.list_tables())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enabled_tables = RowLevelSecurityAux.enable()
+        self.assertEqual(enabled_tables, rls_tables)
+        self.assertIn(
+            'row_permission__test_report',
+            RowLevelSecurityAux.list_enabled_tables())
+        self.assertNotIn(
+            'row_permission__test_document',
+            RowLevelSecurityAux.list_enabled_tables())
+
+    def test_in_list_view_with_rls_enabled(self):
+        """`in_list` view returns permitted rows at a table with RLS."""
+        with self.captureOnCommitCallbacks(execute=True):
+            RowLevelSecurityAux.enable(tables=[
+                'row_permission__test_document',
+                'row_permission__test_report'])
+
+        with self.as_non_superuser():
+            # Without user or bypass policies hide restricted rows
+            self.assertEqual(
+                self.get_descriptions(RLSTestDocument), ['public'])
+
+            with RestRLSTestDocument.get_rls_context():
+                query = RestRLSTestDocument.filter_row_permission(
+                    query=RLSTestDocument.objects.all(), user=self.user)
+                self.assertEqual(
+                    sorted(query.values_list('description', flat=True)),
+                    ['allowed', 'public'])
+
+            with RestRLSTestReport.get_rls_context():
+                RowLevelSecurityAux.set_user(user=self.user)
+                self.assertEqual(
+                    self.get_descriptions(RLSTestReport),
+                    ['allowed', 'public'])
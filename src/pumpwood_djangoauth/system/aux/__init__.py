@@ -1,8 +1,11 @@
 """Aux classes and functions for systems models."""
 from .api_permission import RouteAPIPermissionAux, MapPathRoleAux, GetRouteAux
+from .policy_engine import PolicyEngine, policy_engine
+from .permission_matrix import PermissionMatrix
 
 
 # You might also want to define what happens with 'from my_package import *'
 # by defining __all__
 __all__ = [
-    "RouteAPIPermissionAux", "MapPathRoleAux", "GetRouteAux"]
+    "RouteAPIPermissionAux", "MapPathRoleAux", "GetRouteAux",
+    "PolicyEngine", "policy_engine", "PermissionMatrix"]
@@ -1,11 +1,17 @@
 """Functions to help fetching permissions from user."""
 import copy
+import json
+import time
 import importlib.resources as pkg_resources
 from typing import List, Dict, Union, Any
-from django.db import connection
 from django.contrib.auth import get_user_model
 from pumpwood_djangoauth.config import (
-    diskcache, DISKCACHE_EXPIRATION, microservice)
+    diskcache, DISKCACHE_EXPIRATION, microservice,
+    PUMPWOOD__AUTH__POLICY_ENGINE)
+from pumpwood_djangoauth.system.aux.policy_engine import (
+    PolicyEngine, policy_engine)
+from pumpwood_djangoauth.db_router import (
+    ReadReplicaAux, get_read_connection)
 
 # Pumpwood Exceptions
 from pumpwood_communication.exceptions import (
@@ -328,8 +334,20 @@ class RouteAPIPermissionAux:
 
     HAS_PERMISSION_CACHE_TEMPLATE = (
         "has-permission--auth[{is_authenticated}]_r{route_id}_u[{user_id}]_" +
-        "r[{role}]_a[{action}]")
-    """Template used to create a key for cache."""
+        "r[{role}]_a[{action}]_v[{version}]")
+    """Template used to create a key for cache, `version` is user's
+       permission version from `PermissionCacheAux`."""
+
+    PREPARED_STATEMENT_NAME = "pumpwood__route_api_permissions"
+    """Name of the server-side prepared statement of permission query."""
+
+    PREPARED_STATEMENT_PARAMETERS = ['user_id', 'route_id', 'action']
+    """Parameters of the prepared statement by position."""
+
+    EXECUTE_PREPARED_SQL = (
+        "EXECUTE pumpwood__route_api_permissions "
+        "(%(user_id)s, %(route_id)s, %(action)s)")
+    """Query to execute the prepared statement."""
 
     @classmethod
     def get_role_options(cls):
@@ -354,10 +372,13 @@ class RouteAPIPermissionAux:
             action (str):
                 Action associated with permission check.
         """
+        from pumpwood_djangoauth.registration.aux import PermissionCacheAux
+
         # Set types to avoid SQL injection.
+        version = PermissionCacheAux.get_version(user_id=user_id)
         return cls.HAS_PERMISSION_CACHE_TEMPLATE.format(
             is_authenticated=is_authenticated, route_id=route_id,
-            user_id=user_id, role=role, action=action)
+            user_id=user_id, role=role, action=action, version=version)
 
     @classmethod
     def _get_has_permission_cache(cls, is_authenticated: bool,
@@ -535,10 +556,36 @@ class RouteAPIPermissionAux:
     @classmethod
     def _get_non_general_roles(cls, route_id: int, user_id: int,
                                role: str, action: str) -> List[dict]:
-        """Get non superuser permissions associated with user."""
+        """Get non superuser permissions associated with user.
+
+        Permissions are evaluated by the in memory `policy_engine` if
+        `PUMPWOOD__AUTH__POLICY_ENGINE` is `memory`, falling back to SQL
+        if engine could not load policies. If it is `prepared` a
+        server-side prepared statement is used.
+        """
         # Validate role option to not allow SQL injection
         cls._validate_role_options(role=role)
 
+        if PUMPWOOD__AUTH__POLICY_ENGINE == 'memory':
+            permission_result = policy_engine.has_permission(
+                user_id=user_id, route_id=route_id, role=role,
+                action=action)
+            if permission_result is not None:
+                return permission_result
+        elif PUMPWOOD__AUTH__POLICY_ENGINE == 'prepared':
+            return cls._get_prepared_non_general_roles(
+                route_id=route_id, user_id=user_id, role=role,
+                action=action)
+        return cls._get_sql_non_general_roles(
+            route_id=route_id, user_id=user_id, role=role, action=action)
+
+    @classmethod
+    def _get_sql_non_general_roles(cls, route_id: int, user_id: int,
+                                   role: str, action: str) -> bool:
+        """Get non superuser permissions running SQL query.
+
+        Role must be validated by caller, it is injected on query.
+        """
         # Use role to inject on query to filter the correct column
         query = route_api_permissions.format(role=role)
 
@@ -546,7 +593,8 @@ class RouteAPIPermissionAux:
         query_parameters = {
             "user_id": user_id, "route_id": route_id, "role": role,
             "action": action}
-        with connection.cursor() as cursor:
+        read_connection = get_read_connection(aux='RouteAPIPermissionAux')
+        with read_connection.cursor() as cursor:
             cursor.execute(query, query_parameters)
             rows = cursor.fetchall()
 
@@ -568,6 +616,148 @@ class RouteAPIPermissionAux:
             else:
                 return permission_result
 
+    @classmethod
+    def get_prepare_sql(cls) -> str:
+        """Return `PREPARE` statement of the role-agnostic permission query.
+
+        Query returns all role columns, so one statement is prepared for
+        all roles. Named parameters are converted to positional ones
+        following `PREPARED_STATEMENT_PARAMETERS`.
+        """
+        query = route_api_permissions.format(
+            role=", ".join(PolicyEngine.ROLE_COLUMNS))
+        for i, name in enumerate(cls.PREPARED_STATEMENT_PARAMETERS):
+            query = query.replace("%({})s".format(name), "${}".format(i + 1))
+        return "PREPARE {name} (bigint, bigint, text) AS {query}".format(
+            name=cls.PREPARED_STATEMENT_NAME, query=query)
+
+    @classmethod
+    def reset_prepared_statements(cls, connection) -> None:
+        """Mark statements as not prepared for a new database connection.
+
+        Args:
+            connection:
+                Django database connection wrapper.
+        """
+        connection.pumpwood_prepared_statements = set()
+
+    @classmethod
+    def _prepare(cls, connection, cursor) -> None:
+        """Prepare permission statement if not prepared at connection.
+
+        Prepared statements are kept by the database session, so it does
+        not work with poolers in transaction mode (ex. pgbouncer).
+
+        Args:
+            connection:
+                Django database connection wrapper of the cursor.
+            cursor:
+                Cursor used to prepare the statement.
+        """
+        prepared = getattr(connection, 'pumpwood_prepared_statements', None)
+        if prepared is None:
+            prepared = set()
+            connection.pumpwood_prepared_statements = prepared
+        if cls.PREPARED_STATEMENT_NAME in prepared:
+            return None
+        cursor.execute(cls.get_prepare_sql())
+        prepared.add(cls.PREPARED_STATEMENT_NAME)
+
+    @classmethod
+    def _get_prepared_non_general_roles(cls, route_id: int, user_id: int,
+                                        role: str, action: str) -> bool:
+        """Get non superuser permissions using prepared statement.
+
+        Role must be validated by caller.
+        """
+        role_index = PolicyEngine.ROLE_COLUMNS.index(role)
+        query_parameters = {
+            "user_id": user_id, "route_id": route_id, "action": action}
+        read_connection = get_read_connection(aux='RouteAPIPermissionAux')
+        with read_connection.cursor() as cursor:
+            cls._prepare(connection=read_connection, cursor=cursor)
+            cursor.execute(cls.EXECUTE_PREPARED_SQL, query_parameters)
+            rows = cursor.fetchall()
+
+        # Case no permission is avaiable at database
+        if len(rows) == 0:
+            return False
+        permission_result = rows[0][role_index]
+        return False if permission_result is None else permission_result
+
+    @classmethod
+    def benchmark_permission_query(cls, route_id: int, user_id: int,
+                                   role: str, action: str = None,
+                                   n_repeats: int = 10) -> dict:
+        """Compare planning and execution time of permission query modes.
+
+        Planning and execution times are reported by Postgres
+        `EXPLAIN (ANALYZE, FORMAT JSON)`; wall time is measured at Python
+        and includes the round trip. Postgres uses custom plans for the
+        first 5 executions of a prepared statement, so use `n_repeats`
+        greater than 5 to measure the cached generic plan.
+
+        Args:
+            route_id (int):
+                ID of the route.
+            user_id (int):
+                ID of the user.
+            role (str):
+                Role to check.
+            action (str):
+                Action for `can_run_actions` role.
+            n_repeats (int):
+                Number of repetitions of each mode.
+
+        Returns:
+            Return a dictionary with keys `sql` and `prepared`, each with
+            mean `planning_ms`, `execution_ms` and `wall_ms`, and the
+            number of routes `n_routes`.
+        """
+        from pumpwood_djangoauth.system.models import KongRoute
+
+        cls._validate_role_options(role=role)
+        n_repeats = max(int(n_repeats), 1)
+        if action is None or role != 'can_run_actions':
+            action = "###no_action###"
+        query_parameters = {
+            "user_id": user_id, "route_id": route_id, "role": role,
+            "action": action}
+        explain = "EXPLAIN (ANALYZE, FORMAT JSON) "
+        sql_query = route_api_permissions.format(role=role)
+
+        results = {}
+        read_connection = get_read_connection(aux='RouteAPIPermissionAux')
+        with read_connection.cursor() as cursor:
+            cls._prepare(connection=read_connection, cursor=cursor)
+            modes = [
+                ('sql', sql_query, cls._get_sql_non_general_roles),
+                ('prepared', cls.EXECUTE_PREPARED_SQL,
+                 cls._get_prepared_non_general_roles)]
+            for mode, query, function in modes:
+                planning = 0
+                execution = 0
+                wall = 0
+                for i in range(n_repeats):
+                    cursor.execute(explain + query, query_parameters)
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    planning += plan[0]['Planning Time']
+                    execution += plan[0]['Execution Time']
+
+                    start = time.perf_counter()
+                    function(
+                        route_id=route_id, user_id=user_id, role=role,
+                        action=action)
+                    wall += time.perf_counter() - start
+                results[mode] = {
+                    'planning_ms': planning / n_repeats,
+                    'execution_ms': execution / n_repeats,
+                    'wall_ms': wall * 1000 / n_repeats}
+        results['n_routes'] = KongRoute.objects.count()
+        return results
+
 
 class GetRouteAux:
     """Class to help get route using differente methods."""
@@ -594,7 +784,9 @@ class GetRouteAux:
         """
         from pumpwood_djangoauth.system.models import KongRoute
         query_results = list(
-            KongRoute.objects.raw(query_template, {'path': path}))
+            KongRoute.objects
+            .using(ReadReplicaAux.get_read_db(aux='GetRouteAux'))
+            .raw(query_template, {'path': path}))
         if len(query_results) == 0:
             msg = (
                 "Route with begging path [{path}] is not registered on "
@@ -0,0 +1,357 @@
+"""Vectorized users x routes x roles permission matrices."""
+import io
+import numpy as np
+import pandas as pd
+from typing import List
+from django.db import connections
+from django.contrib.auth import get_user_model
+from pumpwood_communication.exceptions import (
+    PumpWoodActionArgsException, PumpWoodNotImplementedError)
+from pumpwood_djangoauth.system.aux.policy_engine import PolicyEngine
+from pumpwood_djangoauth.db_router import ReadReplicaAux
+
+
+class PermissionMatrix:
+    """Boolean matrix of users x routes x roles API permissions.
+
+    Matrix is built from policies, policy associations and memberships
+    with a few bulk queries and follows `route_api_permissions.sql`
+    semantics: general policies of users and of their groups (including
+    groups ancestors) grant roles on all routes and custom policies on
+    their route. Superusers have all roles. Custom action policies are
+    not represented, only the `can_run_actions` role.
+
+    Intermediate matrices:
+    - `membership`: users x groups, including ancestors of user's groups.
+    - `general`: users x roles of general policies.
+    - `custom`: users x policies, policies x (routes * roles).
+
+    Attributes:
+        user_ids (np.ndarray):
+            Users at the first axis.
+        route_ids (np.ndarray):
+            Routes at the second axis.
+        roles (List[str]):
+            Roles at the third axis.
+        matrix (np.ndarray):
+            Boolean matrix with shape (users, routes, roles).
+    """
+
+    USER_GROUPS_SQL = """
+        SELECT DISTINCT group_user_m2m.user_id, group_closure.ancestor_id
+        FROM public.groups__group_user_m2m AS group_user_m2m
+        JOIN public.groups__group_closure AS group_closure
+          ON group_closure.descendant_id = group_user_m2m.group_id
+    """
+    """Users groups including the ancestors of their groups."""
+
+    FILE_TYPES = ['csv', 'parquet']
+    """File types that can be exported."""
+
+    def __init__(self, user_ids: np.ndarray, usernames: List[str],
+                 route_ids: np.ndarray, route_names: List[str],
+                 group_ids: np.ndarray, membership: np.ndarray,
+                 matrix: np.ndarray):
+        """__init__.
+
+        Use `build` to create matrices from database.
+        """
+        self.user_ids = user_ids
+        self.usernames = usernames
+        self.route_ids = route_ids
+        self.route_names = route_names
+        self.group_ids = group_ids
+        self.membership = membership
+        self.roles = list(PolicyEngine.ROLE_COLUMNS)
+        self.matrix = matrix
+
+    @classmethod
+    def build(cls, user_ids: List[int] = None,
+              route_ids: List[int] = None) -> 'PermissionMatrix':
+        """Build permission matrix from database.
+
+        Args:
+            user_ids (List[int]):
+                Restrict matrix to these users, if not set all active
+                users are used.
+            route_ids (List[int]):
+                Restrict matrix to these routes, if not set all routes
+                are used.
+
+        Returns:
+            Return a PermissionMatrix object.
+        """
+        from pumpwood_djangoauth.system.models import KongRoute
+        from pumpwood_djangoauth.groups.models import PumpwoodUserGroup
+        from pumpwood_djangoauth.api_permission.models import (
+            PumpwoodPermissionPolicy, PumpwoodPermissionPolicyGroupM2M,
+            PumpwoodPermissionPolicyUserM2M)
+
+        # All reads use the same database, so matrix is not built from
+        # primary and replica snapshots
+        db = ReadReplicaAux.get_read_db(aux='PermissionMatrix')
+        User = get_user_model() # NOQA
+        user_query = User.objects.using(db)\
+            .filter(is_active=True).order_by('id')
+        if user_ids is not None:
+            user_query = user_query.filter(id__in=user_ids)
+        users = list(user_query.values_list('id', 'username', 'is_superuser'))
+        route_query = KongRoute.objects.using(db).order_by('id')
+        if route_ids is not None:
+            route_query = route_query.filter(id__in=route_ids)
+        routes = list(route_query.values_list('id', 'route_name'))
+        group_ids = np.array(
+            PumpwoodUserGroup.objects.using(db).order_by('id')
+            .values_list('id', flat=True), dtype=np.int64)
+        policies = list(
+            PumpwoodPermissionPolicy.objects.using(db)
+            .filter(route__in=route_query.values('id'))
+            .order_by('id')
+            .values_list('id', 'route_id', *PolicyEngine.ROLE_COLUMNS))
+
+        n_roles = len(PolicyEngine.ROLE_COLUMNS)
+        user_index = {u[0]: i for i, u in enumerate(users)}
+        route_index = {r[0]: i for i, r in enumerate(routes)}
+        group_index = {g: i for i, g in enumerate(group_ids.tolist())}
+        policy_index = {p[0]: i for i, p in enumerate(policies)}
+        general_masks = {
+            key: cls._mask_to_vector(mask, n_roles)
+            for key, mask in PolicyEngine.GENERAL_POLICY_MASKS.items()}
+
+        # Memberships: users x groups
+        membership = np.zeros((len(users), len(group_ids)), dtype=bool)
+        with connections[db].cursor() as cursor:
+            cursor.execute(cls.USER_GROUPS_SQL)
+            for user_id, group_id in cursor.fetchall():
+                # Groups created after groups query are skipped
+                row = user_index.get(user_id)
+                column = group_index.get(group_id)
+                if row is not None and column is not None:
+                    membership[row, column] = True
+
+        # Policies: policies x (routes * roles)
+        policy_matrix = np.zeros(
+            (len(policies), len(routes), n_roles), dtype=bool)
+        for i, (_, route_id, *values) in enumerate(policies):
+            # Routes created after routes query are skipped
+            if route_id not in route_index:
+                continue
+            policy_matrix[i, route_index[route_id], :] = [
+                bool(v) for v in values]
+        policy_matrix = policy_matrix.reshape(
+            len(policies), len(routes) * n_roles)
+
+        # General and custom policies of groups and users
+        group_general = np.zeros((len(group_ids), n_roles), dtype=bool)
+        group_custom = np.zeros((len(group_ids), len(policies)), dtype=bool)
+        group_m2m_query = PumpwoodPermissionPolicyGroupM2M.objects\
+            .using(db)\
+            .values_list('group_id', 'general_policy', 'custom_policy_id')
+        cls._fill_associations(
+            query=group_m2m_query, index=group_index,
+            policy_index=policy_index, general_masks=general_masks,
+            general=group_general, custom=group_custom)
+        user_general = np.zeros((len(users), n_roles), dtype=bool)
+        user_custom = np.zeros((len(users), len(policies)), dtype=bool)
+        user_m2m_query = PumpwoodPermissionPolicyUserM2M.objects\
+            .using(db)\
+            .values_list('user_id', 'general_policy', 'custom_policy_id')
+        cls._fill_associations(
+            query=user_m2m_query, index=user_index,
+            policy_index=policy_index, general_masks=general_masks,
+            general=user_general, custom=user_custom)
+
+        # Merge user and groups policies. Products are made with float32,
+        # NumPy uses BLAS only for float matmuls; counts are exact up to
+        # 2 ** 24 and only compared with zero
+        membership_f = membership.astype(np.float32)
+        general = user_general | (
+            membership_f @ group_general.astype(np.float32) > 0)
+        custom = user_custom | (
+            membership_f @ group_custom.astype(np.float32) > 0)
+        matrix = (
+            custom.astype(np.float32) @
+            policy_matrix.astype(np.float32)) > 0
+        matrix = matrix.reshape(len(users), len(routes), n_roles)
+        matrix |= general[:, np.newaxis, :]
+        is_superuser = np.array([u[2] for u in users], dtype=bool)
+        matrix[is_superuser] = True
+        return cls(
+            user_ids=np.array([u[0] for u in users], dtype=np.int64),
+            usernames=[u[1] for u in users],
+            route_ids=np.array([r[0] for r in routes], dtype=np.int64),
+            route_names=[r[1] for r in routes],
+            group_ids=group_ids, membership=membership, matrix=matrix)
+
+    @staticmethod
+    def _mask_to_vector(mask: int, n_roles: int) -> np.ndarray:
+        """Convert a role bitmask to a boolean vector."""
+        return np.array(
+            [(mask >> i) & 1 for i in range(n_roles)], dtype=bool)
+
+    @staticmethod
+    def _fill_associations(query, index: dict, policy_index: dict,
+                           general_masks: dict, general: np.ndarray,
+                           custom: np.ndarray) -> None:
+        """Fill general and custom policy matrices of users or groups.
+
+        Args:
+            query:
+                Query returning tuples `(id, general_policy,
+                custom_policy_id)`.
+            index (dict):
+                Map of user or group ids to matrix rows.
+            policy_index (dict):
+                Map of policy ids to custom matrix columns, policies of
+                routes not at the matrix are not present.
+            general_masks (dict):
+                Role vectors of general policies.
+            general (np.ndarray):
+                Matrix (ids x roles) of general policies to be filled.
+            custom (np.ndarray):
+                Matrix (ids x policies) of custom policies to be filled.
+        """
+        for key, general_policy, custom_policy_id in query.iterator():
+            row = index.get(key)
+            if row is None:
+                continue
+            if custom_policy_id is None:
+                vector = general_masks.get(general_policy)
+                if vector is not None:
+                    general[row] |= vector
+            elif custom_policy_id in policy_index:
+                custom[row, policy_index[custom_policy_id]] = True
+
+    def _get_role_index(self, roles: List[str] = None) -> List[int]:
+        """Validate roles and return their index at the third axis."""
+        if roles is None:
+            return list(range(len(self.roles)))
+        invalid_roles = set(roles) - set(self.roles)
+        if invalid_roles:
+            msg = "Roles {roles} are not at possible options {options}"
+            raise PumpWoodActionArgsException(
+                message=msg, payload={
+                    "roles": sorted(invalid_roles), "options": self.roles})
+        return [self.roles.index(role) for role in roles]
+
+    def users_with_role(self, route_id: int,
+                        roles: List[str] = None) -> pd.DataFrame:
+        """Return users with any of the roles on a route.
+
+        Args:
+            route_id (int):
+                Route id, it must be at the matrix.
+            roles (List[str]):
+                Roles to check, all roles if not set.
+
+        Returns:
+            Return a DataFrame with columns `user_id`, `username` and one
+            boolean column for each role.
+        """
+        role_index = self._get_role_index(roles)
+        route_position = np.flatnonzero(self.route_ids == route_id)
+        if len(route_position) == 0:
+            msg = "Route [{route_id}] is not at permission matrix"
+            raise PumpWoodActionArgsException(
+                message=msg, payload={"route_id": route_id})
+
+        route_matrix = self.matrix[:, route_position[0], :][:, role_index]
+        has_role = route_matrix.any(axis=1)
+        results = pd.DataFrame(
+            route_matrix[has_role],
+            columns=[self.roles[i] for i in role_index])
+        results.insert(0, 'user_id', self.user_ids[has_role])
+        results.insert(
+            1, 'username', np.array(self.usernames, dtype=object)[has_role])
+        return results
+
+    def crosstab(self, group_by: str = 'route',
+                 roles: List[str] = None) -> pd.DataFrame:
+        """Count permissions by route, group or user for each role.
+
+        Args:
+            group_by (str):
+                `route` counts users with each role on each route, `group`
+                counts effective group members with each role on any route
+                of the matrix and `user` counts routes on which each user
+                has each role.
+            roles (List[str]):
+                Roles columns, all roles if not set.
+
+        Returns:
+            Return a DataFrame with one column for each role.
+        """
+        role_index = self._get_role_index(roles)
+        matrix = self.matrix[:, :, role_index]
+        columns = [self.roles[i] for i in role_index]
+        if group_by == 'route':
+            counts = matrix.sum(axis=0)
+            index = pd.MultiIndex.from_arrays(
+                [self.route_ids, self.route_names],
+                names=['route_id', 'route_name'])
+        elif group_by == 'group':
+            any_route = matrix.any(axis=1).astype(np.int64)
+            counts = self.membership.T.astype(np.int64) @ any_route
+            index = pd.Index(self.group_ids, name='group_id')
+        elif group_by == 'user':
+            counts = matrix.sum(axis=1)
+            index = pd.MultiIndex.from_arrays(
+                [self.user_ids, self.usernames],
+                names=['user_id', 'username'])
+        else:
+            msg = "group_by [{group_by}] must be route, group or user"
+            raise PumpWoodActionArgsException(
+                message=msg, payload={"group_by": group_by})
+        return pd.DataFrame(counts, index=index, columns=columns)\
+            .reset_index()
+
+    def to_frame(self, roles: List[str] = None) -> pd.DataFrame:
+        """Return granted permissions in long format.
+
+        Args:
+            roles (List[str]):
+                Roles to return, all roles if not set.
+
+        Returns:
+            Return a DataFrame with columns `user_id`, `username`,
+            `route_id`, `route_name` and `role` for each permission
+            granted.
+        """
+        role_index = self._get_role_index(roles)
+        user_pos, route_pos, role_pos = np.nonzero(
+            self.matrix[:, :, role_index])
+        return pd.DataFrame({
+            'user_id': self.user_ids[user_pos],
+            'username': np.array(self.usernames, dtype=object)[user_pos],
+            'route_id': self.route_ids[route_pos],
+            'route_name': np.array(self.route_names, dtype=object)[route_pos],
+            'role': np.array(
+                [self.roles[i] for i in role_index], dtype=object)[role_pos]})
+
+    @classmethod
+    def to_file(cls, data: pd.DataFrame, file_type: str) -> bytes:
+        """Export a DataFrame as CSV or parquet.
+
+        Args:
+            data (pd.DataFrame):
+                Data to export.
+            file_type (str):
+                `csv` or `parquet`.
+
+        Returns:
+            Return file content.
+        """
+        if file_type == 'csv':
+            return data.to_csv(index=False).encode('utf-8')
+        elif file_type == 'parquet':
+            buffer = io.BytesIO()
+            try:
+                data.to_parquet(buffer, index=False)
+            except ImportError:
+                msg = "Parquet export needs pyarrow or fastparquet installed"
+                raise PumpWoodNotImplementedError(message=msg)
+            return buffer.getvalue()
+        msg = "File type [{file_type}] not in {options}"
+        raise PumpWoodActionArgsException(
+            message=msg, payload={
+                "file_type": file_type, "options": cls.FILE_TYPES})
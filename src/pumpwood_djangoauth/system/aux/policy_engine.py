@@ -0,0 +1,386 @@
+"""In-memory evaluation of API permission policies."""
+import time
+import threading
+from typing import List, Dict, Set
+from loguru import logger
+from django.apps import apps
+from pumpwood_djangoauth.config import (
+    PUMPWOOD__AUTH__POLICY_ENGINE_CHECK_INTERVAL,
+    PUMPWOOD__AUTH__POLICY_ENGINE_MAX_AGE)
+from pumpwood_djangoauth.db_router import get_read_connection
+
+
+class PolicyEngine:
+    """Evaluate API permissions with policies compiled in memory.
+
+    It is an alternative to `route_api_permissions.sql` with the same
+    semantics: a role is granted if any of the user's policies, direct or
+    from the groups and their ancestors, grants it. General policies
+    (`read`/`write`) apply to all routes, custom policies to their route
+    and allowed custom actions grant `can_run_actions` for the action.
+
+    Policies, actions and routes are loaded with a few queries and kept as
+    dictionaries keyed by ids, with roles stored as integer bitmasks.
+    They are reloaded when `PermissionCacheAux` global or routes version
+    change, checked at most once each `check_interval` seconds, or after
+    `max_age` seconds since diskcache is not shared among pods. Users are
+    compiled on first use and recompiled when their permission version
+    changes, that is when their group memberships change.
+    """
+
+    ROLE_COLUMNS = [
+        'can_delete', 'can_delete_file', 'can_delete_many', 'can_list',
+        'can_list_without_pag', 'can_retrieve', 'can_retrieve_file',
+        'can_run_actions', 'can_save']
+    """Policy columns evaluated by the engine."""
+
+    ROLE_BITS = {role: 1 << i for i, role in enumerate(ROLE_COLUMNS)}
+    """Bit associated with each role at permission masks."""
+
+    GENERAL_POLICY_MASKS = {
+        'read': (
+            ROLE_BITS['can_list'] | ROLE_BITS['can_list_without_pag'] |
+            ROLE_BITS['can_retrieve'] | ROLE_BITS['can_retrieve_file']),
+        'write': (1 << len(ROLE_COLUMNS)) - 1}
+    """Roles granted to all routes by general policies."""
+
+    USER_GROUPS_SQL = """
+        SELECT DISTINCT group_closure.ancestor_id
+        FROM public.groups__group_user_m2m AS group_user_m2m
+        JOIN public.groups__group_closure AS group_closure
+          ON group_closure.descendant_id = group_user_m2m.group_id
+        WHERE group_user_m2m.user_id = %(user_id)s
+    """
+    """Groups of an user including the ancestors of its groups."""
+
+    def __init__(self, check_interval: float = 5, max_age: float = 60):
+        """__init__.
+
+        Args:
+            check_interval (float):
+                Seconds between checks of policies and routes versions.
+            max_age (float):
+                Seconds after which policies are reloaded even if versions
+                have not changed.
+        """
+        self._check_interval = check_interval
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._state = None
+
+    @classmethod
+    def get_role_mask(cls, values: Dict[str, bool]) -> int:
+        """Convert a dictionary of role values to a bitmask.
+
+        Args:
+            values (Dict[str, bool]):
+                Dictionary with role columns as keys.
+
+        Returns:
+            Return a bitmask with bits of the roles set as True.
+        """
+        mask = 0
+        for role, bit in cls.ROLE_BITS.items():
+            if values.get(role):
+                mask |= bit
+        return mask
+
+    def has_permission(self, user_id: int, route_id: int, role: str,
+                       action: str) -> bool:
+        """Check if user has role on route.
+
+        Args:
+            user_id (int):
+                ID of the user.
+            route_id (int):
+                ID of the route.
+            role (str):
+                Role to check, one of `ROLE_COLUMNS`.
+            action (str):
+                Action associated with `can_run_actions` role.
+
+        Returns:
+            Return True if user has the role at the route, False if not
+            and None if it was not possible to load policies, in that case
+            permission must be checked using SQL.
+        """
+        state = self._get_state()
+        if state is None:
+            return None
+
+        compiled = self._get_user(state=state, user_id=user_id)
+        mask = compiled['route_masks'].get(route_id, 0)
+        if route_id in state['route_ids']:
+            mask |= compiled['general_mask']
+        if mask & self.ROLE_BITS.get(role, 0):
+            return True
+        if role == 'can_run_actions':
+            return action in compiled['route_actions'].get(route_id, ())
+        return False
+
+    def reload(self) -> dict:
+        """Reload policies and routes regardless of versions."""
+        from pumpwood_djangoauth.registration.aux import PermissionCacheAux
+
+        now = time.monotonic()
+        versions = (
+            PermissionCacheAux.get_global_version(),
+            PermissionCacheAux.get_routes_version())
+        with self._lock:
+            state = self._load()
+            state.update({
+                'versions': versions, 'loaded_at': now, 'checked_at': now,
+                'users': {}})
+            self._state = state
+        return state
+
+    def _get_state(self) -> dict:
+        """Return loaded policies, reloading them if versions changed.
+
+        Returns:
+            Return a dictionary with policies, routes and compiled users.
+            Return None if apps are not ready or it was not possible to
+            load policies. After an error, load is not retried for
+            `check_interval` seconds.
+        """
+        from pumpwood_djangoauth.registration.aux import PermissionCacheAux
+
+        if not apps.ready:
+            return None
+
+        now = time.monotonic()
+        state = self._state
+        if state is not None and \
+                now - state['checked_at'] < self._check_interval:
+            return state if state['route_ids'] is not None else None
+
+        try:
+            versions = (
+                PermissionCacheAux.get_global_version(),
+                PermissionCacheAux.get_routes_version())
+            is_valid = (
+                state is not None and state['versions'] == versions and
+                now - state['loaded_at'] < self._max_age)
+            if is_valid:
+                state['checked_at'] = now
+                return state
+            return self.reload()
+        except Exception:
+            logger.exception("Error when loading policy engine")
+            self._state = {
+                'versions': None, 'route_ids': None, 'loaded_at': now,
+                'checked_at': now, 'users': {}}
+            return None
+
+    def _load(self) -> dict:
+        """Load policies, actions, policy associations and routes."""
+        from pumpwood_djangoauth.system.models import KongRoute
+        from pumpwood_djangoauth.api_permission.models import (
+            PumpwoodPermissionPolicy, PumpwoodPermissionPolicyAction,
+            PumpwoodPermissionPolicyGroupM2M, PumpwoodPermissionPolicyUserM2M)
+
+        route_ids = frozenset(
+            KongRoute.objects.values_list('id', flat=True))
+
+        policies = {}
+        policy_query = PumpwoodPermissionPolicy.objects\
+            .filter(route_id__isnull=False)\
+            .values('id', 'route_id', *self.ROLE_COLUMNS)
+        for policy in policy_query.iterator():
+            policies[policy['id']] = (
+                policy['route_id'], self.get_role_mask(policy))
+
+        policy_actions = {}
+        action_query = PumpwoodPermissionPolicyAction.objects\
+            .filter(is_allowed=True)\
+            .values_list('policy_id', 'action')
+        for policy_id, action in action_query.iterator():
+            policy_actions.setdefault(policy_id, set()).add(action)
+
+        group_general, group_custom = self._load_associations(
+            PumpwoodPermissionPolicyGroupM2M.objects
+            .values_list('group_id', 'general_policy', 'custom_policy_id'))
+        user_general, user_custom = self._load_associations(
+            PumpwoodPermissionPolicyUserM2M.objects
+            .values_list('user_id', 'general_policy', 'custom_policy_id'))
+        return {
+            'route_ids': route_ids, 'policies': policies,
+            'policy_actions': policy_actions,
+            'group_general': group_general, 'group_custom': group_custom,
+            'user_general': user_general, 'user_custom': user_custom}
+
+    @classmethod
+    def _load_associations(cls, query) -> tuple:
+        """Load general masks and custom policies of users or groups.
+
+        Args:
+            query:
+                Query returning tuples `(id, general_policy,
+                custom_policy_id)`.
+
+        Returns:
+            Return a tuple of dictionaries, the first maps ids to general
+            policy masks and the second to lists of custom policy ids.
+        """
+        general = {}
+        custom = {}
+        for key, general_policy, custom_policy_id in query.iterator():
+            if custom_policy_id is None:
+                general[key] = general.get(key, 0) | \
+                    cls.GENERAL_POLICY_MASKS.get(general_policy, 0)
+            else:
+                custom.setdefault(key, []).append(custom_policy_id)
+        return general, custom
+
+    def _get_user(self, state: dict, user_id: int) -> dict:
+        """Return compiled permissions of an user.
+
+        Args:
+            state (dict):
+                Loaded policies returned by `_get_state`.
+            user_id (int):
+                ID of the user.
+
+        Returns:
+            Return a dictionary with keys `version`, `general_mask`,
+            `route_masks` mapping route ids to masks of custom policies
+            and `route_actions` mapping route ids to allowed actions.
+        """
+        from pumpwood_djangoauth.registration.aux import PermissionCacheAux
+
+        version = PermissionCacheAux.get_user_version(user_id=user_id)
+        compiled = state['users'].get(user_id)
+        if compiled is not None and compiled['version'] == version:
+            return compiled
+
+        read_connection = get_read_connection(aux='PolicyEngine')
+        with read_connection.cursor() as cursor:
+            cursor.execute(self.USER_GROUPS_SQL, {"user_id": user_id})
+            group_ids = [row[0] for row in cursor.fetchall()]
+        compiled = self._compile_user(
+            state=state, user_id=user_id, group_ids=group_ids)
+        compiled['version'] = version
+        state['users'][user_id] = compiled
+        return compiled
+
+    @staticmethod
+    def _compile_user(state: dict, user_id: int,
+                      group_ids: List[int]) -> dict:
+        """Merge user and groups policies in route masks."""
+        general_mask = state['user_general'].get(user_id, 0)
+        policy_ids = set(state['user_custom'].get(user_id, []))
+        for group_id in group_ids:
+            general_mask |= state['group_general'].get(group_id, 0)
+            policy_ids.update(state['group_custom'].get(group_id, []))
+
+        route_masks = {}
+        route_actions: Dict[int, Set[str]] = {}
+        for policy_id in policy_ids:
+            policy = state['policies'].get(policy_id)
+            if policy is None:
+                continue
+            route_id, mask = policy
+            route_masks[route_id] = route_masks.get(route_id, 0) | mask
+            actions = state['policy_actions'].get(policy_id)
+            if actions:
+                route_actions.setdefault(route_id, set()).update(actions)
+        return {
+            'general_mask': general_mask, 'route_masks': route_masks,
+            'route_actions': route_actions}
+
+    def validate_against_sql(self, user_ids: List[int] = None,
+                             route_ids: List[int] = None,
+                             max_checks: int = 10000) -> dict:
+        """Compare engine results with `route_api_permissions.sql`.
+
+        Policies are reloaded before comparison. Roles are checked for
+        each user and route, `can_run_actions` is checked for each custom
+        action registered at policies and without action.
+
+        Args:
+            user_ids (List[int]):
+                Users to check, if not set all active non superusers.
+            route_ids (List[int]):
+                Routes to check, if not set all routes.
+            max_checks (int):
+                Maximum number of permission checks.
+
+        Returns:
+            Return a dictionary with keys `n_checks`, `n_mismatches`,
+            `is_truncated`, `mismatches` with the first 100 differences
+            and mean time of each check in microseconds for `sql` and
+            `memory` paths.
+        """
+        from django.contrib.auth import get_user_model
+        from pumpwood_djangoauth.system.models import KongRoute
+        from pumpwood_djangoauth.system.aux.api_permission import (
+            RouteAPIPermissionAux)
+        from pumpwood_djangoauth.api_permission.models import (
+            PumpwoodPermissionPolicyAction)
+
+        User = get_user_model() # NOQA
+        if user_ids is None:
+            user_ids = list(
+                User.objects.filter(is_superuser=False, is_active=True)
+                .order_by('id').values_list('id', flat=True))
+        if route_ids is None:
+            route_ids = list(
+                KongRoute.objects.order_by('id')
+                .values_list('id', flat=True))
+        actions = ['###no_action###'] + list(
+            PumpwoodPermissionPolicyAction.objects
+            .order_by('action').values_list('action', flat=True)
+            .distinct())
+
+        checks = []
+        for user_id in user_ids:
+            for route_id in route_ids:
+                for role in self.ROLE_COLUMNS:
+                    role_actions = (
+                        actions if role == 'can_run_actions'
+                        else ['###no_action###'])
+                    for action in role_actions:
+                        checks.append((user_id, route_id, role, action))
+        is_truncated = max_checks < len(checks)
+        checks = checks[:max_checks]
+
+        state = self.reload()
+        mismatches = []
+        sql_time = 0
+        memory_time = 0
+        for user_id, route_id, role, action in checks:
+            start = time.perf_counter()
+            sql_result = RouteAPIPermissionAux._get_sql_non_general_roles(
+                route_id=route_id, user_id=user_id, role=role,
+                action=action)
+            sql_time += time.perf_counter() - start
+
+            # Compile user outside time measure, it is done once per user
+            self._get_user(state=state, user_id=user_id)
+            start = time.perf_counter()
+            memory_result = self.has_permission(
+                user_id=user_id, route_id=route_id, role=role,
+                action=action)
+            memory_time += time.perf_counter() - start
+
+            if sql_result != memory_result:
+                mismatches.append({
+                    'user_id': user_id, 'route_id': route_id,
+                    'role': role, 'action': action, 'sql': sql_result,
+                    'memory': memory_result})
+
+        n_checks = len(checks)
+        return {
+            'n_checks': n_checks, 'n_mismatches': len(mismatches),
+            'is_truncated': is_truncated, 'mismatches': mismatches[:100],
+            'sql_mean_us': (
+                sql_time / n_checks * 1e6 if n_checks else None),
+            'memory_mean_us': (
+                memory_time / n_checks * 1e6 if n_checks else None)}
+
+
+policy_engine = PolicyEngine(
+    check_interval=PUMPWOOD__AUTH__POLICY_ENGINE_CHECK_INTERVAL,
+    max_age=PUMPWOOD__AUTH__POLICY_ENGINE_MAX_AGE)
+"""Policy engine singleton used by `RouteAPIPermissionAux` if
+   `PUMPWOOD__AUTH__POLICY_ENGINE` is `memory`."""
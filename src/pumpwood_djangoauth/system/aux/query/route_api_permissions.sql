@@ -55,8 +55,10 @@ FROM (
         WHEN general_policy = 'write' THEN TRUE
         ELSE FALSE END AS can_save
     FROM public.api_permission__policy_group_m2m AS group_m2m
+    JOIN public.groups__group_closure AS group_closure
+      ON group_m2m.group_id = group_closure.ancestor_id
     JOIN public.groups__group_user_m2m AS group_user_m2m
-      ON group_m2m.group_id = group_user_m2m.group_id
+      ON group_closure.descendant_id = group_user_m2m.group_id
     JOIN public.pumpwood__route AS route
       ON 1=1
     WHERE custom_policy_id IS NULL
@@ -77,8 +79,10 @@ FROM (
       api_policy.can_run_actions,
       api_policy.can_save
     FROM public.api_permission__policy_group_m2m AS group_m2m
+    JOIN public.groups__group_closure AS group_closure
+      ON group_m2m.group_id = group_closure.ancestor_id
     JOIN public.groups__group_user_m2m AS group_user_m2m
-      ON group_m2m.group_id = group_user_m2m.group_id
+      ON group_closure.descendant_id = group_user_m2m.group_id
     JOIN public.api_permission__policy AS api_policy
       ON api_policy.id = group_m2m.custom_policy_id
     WHERE 1=1
@@ -100,8 +104,10 @@ FROM (
       policy_action.is_allowed AS can_run_actions,
       NULL AS can_save
     FROM public.api_permission__policy_group_m2m AS group_m2m
+    JOIN public.groups__group_closure AS group_closure
+      ON group_m2m.group_id = group_closure.ancestor_id
     JOIN public.groups__group_user_m2m AS group_user_m2m
-      ON group_m2m.group_id = group_user_m2m.group_id
+      ON group_closure.descendant_id = group_user_m2m.group_id
     JOIN public.api_permission__policy AS api_policy
       ON api_policy.id = group_m2m.custom_policy_id
     JOIN public.api_permission__policy_action AS policy_action
@@ -0,0 +1,192 @@
+"""Check query plans of auth hot queries for sequential scans."""
+import json
+from django.db import connection, transaction
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from pumpwood_djangoauth.system.aux.api_permission import (
+    route_api_permissions)
+from pumpwood_djangoauth.registration.aux.api_permission import (
+    group_user_api_permissions)
+from pumpwood_djangoauth.registration.aux.row_permission import (
+    sql_content, ids_sql_content)
+from pumpwood_djangoauth.registration.aux.capability_map import (
+    user_action_permissions)
+
+
+class Command(BaseCommand):
+    """Explain package SQL files and ORM hot queries."""
+
+    help = (
+        "Run EXPLAIN on package SQL files and ORM hot queries with "
+        "`enable_seqscan = off` and fail if any plan still has a "
+        "sequential scan, that is a table without usable index. With "
+        "`--allow-seqscan` planner is not changed and only sequential "
+        "scans on tables with more rows than `--min-rows` fail.")
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--user-id', type=int, default=None,
+            help="Id of the user used as parameter, first active user if "
+                 "not set.")
+        parser.add_argument(
+            '--route-id', type=int, default=None,
+            help="Id of the route used as parameter, first route if not "
+                 "set.")
+        parser.add_argument(
+            '--allow-seqscan', action='store_true',
+            help="Do not set `enable_seqscan = off`, use it on databases "
+                 "with production sized tables.")
+        parser.add_argument(
+            '--min-rows', type=int, default=10000,
+            help="With `--allow-seqscan`, sequential scans on tables with "
+                 "estimated number of rows bellow this value are "
+                 "accepted.")
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help="Run EXPLAIN ANALYZE, executing the queries.")
+
+    def handle(self, *args, **options):
+        """Explain queries and raise CommandError on sequential scans."""
+        from pumpwood_djangoauth.system.models import KongRoute
+
+        User = get_user_model() # NOQA
+        user_id = options['user_id']
+        if user_id is None:
+            user_id = User.objects.filter(is_active=True)\
+                .order_by('id').values_list('id', flat=True).first()
+        route_id = options['route_id']
+        if route_id is None:
+            route_id = KongRoute.objects.order_by('id')\
+                .values_list('id', flat=True).first()
+        if user_id is None or route_id is None:
+            raise CommandError(
+                "It is necessary at least one user and one route to check "
+                "query plans.")
+
+        # On small databases planner prefers sequential scans even if
+        # indexes exist, disabling them makes missing indexes visible
+        allow_seqscan = options['allow_seqscan']
+        min_rows = options['min_rows'] if allow_seqscan else 0
+        plans = {}
+        explain = "EXPLAIN (FORMAT JSON{analyze}) ".format(
+            analyze=", ANALYZE" if options['analyze'] else "")
+        with transaction.atomic(using=connection.alias):
+            if not allow_seqscan:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, sql, parameters in self.get_sql_checks(
+                    user_id=user_id, route_id=route_id):
+                with connection.cursor() as cursor:
+                    cursor.execute(explain + sql, parameters)
+                    plans[name] = self._load_plan(cursor.fetchone()[0])
+            for name, query in self.get_orm_checks(
+                    user_id=user_id, route_id=route_id):
+                plans[name] = self._load_plan(
+                    query.using(connection.alias).explain(
+                        format='json', analyze=options['analyze']))
+
+        table_rows = self._get_table_rows()
+        failures = []
+        for name, plan in plans.items():
+            large_scans = [
+                table for table in self._find_seq_scans(plan)
+                if min_rows <= table_rows.get(table, 0)]
+            if large_scans:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(
+                    "[FAIL] {name}: sequential scan on {tables}".format(
+                        name=name, tables=", ".join(large_scans))))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    "[OK] {name}".format(name=name)))
+
+        if failures:
+            raise CommandError(
+                "Sequential scans on large tables at {n} queries: "
+                "{names}".format(n=len(failures), names=", ".join(failures)))
+
+    @staticmethod
+    def get_sql_checks(user_id: int, route_id: int) -> list:
+        """Return package SQL queries with parameters to be explained."""
+        user_parameters = {"user_id": user_id}
+        return [
+            ('route_api_permissions.sql',
+             route_api_permissions.format(role='can_run_actions'),
+             {"user_id": user_id, "route_id": route_id,
+              "action": "###no_action###"}),
+            ('group_user_api_permissions.sql', group_user_api_permissions,
+             user_parameters),
+            ('group_user_row_permissions.sql', sql_content,
+             user_parameters),
+            ('user_row_permission_ids.sql', ids_sql_content,
+             user_parameters),
+            ('user_action_permissions.sql', user_action_permissions,
+             user_parameters)]
+
+    @staticmethod
+    def get_orm_checks(user_id: int, route_id: int) -> list:
+        """Return ORM hot queries to be explained."""
+        from pumpwood_djangoauth.groups.models import PumpwoodUserGroupM2M
+        from pumpwood_djangoauth.i8n.models import PumpwoodI8nTranslation
+        from pumpwood_djangoauth.registration.models import PumpwoodMFAToken
+        from pumpwood_djangoauth.row_permission.models import (
+            PumpwoodRowPermissionUserM2M)
+        from pumpwood_djangoauth.api_permission.models import (
+            PumpwoodPermissionPolicy, PumpwoodPermissionPolicyAction,
+            PumpwoodPermissionPolicyUserM2M)
+
+        return [
+            ('group_user_m2m by user', PumpwoodUserGroupM2M.objects
+             .filter(user_id=user_id).values('group_id')),
+            ('policy by route', PumpwoodPermissionPolicy.objects
+             .filter(route_id=route_id)),
+            ('policy_action by policy/action',
+             PumpwoodPermissionPolicyAction.objects
+             .filter(policy_id=0, action='###no_action###')),
+            ('policy_user_m2m by user', PumpwoodPermissionPolicyUserM2M
+             .objects.filter(user_id=user_id)
+             .values('custom_policy_id', 'general_policy')),
+            ('row_permission_user_m2m by user',
+             PumpwoodRowPermissionUserM2M.objects
+             .filter(user_id=user_id).values('row_permission_id')),
+            ('mfa_token expired', PumpwoodMFAToken.objects
+             .filter(expire_at__lt=timezone.now())),
+            ('i8n translation by key', PumpwoodI8nTranslation.objects
+             .filter(
+                 sentence='', tag='', plural=False, language='',
+                 user_type='')),
+            ('i8n catalog', PumpwoodI8nTranslation.objects
+             .filter(language='', user_type='')
+             .values_list('id', 'sentence', 'tag', 'plural'))]
+
+    @staticmethod
+    def _load_plan(plan) -> dict:
+        """Return root plan node from EXPLAIN JSON output."""
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']
+
+    @staticmethod
+    def _find_seq_scans(plan: dict) -> list:
+        """Return tables scanned sequentially at a plan."""
+        tables = []
+        nodes = [plan]
+        while nodes:
+            node = nodes.pop()
+            if node.get('Node Type') == 'Seq Scan':
+                tables.append(node.get('Relation Name'))
+            nodes.extend(node.get('Plans', []))
+        return tables
+
+    @staticmethod
+    def _get_table_rows() -> dict:
+        """Return estimated number of rows of public tables."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname, GREATEST(reltuples, 0)::bigint "
+                "FROM pg_class "
+                "WHERE relkind = 'r' "
+                "  AND relnamespace = 'public'::regnamespace")
+            return dict(cursor.fetchall())
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-19 10:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0012_remove_unique_route_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KongRouteUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Day of the calls (UTC)', verbose_name='Day')),
+                ('end_point', models.CharField(blank=True, default='', help_text='End-point called (list, retrieve, save, ...)', max_length=100, verbose_name='End-point')),
+                ('request_method', models.CharField(blank=True, default='', help_text='HTTP method used on the calls', max_length=10, verbose_name='Request method')),
+                ('n_calls', models.BigIntegerField(default=0, help_text='Number of calls on the period', verbose_name='Number of calls')),
+                ('n_failed', models.BigIntegerField(default=0, help_text='Number of calls that failed permission check', verbose_name='Number of failed calls')),
+                ('route', models.ForeignKey(help_text='Route associated with the calls', on_delete=django.db.models.deletion.CASCADE, related_name='usage_daily_set', to='system.kongroute', verbose_name='Route')),
+                ('user', models.ForeignKey(help_text='User responsible for the calls', on_delete=django.db.models.deletion.CASCADE, related_name='route_usage_daily_set', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Route usage (daily)',
+                'verbose_name_plural': 'Routes usage (daily)',
+                'db_table': 'pumpwood__route_usage_daily',
+                'unique_together': {('day', 'route', 'user', 'end_point', 'request_method')},
+            },
+        ),
+        migrations.CreateModel(
+            name='KongRouteUsageHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Hour of the calls (UTC truncated to hour)', verbose_name='Hour')),
+                ('end_point', models.CharField(blank=True, default='', help_text='End-point called (list, retrieve, save, ...)', max_length=100, verbose_name='End-point')),
+                ('request_method', models.CharField(blank=True, default='', help_text='HTTP method used on the calls', max_length=10, verbose_name='Request method')),
+                ('n_calls', models.BigIntegerField(default=0, help_text='Number of calls on the period', verbose_name='Number of calls')),
+                ('n_failed', models.BigIntegerField(default=0, help_text='Number of calls that failed permission check', verbose_name='Number of failed calls')),
+                ('route', models.ForeignKey(help_text='Route associated with the calls', on_delete=django.db.models.deletion.CASCADE, related_name='usage_hourly_set', to='system.kongroute', verbose_name='Route')),
+                ('user', models.ForeignKey(help_text='User responsible for the calls', on_delete=django.db.models.deletion.CASCADE, related_name='route_usage_hourly_set', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Route usage (hourly)',
+                'verbose_name_plural': 'Routes usage (hourly)',
+                'db_table': 'pumpwood__route_usage_hourly',
+                'unique_together': {('hour', 'route', 'user', 'end_point', 'request_method')},
+            },
+        ),
+    ]
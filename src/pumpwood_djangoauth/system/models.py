@@ -1,13 +1,19 @@
 """Manage Kong routes for Pumpwood."""
 import io
 import time
+import datetime
 import pandas as pd
 from typing import Literal
 from copy import deepcopy
 from loguru import logger
 from typing import List, Dict
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.db.models import Q, F, Sum, Count, Window
+from django.db.models.functions import RowNumber
 from psycopg2.errors import UniqueViolation
 from pumpwood_djangoviews.action import action
 from pumpwood_djangoauth.config import kong_api
@@ -21,7 +27,10 @@ from pumpwood_djangoauth.i8n.translate import t
 from pumpwood_djangoauth.config import (
     microservice, PUMPWOOD__AUTH__TOKEN_CACHE_EXPIRE)
 from pumpwood_djangoauth.system.aux import (
-    RouteAPIPermissionAux, MapPathRoleAux, GetRouteAux)
+    RouteAPIPermissionAux, MapPathRoleAux, GetRouteAux, policy_engine,
+    PermissionMatrix)
+from pumpwood_djangoauth.registration.aux import PermissionCacheAux
+from pumpwood_djangoauth.kong.sync import KongSyncAux
 
 
 class KongService(models.Model):
@@ -94,7 +103,8 @@ class KongService(models.Model):
         """Load kong services and routes.
 
         Load services and routes in database at Kong. This action does not
-        remove other kongs end-points.
+        remove other kongs end-points. Kong state is fetched once and only
+        services and routes that differ from it are registered.
 
         Args:
             list_service_id (list):
@@ -108,28 +118,33 @@ class KongService(models.Model):
         else:
             services = cls.objects.all()
 
-        for s in services:
-            cls.create_service(
-                service_url=s.service_url,
-                service_name=s.service_name,
-                description=s.description,
-                notes=s.notes,
-                icon=s.icon,
-                healthcheck_route=s.healthcheck_route,
-                dimensions=s.dimensions,
-                extra_info=s.extra_info)
-
+        # Fetch Kong state once and register only the differences
+        kong_state = KongSyncAux.get_kong_state()
+        for s in services.prefetch_related('route_set'):
+            routes = []
             for r in s.route_set.all():
-                KongRoute.create_route(
-                    service_id=r.service_id,
-                    route_url=r.route_url,
-                    route_name=r.route_name,
-                    route_type=r.route_type,
-                    description=r.description,
-                    notes=r.notes,
-                    icon=r.icon,
-                    dimensions=r.dimensions,
-                    extra_info=r.extra_info)
+                kong_data = r.extra_info.get("kong_data") or {}
+                routes.append({
+                    "route_url": r.route_url,
+                    "route_name": r.route_name,
+                    "route_type": r.route_type,
+                    "strip_path": kong_data.get("strip_path", False),
+                    "description": r.description,
+                    "notes": r.notes,
+                    "icon": r.icon,
+                    "dimensions": r.dimensions,
+                    "extra_info": r.extra_info})
+            KongSyncAux.sync(
+                service={
+                    "service_url": s.service_url,
+                    "service_name": s.service_name,
+                    "description": s.description,
+                    "notes": s.notes,
+                    "icon": s.icon,
+                    "healthcheck_route": s.healthcheck_route,
+                    "dimensions": s.dimensions,
+                    "extra_info": s.extra_info},
+                routes=routes, kong_state=kong_state)
         return True
 
     @classmethod
@@ -984,3 +999,337 @@ class KongRoute(models.Model):
             'route_fields': fields_data,
             'action_data': action_data
         }
+
+    @action(info='Benchmark permission query planning and execution',
+            permission_role='is_superuser')
+    def benchmark_permission_query(self, user_id: int,
+                                   role: str = 'can_list',
+                                   action: str = None,
+                                   n_repeats: int = 10) -> dict:
+        """Compare permission query using plain SQL and prepared statement.
+
+        Args:
+            user_id (int):
+                User to check permission on this route.
+            role (str):
+                Role to check.
+            action (str):
+                Action for `can_run_actions` role.
+            n_repeats (int):
+                Number of repetitions of each mode.
+
+        Returns:
+            Return mean planning, execution and wall times in milliseconds
+            for `sql` and `prepared` modes and the number of routes.
+        """
+        return RouteAPIPermissionAux.benchmark_permission_query(
+            route_id=self.id, user_id=user_id, role=role, action=action,
+            n_repeats=n_repeats)
+
+    @action(info='Users with roles on this route',
+            permission_role='is_superuser')
+    def users_with_role(self, roles: List[str] = None) -> List[dict]:
+        """List users that have any of the roles on this route.
+
+        Args:
+            roles (List[str]):
+                Roles to check, all route roles if not set.
+
+        Returns:
+            Return a list of dictionaries with `user_id`, `username` and
+            one boolean key for each role.
+        """
+        matrix = PermissionMatrix.build(route_ids=[self.id])
+        return matrix.users_with_role(route_id=self.id, roles=roles)\
+            .to_dict('records')
+
+    @classmethod
+    @action(info='Cross-tab of API permissions by route, group or user',
+            permission_role='is_superuser')
+    def permission_crosstab(cls, group_by: Literal[
+                                'route', 'group', 'user'] = 'route',
+                            route_ids: List[int] = None,
+                            user_ids: List[int] = None,
+                            roles: List[str] = None) -> List[dict]:
+        """Count API permissions by route, group or user for each role.
+
+        Args:
+            group_by (Literal['route', 'group', 'user']):
+                `route` counts users with each role on the route, `group`
+                counts group members (including members of descendant
+                groups) with each role on any of the routes and `user`
+                counts routes on which the user has each role.
+            route_ids (List[int]):
+                Routes to consider, all routes if not set.
+            user_ids (List[int]):
+                Users to consider, all active users if not set.
+            roles (List[str]):
+                Roles to count, all route roles if not set.
+
+        Returns:
+            Return a list of dictionaries with the `group_by` keys and the
+            count of each role.
+        """
+        matrix = PermissionMatrix.build(
+            user_ids=user_ids, route_ids=route_ids)
+        return matrix.crosstab(group_by=group_by, roles=roles)\
+            .to_dict('records')
+
+    @classmethod
+    @action(info='Export users API permissions as CSV or parquet',
+            permission_role='is_superuser')
+    def export_permission_matrix(cls, route_ids: List[int] = None,
+                                 user_ids: List[int] = None,
+                                 roles: List[str] = None,
+                                 file_type: Literal[
+                                     'csv', 'parquet'] = 'csv'
+                                 ) -> ActionReturnFile:
+        """Export API permissions granted to users.
+
+        Args:
+            route_ids (List[int]):
+                Routes to export, all routes if not set.
+            user_ids (List[int]):
+                Users to export, all active users if not set.
+            roles (List[str]):
+                Roles to export, all route roles if not set.
+            file_type (Literal['csv', 'parquet']):
+                Type of the exported file.
+
+        Returns:
+            Return a file with columns `user_id`, `username`, `route_id`,
+            `route_name` and `role` for each permission granted.
+        """
+        matrix = PermissionMatrix.build(
+            user_ids=user_ids, route_ids=route_ids)
+        content = PermissionMatrix.to_file(
+            data=matrix.to_frame(roles=roles), file_type=file_type)
+        content_type = (
+            'text/csv' if file_type == 'csv'
+            else 'application/octet-stream')
+        return ActionReturnFile(
+            filename='permission_matrix.' + file_type, content=content,
+            content_type=content_type)
+
+    @classmethod
+    @action(info='Compare in memory policy engine with SQL permissions',
+            permission_role='is_superuser')
+    def validate_policy_engine(cls, user_ids: List[int] = None,
+                               route_ids: List[int] = None,
+                               max_checks: int = 10000) -> dict:
+        """Compare in memory policy engine results with SQL permissions.
+
+        Differential check of `PolicyEngine` against
+        `route_api_permissions.sql`, it can be used before setting
+        `PUMPWOOD__AUTH__POLICY_ENGINE` to `memory`.
+
+        Args:
+            user_ids (List[int]):
+                Users to check, if not set all active non superusers.
+            route_ids (List[int]):
+                Routes to check, if not set all routes.
+            max_checks (int):
+                Maximum number of permission checks.
+
+        Returns:
+            Return a dictionary with number of checks, mismatches and
+            mean time of each check for SQL and memory engines.
+        """
+        return policy_engine.validate_against_sql(
+            user_ids=user_ids, route_ids=route_ids, max_checks=max_checks)
+
+    @classmethod
+    @action(info='Most called routes by user at the last days',
+            permission_role='is_superuser')
+    def usage_top_routes(cls, days: int = 30, user_id: int = None,
+                         limit: int = 20) -> List[dict]:
+        """List the most called routes for each user.
+
+        Data is fetched from `KongRouteUsageDaily` rollup table, it does not
+        scan the API logs.
+
+        Args:
+            days (int):
+                Number of days to consider on the aggregation.
+            user_id (int):
+                Restrict results to this user, if not set top routes for
+                all users will be returned.
+            limit (int):
+                Number of routes returned for each user.
+
+        Returns:
+            A list of dictionaries with keys `user_id`, `route_id`,
+            `route_name`, `route_url`, `n_calls`, `n_failed` and
+            `rank`.
+        """
+        start_day = (
+            datetime.datetime.now(datetime.UTC).date() -
+            datetime.timedelta(days=days))
+        query = KongRouteUsageDaily.objects.filter(day__gte=start_day)
+        if user_id is not None:
+            query = query.filter(user_id=user_id)
+        query = query\
+            .values('user_id', 'route_id')\
+            .annotate(
+                route_name=F('route__route_name'),
+                route_url=F('route__route_url'),
+                n_calls=Sum('n_calls'), n_failed=Sum('n_failed'))\
+            .annotate(rank=Window(
+                expression=RowNumber(), partition_by=[F('user_id')],
+                order_by=[F('n_calls').desc(), F('route_id').asc()]))\
+            .filter(rank__lte=limit)\
+            .order_by('user_id', 'rank')
+        return list(query)
+
+    @classmethod
+    @action(info='Routes that were not called at the last days',
+            permission_role='is_superuser')
+    def usage_idle_routes(cls, days: int = 90) -> List[dict]:
+        """List routes that have not received calls at the last days.
+
+        Data is fetched from `KongRouteUsageDaily` rollup table, it does not
+        scan the API logs.
+
+        Args:
+            days (int):
+                Number of days without calls to consider a route idle.
+
+        Returns:
+            A list of dictionaries with keys `route_id`, `route_name`,
+            `route_url` and `route_type`.
+        """
+        start_day = (
+            datetime.datetime.now(datetime.UTC).date() -
+            datetime.timedelta(days=days))
+        called_routes = KongRouteUsageDaily.objects\
+            .filter(day__gte=start_day)\
+            .values('route_id')
+        query = cls.objects\
+            .exclude(id__in=called_routes)\
+            .annotate(route_id=F('id'))\
+            .values('route_id', 'route_name', 'route_url', 'route_type')\
+            .order_by('route_name')
+        return list(query)
+
+    @action(info='Daily calls of this route at the last days')
+    def usage_history(self, days: int = 30) -> List[dict]:
+        """Return the number of calls for this route by day and end-point.
+
+        Args:
+            days (int):
+                Number of days to return.
+
+        Returns:
+            A list of dictionaries with keys `day`, `end_point`,
+            `request_method`, `n_calls`, `n_failed` and `n_users`.
+        """
+        start_day = (
+            datetime.datetime.now(datetime.UTC).date() -
+            datetime.timedelta(days=days))
+        query = self.usage_daily_set\
+            .filter(day__gte=start_day)\
+            .values('day', 'end_point', 'request_method')\
+            .annotate(
+                n_calls=Sum('n_calls'), n_failed=Sum('n_failed'),
+                n_users=Count('user_id', distinct=True))\
+            .order_by('day', 'end_point', 'request_method')
+        return list(query)
+
+
+class KongRouteUsageHourly(models.Model):
+    """Hourly rollup of API calls by route, user and end-point.
+
+    Rows are upserted incrementally by `log_api_request` when
+    `PUMPWOOD__AUTH__USAGE_ROLLUP` is set.
+    """
+
+    hour = models.DateTimeField(
+        null=False, verbose_name="Hour",
+        help_text="Hour of the calls (UTC truncated to hour)")
+    route = models.ForeignKey(
+        KongRoute, on_delete=models.CASCADE, related_name="usage_hourly_set",
+        verbose_name="Route",
+        help_text="Route associated with the calls")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        related_name="route_usage_hourly_set",
+        verbose_name="User",
+        help_text="User responsible for the calls")
+    end_point = models.CharField(
+        null=False, max_length=100, default="", blank=True,
+        verbose_name="End-point",
+        help_text="End-point called (list, retrieve, save, ...)")
+    request_method = models.CharField(
+        null=False, max_length=10, default="", blank=True,
+        verbose_name="Request method",
+        help_text="HTTP method used on the calls")
+    n_calls = models.BigIntegerField(
+        null=False, default=0, verbose_name="Number of calls",
+        help_text="Number of calls on the period")
+    n_failed = models.BigIntegerField(
+        null=False, default=0, verbose_name="Number of failed calls",
+        help_text="Number of calls that failed permission check")
+
+    class Meta:
+        """Meta."""
+        db_table = 'pumpwood__route_usage_hourly'
+        unique_together = [
+            ['hour', 'route', 'user', 'end_point', 'request_method']]
+        verbose_name = 'Route usage (hourly)'
+        verbose_name_plural = 'Routes usage (hourly)'
+
+
+class KongRouteUsageDaily(models.Model):
+    """Daily rollup of API calls by route, user and end-point.
+
+    Rows are upserted incrementally by `log_api_request` when
+    `PUMPWOOD__AUTH__USAGE_ROLLUP` is set.
+    """
+
+    day = models.DateField(
+        null=False, verbose_name="Day",
+        help_text="Day of the calls (UTC)")
+    route = models.ForeignKey(
+        KongRoute, on_delete=models.CASCADE, related_name="usage_daily_set",
+        verbose_name="Route",
+        help_text="Route associated with the calls")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        related_name="route_usage_daily_set",
+        verbose_name="User",
+        help_text="User responsible for the calls")
+    end_point = models.CharField(
+        null=False, max_length=100, default="", blank=True,
+        verbose_name="End-point",
+        help_text="End-point called (list, retrieve, save, ...)")
+    request_method = models.CharField(
+        null=False, max_length=10, default="", blank=True,
+        verbose_name="Request method",
+        help_text="HTTP method used on the calls")
+    n_calls = models.BigIntegerField(
+        null=False, default=0, verbose_name="Number of calls",
+        help_text="Number of calls on the period")
+    n_failed = models.BigIntegerField(
+        null=False, default=0, verbose_name="Number of failed calls",
+        help_text="Number of calls that failed permission check")
+
+    class Meta:
+        """Meta."""
+        db_table = 'pumpwood__route_usage_daily'
+        unique_together = [
+            ['day', 'route', 'user', 'end_point', 'request_method']]
+        verbose_name = 'Route usage (daily)'
+        verbose_name_plural = 'Routes usage (daily)'
+
+
+@receiver(post_save, sender=KongRoute)
+@receiver(post_delete, sender=KongRoute)
+def invalidate_route_cache(sender, instance, **kwargs):
+    """Invalidate caches built from registered routes."""
+    transaction.on_commit(PermissionCacheAux.invalidate_routes)
+
+
+@receiver(connection_created)
+def reset_prepared_statements(sender, connection, **kwargs):
+    """Reset prepared statements control for new database connections."""
+    RouteAPIPermissionAux.reset_prepared_statements(connection=connection)
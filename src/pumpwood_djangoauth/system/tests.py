@@ -1,3 +1,355 @@
+"""Tests of system app."""
+import datetime
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from pumpwood_djangoauth.log.rollup import ApiUsageRollup
+from pumpwood_djangoauth.system.models import (
+    KongService, KongRoute, KongRouteUsageHourly, KongRouteUsageDaily)
+from pumpwood_djangoauth.system.aux import PolicyEngine
+from pumpwood_djangoauth.system.aux.api_permission import (
+    RouteAPIPermissionAux)
+from pumpwood_djangoauth.groups.models import (
+    PumpwoodUserGroup, PumpwoodUserGroupM2M)
+from pumpwood_djangoauth.api_permission.models import (
+    PumpwoodPermissionPolicy, PumpwoodPermissionPolicyAction,
+    PumpwoodPermissionPolicyGroupM2M, PumpwoodPermissionPolicyUserM2M)
+from pumpwood_djangoauth.row_permission.models import (
+    PumpwoodRowPermission, PumpwoodRowPermissionGroupM2M,
+    PumpwoodRowPermissionUserM2M)
+from pumpwood_djangoauth.registration.models import PumpwoodMFAToken
+from pumpwood_djangoauth.i8n.models import PumpwoodI8nTranslation
+from pumpwood_djangoauth.system.management.commands import (
+    check_auth_query_plans)
 
-# Create your tests here.
+
+class PolicyEngineTest(TestCase):
+    """Compare in-memory `PolicyEngine` with `route_api_permissions.sql`."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create routes, policies, nested groups and users."""
+        User = get_user_model() # NOQA
+        cls.admin = User.objects.create_user(username='test--admin')
+        cls.member = User.objects.create_user(username='test--member')
+        cls.direct = User.objects.create_user(username='test--direct')
+        cls.writer = User.objects.create_user(username='test--writer')
+        cls.no_policy = User.objects.create_user(username='test--no-policy')
+
+        service = KongService.objects.create(
+            service_url='http://test-service:5000/',
+            service_name='test-service', service_kong_id='test-service-id',
+            description='Test service')
+        cls.routes = [
+            KongRoute.objects.create(
+                service=service, route_url='/rest/test{}/'.format(i),
+                route_name='test-route-{}'.format(i),
+                route_kong_id='test-route-id-{}'.format(i),
+                route_type='endpoint', description='Test route', notes='')
+            for i in range(3)]
+
+        list_policy = PumpwoodPermissionPolicy.objects.create(
+            description='test--list', route=cls.routes[0],
+            can_list=True, can_retrieve=True, updated_by=cls.admin)
+        save_policy = PumpwoodPermissionPolicy.objects.create(
+            description='test--save', route=cls.routes[1],
+            can_save=True, can_delete=False, updated_by=cls.admin)
+        action_policy = PumpwoodPermissionPolicy.objects.create(
+            description='test--action', route=cls.routes[2],
+            can_run_actions=None, updated_by=cls.admin)
+        PumpwoodPermissionPolicyAction.objects.create(
+            policy=action_policy, action='run_report', is_allowed=True,
+            updated_by=cls.admin)
+        PumpwoodPermissionPolicyAction.objects.create(
+            policy=action_policy, action='drop_all', is_allowed=False,
+            updated_by=cls.admin)
+
+        # Member is at child group and inherits parent group policies
+        parent_group = PumpwoodUserGroup.objects.create(
+            description='test--parent', updated_by=cls.admin)
+        child_group = PumpwoodUserGroup.objects.create(
+            description='test--child', parent=parent_group,
+            updated_by=cls.admin)
+        PumpwoodUserGroupM2M.objects.create(
+            user=cls.member, group=child_group, updated_by=cls.admin)
+        PumpwoodPermissionPolicyGroupM2M.objects.create(
+            group=parent_group, general_policy='read', updated_by=cls.admin)
+        PumpwoodPermissionPolicyGroupM2M.objects.create(
+            group=parent_group, general_policy='custom',
+            custom_policy=save_policy, updated_by=cls.admin)
+        PumpwoodPermissionPolicyGroupM2M.objects.create(
+            group=child_group, general_policy='custom',
+            custom_policy=action_policy, updated_by=cls.admin)
+
+        PumpwoodPermissionPolicyUserM2M.objects.create(
+            user=cls.direct, general_policy='custom',
+            custom_policy=list_policy, updated_by=cls.admin)
+        PumpwoodPermissionPolicyUserM2M.objects.create(
+            user=cls.writer, general_policy='write', updated_by=cls.admin)
+
+    def get_users(self) -> list:
+        """Return users of the fixtures."""
+        return [
+            self.admin, self.member, self.direct, self.writer,
+            self.no_policy]
+
+    def test_engine_matches_sql(self):
+        """Engine and SQL results are equal for all roles and actions."""
+        engine = PolicyEngine(check_interval=0, max_age=0)
+        results = engine.validate_against_sql(
+            user_ids=[x.id for x in self.get_users()],
+            route_ids=[x.id for x in self.routes])
+        self.assertFalse(results['is_truncated'])
+        self.assertEqual(
+            results['n_checks'],
+            len(self.get_users()) * len(self.routes) *
+            (len(PolicyEngine.ROLE_COLUMNS) + 2))
+        self.assertEqual(
+            results['n_mismatches'], 0, msg=results['mismatches'])
+
+    def test_engine_expected_permissions(self):
+        """Engine and SQL return expected permissions of fixtures."""
+        engine = PolicyEngine(check_interval=0, max_age=0)
+        no_action = '###no_action###'
+        expected = [
+            # General read policy of parent group
+            (self.member, self.routes[0], 'can_list', no_action, True),
+            (self.member, self.routes[0], 'can_save', no_action, False),
+            # Custom policy of parent group
+            (self.member, self.routes[1], 'can_save', no_action, True),
+            (self.member, self.routes[1], 'can_delete', no_action, False),
+            # Custom actions of child group policy
+            (self.member, self.routes[2], 'can_run_actions', 'run_report',
+             True),
+            (self.member, self.routes[2], 'can_run_actions', 'drop_all',
+             False),
+            (self.member, self.routes[2], 'can_run_actions', no_action,
+             False),
+            # Custom policy associated directly with user
+            (self.direct, self.routes[0], 'can_retrieve', no_action, True),
+            (self.direct, self.routes[1], 'can_list', no_action, False),
+            # General write policy associated directly with user
+            (self.writer, self.routes[2], 'can_delete', no_action, True),
+            (self.no_policy, self.routes[0], 'can_list', no_action, False)]
+        for user, route, role, action, result in expected:
+            with self.subTest(
+                    user=user.username, route=route.route_name, role=role,
+                    action=action):
+                self.assertEqual(
+                    engine.has_permission(
+                        user_id=user.id, route_id=route.id, role=role,
+                        action=action),
+                    result)
+                self.assertEqual(
+                    RouteAPIPermissionAux._get_sql_non_general_roles(
+                        route_id=route.id, user_id=user.id, role=role,
+                        action=action),
+                    result)
+
+
+class ApiUsageRollupTest(TestCase):
+    """Check API usage rollup tables and `usage_*` actions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create users and routes."""
+        User = get_user_model() # NOQA
+        cls.user = User.objects.create_user(username='test--usage')
+        cls.other_user = User.objects.create_user(
+            username='test--usage-other')
+        service = KongService.objects.create(
+            service_url='http://test-usage:5000/',
+            service_name='test-usage', service_kong_id='test-usage-id',
+            description='Test service')
+        cls.routes = [
+            KongRoute.objects.create(
+                service=service, route_url='/rest/usage{}/'.format(i),
+                route_name='test-usage-route-{}'.format(i),
+                route_kong_id='test-usage-route-id-{}'.format(i),
+                route_type='endpoint', description='Test route', notes='')
+            for i in range(3)]
+
+    def log_calls(self, rollup: ApiUsageRollup) -> None:
+        """Log calls of fixtures at rollup."""
+        calls = [
+            (self.user, 'rest/usage0/list', 'list', 'post', 'ok'),
+            (self.user, 'rest/usage0/list', 'list', 'post', 'ok'),
+            (self.user, 'rest/usage0/list', 'list', 'post', 'failed'),
+            (self.user, 'rest/usage0/retrieve/1', 'retrieve', 'get', 'ok'),
+            (self.user, 'rest/usage1/save', 'save', 'post', 'ok'),
+            (self.other_user, 'rest/usage1/save', 'save', 'post', 'ok'),
+            # Calls that do not match a route are not aggregated
+            (self.user, 'rest/not-a-route/list', 'list', 'post', 'ok')]
+        for user, path, end_point, request_method, check in calls:
+            rollup.add(
+                user_id=user.id, path=path, end_point=end_point,
+                request_method=request_method, permission_check=check)
+
+    def test_hourly_and_daily_rollup(self):
+        """Calls are aggregated by hour and day."""
+        rollup = ApiUsageRollup(flush_interval=3600)
+        self.log_calls(rollup)
+        rollup.flush()
+        # Counters are added to existing rows at next flush
+        self.log_calls(rollup)
+        rollup.flush()
+
+        now = datetime.datetime.now(datetime.UTC)
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        hourly = KongRouteUsageHourly.objects.get(
+            hour=hour, route=self.routes[0], user=self.user,
+            end_point='list', request_method='post')
+        self.assertEqual((hourly.n_calls, hourly.n_failed), (6, 2))
+        daily = KongRouteUsageDaily.objects.get(
+            day=now.date(), route=self.routes[0], user=self.user,
+            end_point='list', request_method='post')
+        self.assertEqual((daily.n_calls, daily.n_failed), (6, 2))
+        self.assertEqual(KongRouteUsageHourly.objects.count(), 4)
+        self.assertEqual(KongRouteUsageDaily.objects.count(), 4)
+
+    def test_deleted_user_does_not_lose_counters(self):
+        """Counters of users deleted before flush are skipped."""
+        rollup = ApiUsageRollup(flush_interval=3600)
+        self.log_calls(rollup)
+        other_user_id = self.other_user.id
+        self.other_user.delete()
+        rollup.flush()
+        self.assertEqual(KongRouteUsageDaily.objects.count(), 3)
+        self.assertFalse(KongRouteUsageDaily.objects.filter(
+            user_id=other_user_id).exists())
+
+    def test_usage_actions(self):
+        """`usage_*` actions read the daily rollup."""
+        rollup = ApiUsageRollup(flush_interval=3600)
+        self.log_calls(rollup)
+        rollup.flush()
+
+        top_routes = KongRoute.usage_top_routes(
+            days=1, user_id=self.user.id)
+        self.assertEqual(
+            [(x['route_id'], x['n_calls'], x['n_failed'], x['rank'])
+             for x in top_routes],
+            [(self.routes[0].id, 4, 1, 1), (self.routes[1].id, 1, 0, 2)])
+
+        idle_routes = KongRoute.usage_idle_routes(days=1)
+        self.assertEqual(
+            [x['route_id'] for x in idle_routes
+             if x['route_name'].startswith('test-usage-')],
+            [self.routes[2].id])
+
+        history = self.routes[1].usage_history(days=1)
+        self.assertEqual(len(history), 1)
+        self.assertEqual(
+            (history[0]['n_calls'], history[0]['n_users']), (2, 2))
+
+
+class AuthQueryPlanTest(TestCase):
+    """Check that auth hot queries use indexes on a seeded database.
+
+    Queries of `check_auth_query_plans` command are explained with
+    `enable_seqscan = off`, planner still uses sequential scans only for
+    tables without an usable index.
+    """
+
+    N_ROUTES = 20
+    """Number of routes, policies and row permissions seeded."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed tables read by auth hot queries.
+
+        Users, nested groups, routes, policies, row permissions, MFA tokens
+        and translations.
+        """
+        User = get_user_model() # NOQA
+        cls.users = [
+            User.objects.create_user(username='test--plan-{}'.format(i))
+            for i in range(5)]
+        admin = cls.users[0]
+
+        service = KongService.objects.create(
+            service_url='http://test-plan:5000/',
+            service_name='test-plan', service_kong_id='test-plan-id',
+            description='Test service')
+        cls.routes = [
+            KongRoute.objects.create(
+                service=service, route_url='/rest/plan{}/'.format(i),
+                route_name='test-plan-route-{}'.format(i),
+                route_kong_id='test-plan-route-id-{}'.format(i),
+                route_type='endpoint', description='Test route', notes='')
+            for i in range(cls.N_ROUTES)]
+
+        # Nested groups, each user is member of one group
+        groups = []
+        parent = None
+        for i in range(3):
+            parent = PumpwoodUserGroup.objects.create(
+                description='test--plan-group-{}'.format(i), parent=parent,
+                updated_by=admin)
+            groups.append(parent)
+        for i, user in enumerate(cls.users):
+            PumpwoodUserGroupM2M.objects.create(
+                user=user, group=groups[i % len(groups)], updated_by=admin)
+
+        for i, route in enumerate(cls.routes):
+            policy = PumpwoodPermissionPolicy.objects.create(
+                description='test--plan-policy-{}'.format(i), route=route,
+                can_list=True, can_run_actions=None, updated_by=admin)
+            PumpwoodPermissionPolicyAction.objects.create(
+                policy=policy, action='run_report', is_allowed=True,
+                updated_by=admin)
+            PumpwoodPermissionPolicyGroupM2M.objects.create(
+                group=groups[i % len(groups)], general_policy='custom',
+                custom_policy=policy, updated_by=admin)
+            PumpwoodPermissionPolicyUserM2M.objects.create(
+                user=cls.users[i % len(cls.users)], general_policy='custom',
+                custom_policy=policy, updated_by=admin)
+
+            row_permission = PumpwoodRowPermission.objects.create(
+                code='test--plan-{}'.format(i),
+                description='test--plan-row-permission-{}'.format(i),
+                updated_by=admin)
+            PumpwoodRowPermissionGroupM2M.objects.create(
+                group=groups[i % len(groups)], row_permission=row_permission,
+                updated_by=admin)
+            PumpwoodRowPermissionUserM2M.objects.create(
+                user=cls.users[i % len(cls.users)],
+                row_permission=row_permission, updated_by=admin)
+
+        now = timezone.now()
+        PumpwoodMFAToken.objects.bulk_create([
+            PumpwoodMFAToken(
+                token='test--plan-token-{}'.format(i),
+                user=cls.users[i % len(cls.users)], created_at=now,
+                expire_at=now + datetime.timedelta(minutes=i - 10))
+            for i in range(20)])
+        PumpwoodI8nTranslation.objects.bulk_create([
+            PumpwoodI8nTranslation(
+                sentence='test--plan-sentence-{}'.format(i), tag='',
+                plural=False, language=language, user_type='api',
+                translation='test--plan-translation-{}'.format(i))
+            for i in range(50) for language in ['pt-br', 'en']])
+
+    def test_no_seq_scan(self):
+        """No plan of auth hot queries has a sequential scan."""
+        command = check_auth_query_plans.Command
+        user_id = self.users[1].id
+        route_id = self.routes[0].id
+        with connection.cursor() as cursor:
+            # Local to test transaction
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        plans = {}
+        for name, sql, parameters in command.get_sql_checks(
+                user_id=user_id, route_id=route_id):
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + sql, parameters)
+                plans[name] = command._load_plan(cursor.fetchone()[0])
+        for name, query in command.get_orm_checks(
+                user_id=user_id, route_id=route_id):
+            plans[name] = command._load_plan(query.explain(format='json'))
+
+        for name, plan in plans.items():
+            with self.subTest(query=name):
+                self.assertEqual(command._find_seq_scans(plan), [])
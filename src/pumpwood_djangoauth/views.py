@@ -1,12 +1,83 @@
 """Super default pumpwood views to add new features."""
-import pandas as pd
-from typing import List, Union
-from django.db.models import Q
-from pumpwood_djangoauth.config import diskcache, DISKCACHE_EXPIRATION
+import gzip
+from array import array
+from contextlib import nullcontext
+from typing import List, Union, Tuple, Callable
+from django.db import transaction
+from django.http import HttpResponse
+from django.db.models import Q, F, Exists, OuterRef
+from django.db.models.lookups import Lookup
+from pumpwood_communication.exceptions import PumpWoodNotImplementedError
+from pumpwood_djangoauth.config import (
+    diskcache, DISKCACHE_EXPIRATION, PUMPWOOD__AUTH__ROW_PERMISSION_STRATEGY)
 from pumpwood_djangoviews.views import (
     PumpWoodRestService, PumpWoodDataBaseRestService)
 
 
+def etag_gzip_json_response(request, etag: str,
+                            get_content: Callable[[], bytes],
+                            cache_control: str = 'no-cache',
+                            vary: str = 'Accept-Encoding') -> HttpResponse:
+    """Return a precompiled gzip JSON document with strong ETag.
+
+    Requests with a matching `If-None-Match` header receive a 304
+    response without content being fetched. Content is returned
+    compressed if request accepts gzip encoding, otherwise decompressed.
+
+    Args:
+        request:
+            Django request.
+        etag (str):
+            Quoted strong ETag of the document.
+        get_content (Callable[[], bytes]):
+            Function returning gzip compressed JSON document, called only
+            if ETag does not match.
+        cache_control (str):
+            Value of `Cache-Control` header.
+        vary (str):
+            Value of `Vary` header.
+
+    Returns:
+        Return a Django HttpResponse.
+    """
+    if_none_match = request.headers.get('If-None-Match', '')
+    request_etags = [
+        x.strip().removeprefix('W/') for x in if_none_match.split(',')]
+    if etag in request_etags or '*' in request_etags:
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    content = get_content()
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    if 'gzip' in accept_encoding:
+        response = HttpResponse(content, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(
+            gzip.decompress(content), content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    response['Vary'] = vary
+    return response
+
+
+class AnyArray(Lookup):
+    """Lookup `field = ANY(%s)` passing values as one array parameter.
+
+    Differently from `__in`, the number of values does not change the
+    query text, keeping it small and with a stable plan.
+    """
+
+    lookup_name = 'any_array'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        """Return `lhs = ANY(%s)` with values list as parameter."""
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        return "%s = ANY(%%s)" % lhs_sql, (*lhs_params, list(self.rhs))
+
+
 class PumpWoodRestServiceRowPermission(PumpWoodRestService):
     """Super PumpWoodRestService to filter implement row base filter.
 
@@ -15,6 +86,59 @@ class PumpWoodRestServiceRowPermission(PumpWoodRestService):
     """
 
     ROW_PERMISSION_CACHE_TAG = 'row_permission'
+    ROW_PERMISSION_STRATEGIES = ['in_list', 'any_array', 'exists', 'rls']
+    """Strategies avaiable to filter rows using row permission."""
+
+    row_permission_strategy: str = PUMPWOOD__AUTH__ROW_PERMISSION_STRATEGY
+    """Strategy used to filter rows, `in_list` will inline ids at query,
+       `any_array` will pass ids as one array parameter and `exists` will
+       filter using subqueries against user and group row permission
+       tables, without fetching ids. `rls` will not filter queries at
+       Django, request runs in a transaction with request user set local
+       to it and rows are filtered by Postgres Row-Level Security policies
+       (see `RowLevelSecurityAux`). Default is set by
+       `PUMPWOOD__AUTH__ROW_PERMISSION_STRATEGY`."""
+
+    def dispatch(self, request, *args, **kwargs):
+        """Run request inside context returned by `get_rls_context`."""
+        with self.get_rls_context():
+            return super().dispatch(request, *args, **kwargs)
+
+    @classmethod
+    def get_rls_context(cls):
+        """Return context of requests regarding Row-Level Security.
+
+        Using `rls`, request runs in a transaction and RLS settings are set
+        local to it at `initial`, so they are discarded when the request
+        ends even if an exception is raised. Other strategies filter rows
+        at Django, if model table has RLS enabled request runs inside
+        `RowLevelSecurityAux.bypass` so rows are not hidden by policies.
+
+        Returns:
+            Return a context manager.
+        """
+        from pumpwood_djangoauth.row_permission.aux import (
+            RowLevelSecurityAux)
+
+        if cls.row_permission_strategy == 'rls':
+            return transaction.atomic()
+        service_model = getattr(cls, 'service_model', None)
+        is_rls_table = (
+            service_model is not None and
+            service_model._meta.db_table in
+            RowLevelSecurityAux.list_enabled_tables())
+        if is_rls_table:
+            return RowLevelSecurityAux.bypass()
+        return nullcontext()
+
+    def initial(self, request, *args, **kwargs):
+        """Set request user at database transaction when using `rls`."""
+        super().initial(request, *args, **kwargs)
+        if self.row_permission_strategy == 'rls' and \
+                request.user.is_authenticated:
+            from pumpwood_djangoauth.row_permission.aux import (
+                RowLevelSecurityAux)
+            RowLevelSecurityAux.set_user(user=request.user)
 
     @classmethod
     def get_row_permission_cache_key(cls, user_id: int) -> str:
@@ -23,7 +147,8 @@ class PumpWoodRestServiceRowPermission(PumpWoodRestService):
         return template.format(user_id=user_id)
 
     @classmethod
-    def get_row_permission_cache(cls, user_id: int) -> Union[List[int], None]:
+    def get_row_permission_cache(cls, user_id: int
+                                 ) -> Union[Tuple[int], None]:
         """Get user's row_permission from cache.
 
         Get user row_permissions from disk cache reducing
@@ -34,11 +159,14 @@ class PumpWoodRestServiceRowPermission(PumpWoodRestService):
                 User primary key.
 
         Returns:
-            Return a list with row_permission associated with user or None
-            if values are not at cache.
+            Return a sorted tuple with row_permission ids associated with
+            user or None if values are not at cache.
         """
         key = cls.get_row_permission_cache_key(user_id=user_id)
-        return diskcache.get(key)
+        cached = diskcache.get(key)
+        if cached is None:
+            return None
+        return tuple(cached)
 
     @classmethod
     def set_row_permission_cache(cls, user_id: int,
@@ -46,7 +174,8 @@ class PumpWoodRestServiceRowPermission(PumpWoodRestService):
         """Set user's row_permission from cache.
 
         Set user row_permissions cache using `config.DISKCACHE_EXPIRATION`
-        as expire argument and `cls.ROW_PERMISSION_CACHE_TAG` as tag.
+        as expire argument and `cls.ROW_PERMISSION_CACHE_TAG` as tag. Ids
+        are stored as a compact 64 bits integer array.
 
         Args:
             user_id (int):
@@ -59,37 +188,107 @@ class PumpWoodRestServiceRowPermission(PumpWoodRestService):
         """
         key = cls.get_row_permission_cache_key(user_id=user_id)
         return diskcache.set(
-            key=key, value=row_permissions, expire=DISKCACHE_EXPIRATION,
-            tag=cls.ROW_PERMISSION_CACHE_TAG)
+            key=key, value=array('q', row_permissions),
+            expire=DISKCACHE_EXPIRATION, tag=cls.ROW_PERMISSION_CACHE_TAG)
 
-    def base_query(self, request, **kwargs):
-        """Super base query to filter using row_permission_id if present."""
-        from pumpwood_djangoauth.registration.models import (
-            UserProfile)
+    @classmethod
+    def get_row_permission_ids(cls, user) -> Union[Tuple[int], None]:
+        """Get ids of user's row permissions using local cache.
 
-        base_query = super().base_query(request, **kwargs)
-        has_row_permission_id = hasattr(
-            self.service_model, 'row_permission_id')
-        if not has_row_permission_id:
-            return base_query
+        Args:
+            user (User):
+                User to fetch row permission ids.
+
+        Returns:
+            Return a sorted tuple of row permission ids or None for
+            superusers.
+        """
+        from pumpwood_djangoauth.registration.aux import RowPermissionAux
 
         # Try to get permissions from local disk cache
-        row_permission_list = (
-            self.get_row_permission_cache(user_id=request.user.id))
+        row_permission_list = cls.get_row_permission_cache(user_id=user.id)
 
         # If not avaiable fetch them from database
         if row_permission_list is None:
-            row_permission_list = pd.DataFrame(
-                UserProfile.self_row_permissions(request),
-                columns=['pk']).loc[:, 'pk'].tolist()
-            self.set_row_permission_cache(
-                user_id=request.user.id,
-                row_permissions=row_permission_list)
-
-        return base_query.filter(
-            Q(row_permission_id__isnull=True) |
+            row_permission_list = RowPermissionAux.get_ids(user=user)
+            if row_permission_list is None:
+                return None
+            cls.set_row_permission_cache(
+                user_id=user.id, row_permissions=row_permission_list)
+        return row_permission_list
+
+    @classmethod
+    def filter_row_permission(cls, query, user, strategy: str = None):
+        """Filter query by user's row permission.
+
+        Args:
+            query (QuerySet):
+                Query of a model with `row_permission_id` field.
+            user (User):
+                User to filter rows, superusers are not filtered.
+            strategy (str):
+                Strategy used to filter rows, if not set will be used
+                `row_permission_strategy` attribute.
+
+        Returns:
+            Return query filtered, rows without row_permission_id are
+            always returned.
+
+        Raises:
+            PumpWoodNotImplementedError:
+                If strategy is not one of `ROW_PERMISSION_STRATEGIES`.
+        """
+        from pumpwood_djangoauth.row_permission.models import (
+            PumpwoodRowPermissionUserM2M, PumpwoodRowPermissionGroupM2M)
+
+        strategy = strategy or cls.row_permission_strategy
+        if strategy not in cls.ROW_PERMISSION_STRATEGIES:
+            msg = (
+                "Row permission strategy [{strategy}] not implemented, "
+                "options: {options}")
+            raise PumpWoodNotImplementedError(
+                message=msg, payload={
+                    "strategy": strategy,
+                    "options": cls.ROW_PERMISSION_STRATEGIES})
+
+        # Superusers have access to all rows, skip filtering. Using RLS,
+        # rows are filtered by the database
+        if user.is_superuser or strategy == 'rls':
+            return query
+
+        no_permission_q = Q(row_permission_id__isnull=True)
+        if strategy == 'exists':
+            user_m2m = PumpwoodRowPermissionUserM2M.objects.filter(
+                user_id=user.id,
+                row_permission_id=OuterRef('row_permission_id'))
+            # Users of descendant groups are members of the group
+            group_m2m = PumpwoodRowPermissionGroupM2M.objects.filter(
+                **{
+                    'group__descendant_closure_set__descendant__'
+                    'user_group_m2m_set__user_id': user.id},
+                row_permission_id=OuterRef('row_permission_id'))
+            return query.filter(
+                no_permission_q | Exists(user_m2m) | Exists(group_m2m))
+
+        row_permission_list = cls.get_row_permission_ids(user=user)
+        if strategy == 'any_array':
+            return query.filter(
+                no_permission_q |
+                Q(AnyArray(F('row_permission_id'), row_permission_list)))
+        return query.filter(
+            no_permission_q |
             Q(row_permission_id__in=row_permission_list))
 
+    def base_query(self, request, **kwargs):
+        """Super base query to filter using row_permission_id if present."""
+        base_query = super().base_query(request, **kwargs)
+        has_row_permission_id = hasattr(
+            self.service_model, 'row_permission_id')
+        if not has_row_permission_id:
+            return base_query
+        return self.filter_row_permission(
+            query=base_query, user=request.user)
+
 
 class PumpWoodDBRestServiceRowPermission(PumpWoodDataBaseRestService,
                                          PumpWoodRestServiceRowPermission):